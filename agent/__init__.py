@@ -0,0 +1,32 @@
+__all__ = [
+    'client', 'history', 'journal', 'metrics', 'request', 'scheduler', 'session', 'stream',  # modules
+    'HistoryManager', 'JsonlSink', 'LLMClient', 'Metrics', 'PrometheusSink', 'RequestBuilder', 'Session', 'SessionEngine', 'SessionJournal', 'StreamAccumulator', 'TodoScheduler', 'TokenBucket', 'ToolCallBuffer', 'UsageStats', 'SYSTEM_PROMPT', 'estimate_tokens' # classes, functions & constants
+]
+import sys
+
+# 名称 -> 所在的子模块；子模块在第一次访问时才导入，以缩短启动时间
+_EXPORTS = {
+    'LLMClient': 'client', 'TokenBucket': 'client',
+    'HistoryManager': 'history', 'estimate_tokens': 'history',
+    'SessionJournal': 'journal',
+    'JsonlSink': 'metrics', 'Metrics': 'metrics', 'PrometheusSink': 'metrics',
+    'RequestBuilder': 'request', 'UsageStats': 'request',
+    'TodoScheduler': 'scheduler',
+    'Session': 'session', 'SessionEngine': 'session', 'SYSTEM_PROMPT': 'session',
+    'StreamAccumulator': 'stream', 'ToolCallBuffer': 'stream',
+}
+
+def __getattr__(name:str):
+    module = _EXPORTS.get(name, name if name in __all__ else None)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # 使用__import__而不是importlib.import_module，这样-X importtime也能统计到这些模块
+    __import__(f'{__name__}.{module}')
+    value = sys.modules[f'{__name__}.{module}']
+    if module != name:
+        value = getattr(value, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,184 @@
+from typing import Dict, Optional
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+# 这些状态码表示请求可以原样重试：超时、冲突、限流和服务端错误
+RETRY_STATUS = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+class TokenBucket:
+    def __init__(self, rate:float, capacity:Optional[float]=None)->None:
+        # rate为每秒补充的令牌数，capacity为最多可以积累的令牌数（允许的突发量）
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        return
+
+    def reserve(self, amount:float)->float:
+        # 预留令牌并返回需要等待的秒数；不足时先透支，后来者的等待时间会相应增加，从而按到达顺序放行
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 超过桶容量的请求只需等桶满，否则永远无法放行
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount:float)->None:
+        # amount为负数时追加扣除，例如实际用量超过了预估值
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    async def acquire(self, amount:float=1.0)->float:
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+def _retry_after(response)->Optional[float]:
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return None
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            # HTTP日期格式的Retry-After按没有给出处理
+            return None
+    return None
+
+def _transient(error:BaseException)->bool:
+    # 只在出错时才需要判断，这时openai和httpx通常已经导入
+    import httpx
+    import openai
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, ConnectionError, asyncio.TimeoutError))
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key:Optional[str]=None,
+        base_url:str='https://api.deepseek.com/',
+        client=None,
+        max_connections:int=64,
+        max_keepalive:int=32,
+        keepalive_expiry:float=120.0,
+        timeout:float=600.0,
+        connect_timeout:float=10.0,
+        requests_per_minute:Optional[float]=None,
+        tokens_per_minute:Optional[float]=None,
+        burst_seconds:float=10.0,
+        max_retries:int=4,
+        backoff_base:float=0.5,
+        backoff_max:float=30.0
+    )->None:
+        self.__client = client
+        self.__client_args = {'api_key':api_key, 'base_url':base_url}
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        # 令牌桶在所有线程和事件循环之间共享；每分钟的配额最多允许burst_seconds秒的突发
+        self.request_bucket = None if not requests_per_minute else TokenBucket(requests_per_minute / 60, max(requests_per_minute / 60 * burst_seconds, 1.0))
+        self.token_bucket = None if not tokens_per_minute else TokenBucket(tokens_per_minute / 60, max(tokens_per_minute / 60 * burst_seconds, 1.0))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        # httpx.AsyncClient绑定在创建它的事件循环上，每个事件循环各用一个连接池
+        self.__clients:'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]' = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+        return
+
+    def client(self):
+        if self.__client is not None:
+            return self.__client
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            client = self.__clients.get(loop)
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                http_client = DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive,
+                        keepalive_expiry=self.keepalive_expiry
+                    ),
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+                )
+                # 重试由本类负责，以便在重试之间释放并发名额并遵守令牌桶
+                client = self.__clients[loop] = AsyncOpenAI(**self.__client_args, http_client=http_client, max_retries=0)
+        return client
+
+    async def warm(self)->None:
+        # 提前建立连接（TCP和TLS握手），第一次请求模型时可以直接复用
+        try:
+            await self.client().models.list()
+        except Exception:
+            pass
+
+    async def throttle(self, tokens:int=0)->float:
+        waited = 0.0
+        if self.request_bucket is not None:
+            waited += await self.request_bucket.acquire(1)
+        if self.token_bucket is not None and tokens:
+            waited += await self.token_bucket.acquire(tokens)
+        if waited:
+            self.throttled_seconds += waited
+        return waited
+
+    def settle(self, estimated:int, actual:Optional[int])->None:
+        # 用实际用量修正请求前按估计值扣除的令牌
+        if self.token_bucket is not None and actual:
+            self.token_bucket.refund(estimated - actual)
+
+    def retry_delay(self, error:BaseException, attempt:int)->Optional[float]:
+        if attempt >= self.max_retries or not _transient(error):
+            return None
+        # 全抖动的指数退避，避免多个会话在同一时刻一起重试
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(getattr(error, 'response', None))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        self.retries += 1
+        return delay
+
+    async def aclose(self)->None:
+        if self.__client is not None:
+            close = getattr(self.__client, 'close', None)
+            if close is not None:
+                await close()
+            return
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            client = self.__clients.pop(loop, None)
+        if client is not None:
+            await client.close()
+
+TokenBucket.__doc__ = '''TokenBucket类是一个线程安全的令牌桶，可以在多个线程和事件循环之间共享。它包含以下方法：
+- reserve(self, amount) -> float: 预留amount个令牌，返回调用方需要等待的秒数。令牌不足时先透支，因此多个调用方按到达顺序依次放行。
+- acquire(self, amount=1.0) -> float: reserve之后异步等待所需的时间，返回实际等待的秒数。
+- refund(self, amount): 归还令牌；amount为负数时追加扣除。'''
+LLMClient.__doc__ = '''LLMClient类是所有会话共用的模型请求层，负责连接池、限流和重试。它包含以下参数和方法：
+- api_key, base_url: 创建AsyncOpenAI所用的参数。client不为None时直接使用该异步client（例如测试中的替身），不再创建连接池。
+- max_connections, max_keepalive, keepalive_expiry: 连接池的上限、保持空闲的连接数以及空闲连接的保留时间（秒），长时间复用已经完成TLS握手的连接；timeout和connect_timeout为请求和建立连接的超时时间。
+- requests_per_minute, tokens_per_minute: 每分钟的请求数和token数配额，为None时不限制；最多允许burst_seconds秒配额的突发。
+- max_retries, backoff_base, backoff_max: 最多重试次数以及全抖动指数退避的参数；响应带有Retry-After时至少等待该时间。
+- client(self): 返回当前事件循环使用的AsyncOpenAI。httpx的连接池绑定在事件循环上，因此每个事件循环各有一个，令牌桶则全局共享，同一个LLMClient可以被多个线程中的多个SessionEngine共用。
+- warm(self): 提前建立到服务端的连接。
+- throttle(self, tokens=0) -> float: 在发送请求前按请求数和估计的token数限流，返回等待的秒数。
+- settle(self, estimated, actual): 请求完成后用实际的token数修正估计值。
+- retry_delay(self, error, attempt) -> float | None: error可以重试（连接错误、流中断、408/409/429/5xx）且第attempt次重试未超过上限时返回应等待的秒数，否则返回None。
+- aclose(self): 关闭当前事件循环的连接池。
+- retries / throttled_seconds: 累计的重试次数和限流等待时间。'''
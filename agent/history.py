@@ -0,0 +1,135 @@
+from typing import Dict, List, Tuple
+import hashlib
+import re
+
+_FILE_HEADER = re.compile(r'\[file name\]: (.*?)\n(?:\[file info\]: .*?\n)?\[file content begin\]')
+
+def estimate_tokens(text:str)->int:
+    # DeepSeek的经验值：1个英文字符约0.3个token，1个中文字符约0.6个token
+    if not text:
+        return 0
+    n = len(text)
+    ascii_n = len(text.encode('ascii', 'ignore'))
+    return int(ascii_n * 0.3 + (n - ascii_n) * 0.6) + 1
+
+def message_tokens(message:dict)->int:
+    tokens = 4 + estimate_tokens(message.get('content') or '')
+    for tc in message.get('tool_calls') or ():
+        tokens += 8 + estimate_tokens(tc['function']['name']) + estimate_tokens(tc['function']['arguments'])
+    return tokens
+
+def stub(content:str, tool_name:str='')->str:
+    digest = hashlib.sha1(content.encode('utf-8', 'replace')).hexdigest()[:12]
+    m = _FILE_HEADER.match(content)
+    if m:
+        return f'[已省略的旧工具结果] 文件 {m.group(1)}（sha1 {digest}，{len(content)} 字符），如需内容请重新读取。'
+    return f'[已省略的旧工具结果] {tool_name}（sha1 {digest}，{len(content)} 字符）'
+
+class HistoryManager:
+    SUMMARY_PREFIX = '[早前对话摘要]'
+    summary_lines = 50
+
+    def __init__(self, token_budget:int=60000, low_water:float=0.75, keep_recent_turns:int=2, stub_min_tokens:int=64)->None:
+        self.token_budget = token_budget
+        self.low_water = low_water
+        self.keep_recent_turns = keep_recent_turns
+        self.stub_min_tokens = stub_min_tokens
+        # id(message) -> (message, token数)，保留消息引用以免id被复用
+        self.__cache:Dict[int, Tuple[dict, int, str]] = {}
+        return
+
+    def tokens(self, message:dict)->int:
+        key = id(message)
+        content = message.get('content')
+        cached = self.__cache.get(key)
+        if cached is not None and cached[0] is message and cached[2] is content:
+            return cached[1]
+        n = message_tokens(message)
+        self.__cache[key] = (message, n, content)
+        return n
+
+    def total(self, messages:List[dict])->int:
+        return sum(self.tokens(m) for m in messages)
+
+    @staticmethod
+    def turns(messages:List[dict])->List[Tuple[int, int]]:
+        # 以user消息为界划分轮次；带tool_calls的assistant消息与其tool消息总在同一轮内
+        starts = [i for i, m in enumerate(messages) if m.get('role') == 'user']
+        return [(s, e) for s, e in zip(starts, starts[1:] + [len(messages)])]
+
+    def compact(self, messages:List[dict])->bool:
+        total = self.total(messages)
+        if total <= self.token_budget:
+            return False
+        target = int(self.token_budget * self.low_water)
+        turns = self.turns(messages)
+        old = turns[:-self.keep_recent_turns] if self.keep_recent_turns > 0 else turns
+        # 第一步：把旧轮次中较长的工具结果替换为简短的占位信息（文件名+哈希）
+        names = {}
+        changed = False
+        for start, end in old:
+            for i in range(start, end):
+                m = messages[i]
+                for tc in m.get('tool_calls') or ():
+                    names[tc['id']] = tc['function']['name']
+                if m.get('role') != 'tool' or self.tokens(m) < self.stub_min_tokens:
+                    continue
+                before = self.tokens(m)
+                messages[i] = dict(m, content=stub(m.get('content') or '', names.get(m.get('tool_call_id'), '')))
+                total += self.tokens(messages[i]) - before
+                changed = True
+            if total <= target:
+                break
+        if total <= target:
+            self.__prune()
+            return changed
+        # 第二步：从最早的轮次开始整轮丢弃，只在摘要中保留用户的提问
+        dropped = []
+        cut = None
+        for start, end in old:
+            if total <= target:
+                break
+            dropped.append(messages[start].get('content') or '')
+            total -= sum(self.tokens(messages[i]) for i in range(start, end))
+            cut = (old[0][0], end)
+        if cut is not None:
+            summary_idx = self._summary_index(messages)
+            previous = messages[summary_idx]['content'] if summary_idx is not None else self.SUMMARY_PREFIX
+            lines = previous.split('\n')[1:] + [f'- 用户曾提问：{q[:200]}' for q in dropped]
+            summary = {'role':'system', 'content':'\n'.join([self.SUMMARY_PREFIX] + lines[-self.summary_lines:])}
+            del messages[cut[0]:cut[1]]
+            if summary_idx is not None:
+                messages[summary_idx] = summary
+            else:
+                messages.insert(1 if messages and messages[0].get('role') == 'system' else 0, summary)
+            changed = True
+        self.__prune()
+        # 超出预算但所有轮次都在keep_recent_turns之内时无法压缩，这时返回False，调用方不必重建缓存
+        return changed
+
+    def _summary_index(self, messages:List[dict]):
+        for i, m in enumerate(messages[:2]):
+            if m.get('role') == 'system' and (m.get('content') or '').startswith(self.SUMMARY_PREFIX):
+                return i
+        return None
+
+    def __prune(self)->None:
+        if len(self.__cache) > 4096:
+            self.__cache.clear()
+
+estimate_tokens.__doc__ = '''estimate_tokens函数用于在本地快速估算一段文本的token数量，无需加载分词器。
+按DeepSeek给出的经验比例计算：英文字符约0.3个token，中文等非ASCII字符约0.6个token。'''
+stub.__doc__ = '''stub函数用于为一条旧的工具结果生成简短的占位信息。它接受以下参数：
+- content: 原始工具结果。
+- tool_name: 产生该结果的工具名称。
+如果结果是TextFileContent格式的文件内容，占位信息包含文件名、内容哈希和长度；否则包含工具名称、内容哈希和长度。'''
+HistoryManager.__doc__ = '''HistoryManager类用于把对话历史控制在给定的token预算之内。它包含以下方法：
+- __init__(self, token_budget=60000, low_water=0.75, keep_recent_turns=2, stub_min_tokens=64): token_budget为预算；超出预算时压缩到token_budget*low_water以下，避免每轮都改写历史；最近keep_recent_turns轮对话不会被压缩；短于stub_min_tokens的工具结果保持原样。
+- tokens(self, message) -> int: 估算单条消息的token数（带缓存）。
+- total(self, messages) -> int: 估算整个对话历史的token数。
+- compact(self, messages) -> bool: 原地压缩对话历史，发生压缩时返回True。'''
+HistoryManager.compact.__doc__ = '''compact方法用于原地压缩对话历史。它接受一个参数：
+- messages: 对话历史列表，第一条通常为系统提示词。
+未超出预算时不做任何修改。超出预算时，先从最早的轮次开始，把较长的工具结果替换为占位信息；仍然超出时，再从最早的轮次开始整轮丢弃，并把被丢弃轮次中的用户提问记录到系统提示词之后的一条摘要消息中（最多保留summary_lines条）。
+压缩总是以整条消息或整轮对话为单位，带tool_calls的assistant消息永远不会与其对应的tool消息分开。
+返回是否实际修改了messages：超出预算但所有轮次都在keep_recent_turns之内（例如只有一轮很长的工具调用）时无法压缩，返回False。'''
@@ -0,0 +1,208 @@
+from typing import List, Optional, Tuple
+import json
+import os
+import queue
+import threading
+
+class SessionJournal:
+    def __init__(
+        self,
+        journal_dir:str,
+        session_id:str,
+        snapshot_every:int=200,
+        fsync:bool=True,
+        max_batch:int=256
+    )->None:
+        self.journal_dir = journal_dir
+        self.session_id = session_id
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.max_batch = max_batch
+        os.makedirs(journal_dir, exist_ok=True)
+        snapshot = self.read_snapshot(journal_dir, session_id)
+        self.seq = snapshot['seq'] if snapshot else 0
+        self.records = 0
+        self.__queue:'queue.Queue' = queue.Queue()
+        self._repair(self._journal_path(self.seq))
+        self.__file = open(self._journal_path(self.seq), 'a', encoding='utf-8')
+        self.__writer = threading.Thread(target=self.__run, name=f'journal-{session_id}', daemon=True)
+        self.__writer.start()
+        return
+
+    @staticmethod
+    def _path(journal_dir:str, session_id:str, suffix:str)->str:
+        return os.path.join(journal_dir, f'{session_id}.{suffix}')
+
+    def _journal_path(self, seq:int)->str:
+        return self._path(self.journal_dir, self.session_id, f'{seq}.jsonl')
+
+    @staticmethod
+    def _repair(path:str, chunk:int=65536)->None:
+        # 崩溃时最后一行可能只写了一半：截断到最后一个换行符，否则新的记录会接在这半行后面，一起无法解析
+        try:
+            f = open(path, 'rb+')
+        except FileNotFoundError:
+            return
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(pos - chunk, 0)
+                f.seek(start)
+                data = f.read(pos - start)
+                cut = data.rfind(b'\n')
+                if cut >= 0:
+                    pos = start + cut + 1
+                    break
+                pos = start
+            if pos != end:
+                f.truncate(pos)
+
+    @classmethod
+    def read_snapshot(cls, journal_dir:str, session_id:str)->Optional[dict]:
+        try:
+            with open(cls._path(journal_dir, session_id, 'snapshot.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def message(self, message:dict)->None:
+        self.__put({'t':'msg', 'm':message})
+
+    def todo(self, state:dict)->None:
+        self.__put({'t':'todo', 's':state})
+
+    def snapshot(self, messages:List[dict], todo_state:dict)->None:
+        # 只复制列表本身；消息字典在加入历史后不会被原地修改
+        self.__queue.put(('snapshot', {'messages':list(messages), 'todo':dict(todo_state)}))
+        self.records = 0
+
+    def __put(self, record:dict)->None:
+        self.__queue.put(('record', record))
+        self.records += 1
+
+    def wants_snapshot(self)->bool:
+        return self.records >= self.snapshot_every
+
+    def flush(self)->None:
+        done = threading.Event()
+        self.__queue.put(('flush', done))
+        done.wait()
+
+    def close(self)->None:
+        if self.__writer.is_alive():
+            self.__queue.put(('close', None))
+            self.__writer.join()
+
+    def __commit(self)->None:
+        self.__file.flush()
+        if self.fsync:
+            os.fsync(self.__file.fileno())
+
+    def __write_snapshot(self, state:dict)->None:
+        # 先轮换日志文件，再原子地写入快照；快照落盘后旧日志才可以删除
+        self.__commit()
+        self.__file.close()
+        old_seq = self.seq
+        self.seq += 1
+        self.__file = open(self._journal_path(self.seq), 'a', encoding='utf-8')
+        path = self._path(self.journal_dir, self.session_id, 'snapshot.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dict(state, seq=self.seq), f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for seq in range(old_seq, -1, -1):
+            try:
+                os.remove(self._journal_path(seq))
+            except FileNotFoundError:
+                break
+
+    def __run(self)->None:
+        # 组提交：一次取出队列中积压的所有记录，写入后只flush/fsync一次
+        closing = False
+        while not closing:
+            batch = [self.__queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            waiters = []
+            for kind, payload in batch:
+                if kind == 'record':
+                    lines.append(json.dumps(payload, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    continue
+                if lines:
+                    self.__file.write(''.join(lines))
+                    lines = []
+                if kind == 'snapshot':
+                    self.__write_snapshot(payload)
+                elif kind == 'flush':
+                    waiters.append(payload)
+                elif kind == 'close':
+                    closing = True
+            if lines:
+                self.__file.write(''.join(lines))
+            self.__commit()
+            for done in waiters:
+                done.set()
+        self.__file.close()
+
+    @classmethod
+    def load(cls, journal_dir:str, session_id:str)->Tuple[Optional[List[dict]], Optional[dict]]:
+        snapshot = cls.read_snapshot(journal_dir, session_id)
+        messages = list(snapshot['messages']) if snapshot else None
+        todo_state = snapshot['todo'] if snapshot else None
+        seq = snapshot['seq'] if snapshot else 0
+        path = cls._path(journal_dir, session_id, f'{seq}.jsonl')
+        if snapshot is None and not os.path.exists(path):
+            return None, None
+        messages = messages or []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的行，跳过它，继续读取之后的记录
+                        continue
+                    if record['t'] == 'msg':
+                        messages.append(record['m'])
+                    elif record['t'] == 'todo':
+                        todo_state = record['s']
+        except FileNotFoundError:
+            pass
+        return _close_tool_calls(messages), todo_state
+
+def _close_tool_calls(messages:List[dict])->List[dict]:
+    # 崩溃时可能已经记录了带tool_calls的助手消息，却没有对应的工具结果；
+    # 缺少结果的请求会被API拒绝，因此为每个缺失的调用补一条出错的工具消息
+    res:List[dict] = []
+    pending:List[str] = []
+    def close():
+        for call_id in pending:
+            res.append({'role':'tool', 'tool_call_id':call_id, 'content':'工具调用因进程中断而没有完成，结果未知，请检查相关状态后视需要重新调用。'})
+        pending.clear()
+    for message in messages:
+        if pending and not (message.get('role') == 'tool' and message.get('tool_call_id') in pending):
+            close()
+        res.append(message)
+        if message.get('role') == 'tool' and message.get('tool_call_id') in pending:
+            pending.remove(message['tool_call_id'])
+        elif message.get('role') == 'assistant' and message.get('tool_calls'):
+            pending.extend(call['id'] for call in message['tool_calls'])
+    close()
+    return res
+
+SessionJournal.__doc__ = '''SessionJournal类是一个会话的持久化日志，用于在进程退出或崩溃后恢复对话历史和TODO状态。它包含以下方法：
+- message(self, message): 记录一条加入对话历史的消息。
+- todo(self, state): 记录TODOListManager的最新状态。
+- snapshot(self, messages, todo_state): 写入一份完整的快照，并开始一个新的日志文件，旧的日志文件随后被删除。
+- wants_snapshot(self) -> bool: 自上次快照以来的记录数是否达到snapshot_every。
+- flush(self): 等待已提交的记录全部写入磁盘。
+- close(self): 写完剩余记录并停止后台线程。
+- load(journal_dir, session_id) -> (messages, todo_state): 类方法，读取最新的快照并重放其后的日志，耗时只与快照之后的日志长度有关；没有任何记录时返回(None, None)。无法解析的行（崩溃时写了一半的记录）会被跳过；没有对应工具结果的tool_calls会补上一条说明调用被中断的工具消息。
+文件布局为“会话id.snapshot.json”加上“会话id.序号.jsonl”，日志只追加写入；打开已有的日志时先截掉末尾不完整的行。记录由后台线程组提交：积压的记录一次写入，每批只flush和fsync一次，调用方不会被磁盘I/O阻塞。'''
@@ -0,0 +1,213 @@
+from typing import Dict, List, Optional, Tuple
+import bisect
+import json
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class JsonlSink:
+    def __init__(self, path:str)->None:
+        self.path = path
+        self.__lock = threading.Lock()
+        # 按行缓冲，进程崩溃时最多丢失最后一条记录
+        self.__file = open(path, 'a', encoding='utf-8', buffering=1)
+        return
+
+    def emit(self, record:dict)->None:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self.__lock:
+            self.__file.write(line)
+
+    def close(self)->None:
+        with self.__lock:
+            self.__file.close()
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self)->None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value:float)->None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name:str, labels:str, lines:List[str])->None:
+        acc = 0
+        sep = ',' if labels else ''
+        for bound, n in zip(LATENCY_BUCKETS, self.counts):
+            acc += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {acc}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+
+def _label(value:str)->str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class PrometheusSink:
+    def __init__(self)->None:
+        self.__lock = threading.Lock()
+        # 工具名称 -> [调用次数, 出错次数, 参数字节数, 结果字节数]
+        self.tools:Dict[str, List[int]] = {}
+        self.tool_latency:Dict[str, _Histogram] = {}
+        self.requests = dict.fromkeys(('requests', 'retries', 'tool_calls', 'prompt_tokens', 'completion_tokens', 'cached_tokens'), 0)
+        self.ttft = _Histogram()
+        self.stream = _Histogram()
+        self.turns = _Histogram()
+        self.__server = None
+        return
+
+    def emit(self, record:dict)->None:
+        kind = record['type']
+        with self.__lock:
+            if kind == 'tool':
+                name = record['name']
+                stats = self.tools.get(name)
+                if stats is None:
+                    stats = self.tools[name] = [0, 0, 0, 0]
+                    self.tool_latency[name] = _Histogram()
+                stats[0] += 1
+                stats[1] += not record['ok']
+                stats[2] += record['arg_bytes']
+                stats[3] += record['result_bytes']
+                self.tool_latency[name].observe(record['seconds'])
+            elif kind == 'request':
+                self.requests['requests'] += 1
+                for k in ('tool_calls', 'prompt_tokens', 'completion_tokens', 'cached_tokens'):
+                    self.requests[k] += record[k]
+                if record['ttft'] is not None:
+                    self.ttft.observe(record['ttft'])
+                self.stream.observe(record['seconds'])
+            elif kind == 'retry':
+                self.requests['retries'] += 1
+            elif kind == 'turn':
+                self.turns.observe(record['seconds'])
+
+    def render(self)->str:
+        lines:List[str] = []
+        with self.__lock:
+            counters = (
+                ('simpleagent_tool_calls_total', '工具调用次数', 0),
+                ('simpleagent_tool_errors_total', '出错的工具调用次数', 1),
+                ('simpleagent_tool_arg_bytes_total', '工具参数的字节数', 2),
+                ('simpleagent_tool_result_bytes_total', '工具结果的字节数', 3),
+            )
+            for name, help_text, i in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for tool, stats in sorted(self.tools.items()):
+                    lines.append(f'{name}{{tool="{_label(tool)}"}} {stats[i]}')
+            lines.append('# HELP simpleagent_tool_seconds 工具调用耗时')
+            lines.append('# TYPE simpleagent_tool_seconds histogram')
+            for tool, hist in sorted(self.tool_latency.items()):
+                hist.render('simpleagent_tool_seconds', f'tool="{_label(tool)}"', lines)
+            for k, v in self.requests.items():
+                name = f'simpleagent_llm_{k}_total'
+                lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name} {v}')
+            for name, hist in (
+                ('simpleagent_llm_ttft_seconds', self.ttft),
+                ('simpleagent_llm_stream_seconds', self.stream),
+                ('simpleagent_turn_seconds', self.turns)
+            ):
+                lines.append(f'# TYPE {name} histogram')
+                hist.render(name, '', lines)
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host:str='127.0.0.1', port:int=9464)->Tuple[str, int]:
+        # 只有需要提供HTTP服务时才导入http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        sink = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = sink.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, name='metrics-http', daemon=True).start()
+        return self.__server.server_address[:2]
+
+    def close(self)->None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+class Metrics:
+    def __init__(self, sinks:Optional[list]=None)->None:
+        self.sinks = list(sinks or [])
+        return
+
+    def __bool__(self)->bool:
+        return bool(self.sinks)
+
+    def emit(self, record:dict)->None:
+        record['time'] = time.time()
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def tool_hook(self, session_id:str):
+        def hook(name:str, seconds:float, arg_bytes:int, result_bytes:int, ok:bool)->None:
+            self.emit({
+                'type':'tool', 'session':session_id, 'name':name, 'seconds':seconds,
+                'arg_bytes':arg_bytes, 'result_bytes':result_bytes, 'ok':ok
+            })
+        return hook
+
+    def request(self, session_id:str, ttft:Optional[float], seconds:float, usage:Optional[Dict[str, int]], tool_calls:int)->None:
+        usage = usage or {}
+        self.emit({
+            'type':'request', 'session':session_id, 'ttft':ttft, 'seconds':seconds, 'tool_calls':tool_calls,
+            'prompt_tokens':usage.get('prompt_tokens', 0),
+            'completion_tokens':usage.get('completion_tokens', 0),
+            'cached_tokens':usage.get('prompt_cache_hit_tokens', 0)
+        })
+
+    def retry(self, session_id:str, attempt:int, delay:float, error:BaseException)->None:
+        self.emit({
+            'type':'retry', 'session':session_id, 'attempt':attempt, 'delay':delay,
+            'error':f'{type(error).__name__}: {error}'
+        })
+
+    def turn(self, session_id:str, seconds:float, stats:Dict[str, int])->None:
+        self.emit({
+            'type':'turn', 'session':session_id, 'seconds':seconds, 'requests':stats.get('requests', 0),
+            'prompt_tokens':stats.get('prompt_tokens', 0),
+            'completion_tokens':stats.get('completion_tokens', 0),
+            'cached_tokens':stats.get('prompt_cache_hit_tokens', 0)
+        })
+
+    def close(self)->None:
+        for sink in self.sinks:
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                close()
+
+JsonlSink.__doc__ = '''JsonlSink类把每条统计记录作为一行JSON追加到path指定的文件中，可以在多个线程中同时使用。'''
+PrometheusSink.__doc__ = '''PrometheusSink类在内存中汇总统计记录，并以Prometheus文本格式输出。它包含以下方法：
+- emit(self, record): 汇总一条记录：按工具名称累计调用次数、出错次数、参数和结果字节数及耗时分布；累计模型请求次数、重试次数、工具调用数和各类token数，以及首个token的等待时间、流式输出耗时和每轮对话耗时的分布。
+- render(self) -> str: 返回Prometheus文本格式的全部指标。
+- serve(self, host='127.0.0.1', port=9464) -> (host, port): 在后台线程中启动HTTP服务，在/metrics路径提供render的结果。port为0时由系统分配端口，返回实际监听的地址。
+- close(self): 停止HTTP服务。'''
+Metrics.__doc__ = '''Metrics类把工具调用、模型请求和对话轮次的统计记录分发给若干sink（如JsonlSink、PrometheusSink，或任何提供emit(record)方法的对象）。它包含以下方法：
+- tool_hook(self, session_id): 返回可以传给AIFunction.add_hook的钩子，记录类型为'tool'。
+- request(self, session_id, ttft, seconds, usage, tool_calls): 记录一次模型请求：首个数据块到达前的等待时间、整个流的耗时、工具调用数以及prompt、completion和命中缓存的token数，记录类型为'request'。
+- retry(self, session_id, attempt, delay, error): 记录一次模型请求的重试：第几次重试、退避的秒数和出错原因，记录类型为'retry'。
+- turn(self, session_id, seconds, stats): 记录一轮对话的耗时和累计用量，记录类型为'turn'。
+- close(self): 关闭所有sink。
+每条记录都是一个字典，包含type、session和time（Unix时间戳）字段。没有任何sink时Metrics的布尔值为False，SessionEngine不会为其安装钩子或计时。'''
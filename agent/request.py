@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import json
+
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'prompt_cache_hit_tokens', 'prompt_cache_miss_tokens')
+
+def canonical(obj):
+    # 统一按键排序后重新构造，保证同样的内容总是序列化为同样的字节
+    return json.loads(json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
+
+class RequestBuilder:
+    max_tool_sets = 32
+
+    def __init__(self, model:str, tool_choice:str='auto')->None:
+        self.model = model
+        self.tool_choice = tool_choice
+        # 工具名称元组 -> 规范化后的工具列表；不同会话可能暴露不同的工具集合
+        self.__tools:'OrderedDict[Tuple[str, ...], List[dict]]' = OrderedDict()
+        return
+
+    def tools(self, tool_manager)->List[dict]:
+        key = tuple(tool_manager.names)
+        tools = self.__tools.get(key)
+        if tools is None:
+            if getattr(tool_manager, 'ordered', False):
+                # 工具选择器已经给出稳定的顺序，新加载的工具追加在末尾
+                functions = tool_manager.functions
+            else:
+                functions = sorted(tool_manager.functions, key=lambda f: f.get('function', f)['name'])
+            tools = self.__tools[key] = [canonical(f) for f in functions]
+            if len(self.__tools) > self.max_tool_sets:
+                self.__tools.popitem(last=False)
+        else:
+            self.__tools.move_to_end(key)
+        return tools
+
+    def build(self, messages:List[dict], tool_manager)->dict:
+        request = {
+            'model': self.model,
+            'messages': messages,
+            'stream': True,
+            'stream_options': {'include_usage': True}
+        }
+        tools = self.tools(tool_manager)
+        if tools:
+            request['tools'] = tools
+            request['tool_choice'] = self.tool_choice
+        return request
+
+class UsageStats:
+    def __init__(self)->None:
+        self.turns:List[Dict[str, int]] = []
+        self.total:Dict[str, int] = dict.fromkeys(USAGE_FIELDS + ('requests',), 0)
+        return
+
+    def begin_turn(self)->None:
+        self.turns.append(dict.fromkeys(USAGE_FIELDS + ('requests',), 0))
+
+    @staticmethod
+    def _read(usage)->Dict[str, int]:
+        res = {k: getattr(usage, k, None) or 0 for k in USAGE_FIELDS}
+        if not res['prompt_cache_hit_tokens'] and not res['prompt_cache_miss_tokens']:
+            # 其他OpenAI兼容服务使用prompt_tokens_details.cached_tokens
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached = getattr(details, 'cached_tokens', None) or 0
+            res['prompt_cache_hit_tokens'] = cached
+            res['prompt_cache_miss_tokens'] = res['prompt_tokens'] - cached
+        return res
+
+    def record(self, usage)->Optional[Dict[str, int]]:
+        if usage is None:
+            return None
+        if not self.turns:
+            self.begin_turn()
+        res = self._read(usage)
+        for target in (self.turns[-1], self.total):
+            for k, v in res.items():
+                target[k] += v
+            target['requests'] += 1
+        return res
+
+    @staticmethod
+    def _rate(stats:Dict[str, int])->float:
+        prompt = stats['prompt_cache_hit_tokens'] + stats['prompt_cache_miss_tokens']
+        return stats['prompt_cache_hit_tokens'] / prompt if prompt else 0.0
+
+    @property
+    def hit_rate(self)->float:
+        return self._rate(self.total)
+
+    @property
+    def turn_hit_rate(self)->float:
+        return self._rate(self.turns[-1]) if self.turns else 0.0
+
+canonical.__doc__ = '''canonical函数返回一个对象的规范化副本：所有字典按键排序，使得相同内容总是被序列化为相同的字节。'''
+RequestBuilder.__doc__ = '''RequestBuilder类用于构造字节稳定的模型请求，以便命中DeepSeek的前缀缓存。它包含以下方法：
+- tools(self, tool_manager) -> List[dict]: 返回按函数名称排序并规范化后的工具列表。只要工具集合不变，就返回同一个列表对象，工具顺序与include的先后无关。tool_manager也可以是ToolSelector等ordered属性为True的对象，此时保持其给出的顺序。最近使用的max_tool_sets种工具集合会被缓存。
+- build(self, messages, tool_manager) -> dict: 构造chat.completions.create的参数，并要求在流的最后返回用量统计。
+对话历史按原样发送，构造请求时不会改写之前的消息，因此系统提示词、工具列表和之前的轮次在每次请求中都保持相同的前缀。'''
+UsageStats.__doc__ = '''UsageStats类用于记录模型请求的用量和前缀缓存命中情况。它包含以下属性和方法：
+- turns: 每轮对话的累计用量，每项包含prompt_tokens、completion_tokens、prompt_cache_hit_tokens、prompt_cache_miss_tokens和requests。
+- total: 整个会话的累计用量。
+- begin_turn(self): 开始记录新的一轮对话。
+- record(self, usage) -> dict: 记录一次请求返回的usage，返回从中读取的各项数值。
+- hit_rate, turn_hit_rate: 整个会话、以及最近一轮对话的缓存命中率（命中token数占提示词token数的比例）。'''
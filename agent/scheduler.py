@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import uuid
+
+SUBAGENT_PROMPT = ('你是AI助手DeepSeek的一个子代理，负责完成一个较大任务中的一个步骤。你可以调用多个工具。'
+                   '只处理分配给你的步骤，不要处理其他步骤，其他步骤可能正由别的子代理同时处理。'
+                   '完成后用简洁的文字汇报你做了什么、修改了哪些文件以及需要注意的问题，这段汇报会交给主代理。')
+
+class TodoScheduler:
+    max_goal_chars = 2000
+    max_result_chars = 4000
+
+    def __init__(self, engine, max_parallel:int=4)->None:
+        self.engine = engine
+        self.max_parallel = max_parallel
+        return
+
+    @classmethod
+    def _trim(cls, text:str, limit:int)->str:
+        if len(text) <= limit:
+            return text
+        half = limit // 2
+        return f'{text[:half]}\n...（省略{len(text) - limit}个字符）...\n{text[-half:]}'
+
+    def step_prompt(self, session, step:int)->str:
+        todo = session.todo
+        goal = next((m['content'] for m in reversed(session.messages) if m['role'] == 'user' and m.get('content')), '')
+        parts = [
+            f'总体任务：\n{self._trim(goal, self.max_goal_chars)}',
+            f'完整的TODO清单：\n' + '\n'.join(f'{i}. {text}' for i, text in enumerate(todo.todo, start=1)),
+            f'你负责的是第{step}步：\n{todo.todo[step-1]}'
+        ]
+        for dep in todo.deps[step-1]:
+            result = todo.results[dep-1]
+            if result:
+                parts.append(f'第{dep}步（{todo.todo[dep-1]}）的结果：\n{self._trim(result, self.max_result_chars)}')
+        return '\n\n'.join(parts)
+
+    async def run_step(self, session, step:int)->str:
+        child = self.engine.new_session(
+            f'{session.session_id}.step{step}.{uuid.uuid4().hex[:8]}',
+            session.files.dir_path,
+            system_prompt=SUBAGENT_PROMPT,
+            parallel_todo=False
+        )
+        try:
+            return await self.engine.run_turn(child, self.step_prompt(session, step))
+        finally:
+            self.engine.close_session(child.session_id)
+
+    async def run(self, session, max_parallel:Optional[int]=None)->str:
+        todo = session.todo
+        limit = max(max_parallel or self.max_parallel, 1)
+        running:Dict[asyncio.Task, int] = {}
+        attempted = set()
+        done:List[int] = []
+        failed:List[Tuple[int, str]] = []
+        while True:
+            for step in todo.ready_steps():
+                if len(running) >= limit:
+                    break
+                if step in attempted:
+                    continue
+                attempted.add(step)
+                todo.start_step(step)
+                running[asyncio.ensure_future(self.run_step(session, step))] = step
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                step = running.pop(task)
+                try:
+                    todo.finish_step(step, task.result())
+                    done.append(step)
+                except Exception as e:
+                    todo.fail_step(step)
+                    failed.append((step, str(e)))
+        return self.report(session, done, failed)
+
+    def report(self, session, done:List[int], failed:List[Tuple[int, str]])->str:
+        todo = session.todo
+        if not done and not failed:
+            return '没有可以执行的步骤：所有步骤都已完成，或剩余步骤的依赖尚未完成。' + str(todo)
+        parts = [f'子代理完成了{len(done)}个步骤' + (f'，{len(failed)}个步骤失败' if failed else '') + '。']
+        for step in sorted(done):
+            parts.append(f'### 第{step}步：{todo.todo[step-1]}\n{self._trim(todo.results[step-1] or "", self.max_result_chars)}')
+        for step, error in failed:
+            parts.append(f'### 第{step}步：{todo.todo[step-1]}\n[error]: {error}')
+        return '\n\n'.join(parts) + '\n' + str(todo)
+
+TodoScheduler.__doc__ = '''TodoScheduler类把TODO清单中依赖已满足的步骤分派给并发的子代理会话执行。它包含以下方法：
+- __init__(self, engine, max_parallel=4): engine为创建子代理会话的SessionEngine，max_parallel为同时执行的子代理数量上限。
+- step_prompt(self, session, step) -> str: 构造子代理的输入，只包含总体任务（父会话最近一条用户输入）、TODO清单、所负责的步骤以及它所依赖步骤的结果，而不是父会话的完整历史。
+- run_step(self, session, step) -> str: 在同一工作目录下创建一个子代理会话完成第step步，返回子代理的汇报并关闭该会话。
+- run(self, session, max_parallel=None) -> str: 反复分派依赖已满足的步骤，每个步骤完成后立即分派因此变为就绪的步骤，直到没有可以执行的步骤为止。返回合并后的各步骤结果和最新的TODO清单，作为工具结果写回父会话。
+失败的步骤保持未完成状态，依赖它的步骤不会被执行，本次调用也不会重试它。子代理之间共享工作目录，相互独立的步骤不应修改同一个文件。'''
@@ -0,0 +1,415 @@
+from typing import Callable, Dict, List, Optional
+import asyncio
+import functools
+import os
+import time
+import uuid
+from tools import AIFunction, FileManager, ResultStore, TODOListManager, ToolExecutor, ToolSelector
+from .client import LLMClient
+from .history import HistoryManager
+from .journal import SessionJournal
+from .metrics import Metrics
+from .request import RequestBuilder, UsageStats
+from .scheduler import TodoScheduler
+from .stream import StreamAccumulator
+
+SYSTEM_PROMPT = ('你是AI助手DeepSeek。在回答用户的问题时，你可以调用多个工具。'
+                 '复杂任务请调用工具编写TODO待办清单并严格按照清单推进任务。'
+                 '但要注意：TODO只是用于帮助你分步骤处理复杂任务的工具，'
+                 '不应过长、过于详细，也不应重复步骤。如果是简单问题或单一步骤即可完成的问题，不要使用TODO列表。'
+                 '这是一个简短的示例：\n'
+                 '1. 修复程序中的语法错误\n'
+                 '2. 检查程序存在的其他问题\n'
+                 '3. 向用户汇报并确认结果')
+
+# 完成TODO步骤的工具，事务模式下调用后会提交暂存的修改
+STEP_TOOLS = ('complete_step', 'complete_all')
+
+class Session:
+    def __init__(
+        self,
+        session_id:str,
+        work_dir:str=os.path.curdir,
+        system_prompt:str=SYSTEM_PROMPT,
+        max_workers:int=8,
+        token_budget:int=60000,
+        watch:bool=False,
+        journal_dir:Optional[str]=None,
+        select_tools:bool=True,
+        executor:Optional[ToolExecutor]=None,
+        transactional:bool=False,
+        spill_results:bool=True
+    )->None:
+        self.session_id = session_id
+        self.messages = [{'role':'system', 'content':system_prompt}]
+        self.history = HistoryManager(token_budget)
+        self.usage = UsageStats()
+        self.todo = TODOListManager([])
+        self.journal = None
+        self.resumed = False
+        if journal_dir is not None:
+            messages, todo_state = SessionJournal.load(journal_dir, session_id)
+            self.journal = SessionJournal(journal_dir, session_id)
+            if messages:
+                self.messages = messages
+                self.resumed = True
+            else:
+                self.journal.message(self.messages[0])
+            if todo_state is not None:
+                self.todo.restore(todo_state)
+        self.__todo_state = self.todo.state()
+        self.files = FileManager(work_dir)
+        self.transactional = transactional
+        if watch:
+            self.files.watch()
+        self.tools = AIFunction([], [], max_workers=max_workers, executor=executor)
+        self.tools.include(self.todo.function)
+        self.tools.include(self.files.function)
+        self.results = None
+        if spill_results:
+            self.results = ResultStore()
+            self.tools.result_store = self.results
+            self.tools.add_function(
+                name='fetch_result',
+                description='分页查看因过长而被保存起来的工具结果。工具结果过长时只会返回开头、结尾和一个句柄（[result handle]），用该句柄调用本工具查看其余部分。',
+                parameters={
+                    'handle': {'type': 'string', 'description': '工具结果中给出的句柄。'},
+                    'offset': {'type': 'integer', 'description': '（可选）从第几个字符开始，默认为0。'},
+                    'limit': {'type': 'integer', 'description': f'（可选）最多返回的字符数，默认且最多为{self.results.max_fetch}。'}
+                },
+                required=['handle'],
+                function=self.results.fetch,
+                mutating=False,
+                max_result=0
+            )
+        self.selector = ToolSelector(self.tools) if select_tools else None
+        # 同一会话同一时间只处理一轮对话
+        self.lock = asyncio.Lock()
+        return
+
+    @property
+    def exposed_tools(self):
+        return self.tools if self.selector is None else self.selector
+
+    def add_message(self, message:dict)->None:
+        self.messages.append(message)
+        if self.journal is not None:
+            self.journal.message(message)
+
+    def checkpoint(self, force_snapshot:bool=False)->None:
+        # 记录TODO状态的变化；记录数达到阈值或历史被改写时写入完整快照
+        if self.journal is None:
+            return
+        state = self.todo.state()
+        if state != self.__todo_state:
+            self.__todo_state = state
+            self.journal.todo(state)
+        if force_snapshot or self.journal.wants_snapshot():
+            self.journal.snapshot(self.messages, state)
+
+    def begin(self)->None:
+        if self.transactional:
+            self.files.begin()
+
+    def flush(self)->int:
+        # 把事务模式下暂存的修改写入磁盘，例如在一轮对话结束或完成一个TODO步骤时
+        return self.files.commit() if self.files.overlay is not None else 0
+
+    def close(self)->None:
+        if self.files.overlay is not None:
+            self.files.end(commit=True)
+        if self.journal is not None:
+            self.checkpoint()
+            self.journal.close()
+        self.files.unwatch()
+        self.tools.shutdown()
+
+class SessionEngine:
+    def __init__(
+        self,
+        client=None,
+        api_key:Optional[str]=None,
+        base_url:str='https://api.deepseek.com/',
+        model:str='deepseek-chat',
+        max_concurrency:int=16,
+        metrics:Optional[Metrics]=None,
+        tool_timeout:Optional[float]=60.0,
+        tool_workers:int=32,
+        max_subagents:int=4
+    )->None:
+        # client可以是共用的LLMClient；否则为本引擎创建一个，第一次请求模型前才导入openai并创建连接池
+        self.__owns_llm = not isinstance(client, LLMClient)
+        self.llm = LLMClient(api_key, base_url, client) if self.__owns_llm else client
+        self.model = model
+        self.requests = RequestBuilder(model)
+        self.sessions:Dict[str, Session] = {}
+        # asyncio.Semaphore按先来先服务的顺序唤醒等待者，每个会话一次只排一个请求
+        self.slots = asyncio.Semaphore(max_concurrency)
+        # 没有sink时不安装钩子，也不计时
+        self.metrics = metrics if metrics else None
+        # 所有会话共用一个常驻线程池执行工具，单个卡住的工具只会超时，不会拖住整个事件循环
+        self.executor = ToolExecutor(max_workers=tool_workers, default_timeout=tool_timeout)
+        self.scheduler = TodoScheduler(self, max_subagents)
+        self.__loop:Optional[asyncio.AbstractEventLoop] = None
+        return
+
+    @property
+    def client(self):
+        return self.llm.client()
+
+    def new_session(self, session_id:Optional[str]=None, work_dir:str=os.path.curdir, parallel_todo:bool=True, **kwargs)->Session:
+        session_id = session_id or uuid.uuid4().hex
+        if session_id in self.sessions:
+            raise ValueError(f'Session {session_id} already exists.')
+        kwargs.setdefault('executor', self.executor)
+        session = Session(session_id, work_dir, **kwargs)
+        if parallel_todo:
+            session.tools.add_function(
+                name='run_todo',
+                description='把TODO清单中依赖已满足、相互独立的步骤交给多个子代理并行完成，每完成一步就继续分派因此变为就绪的步骤，直到没有可执行的步骤。返回各步骤的汇报和最新的TODO清单。适合已用depends_on声明依赖、可以拆分为独立步骤的较大任务。',
+                parameters={
+                    'max_parallel': {'type': 'integer', 'description': f'（可选）同时执行的子代理数量上限，默认为{self.scheduler.max_parallel}。'}
+                },
+                required=[],
+                function=functools.partial(self._run_todo, session)
+            )
+        if self.metrics is not None:
+            session.tools.add_hook(self.metrics.tool_hook(session_id))
+        self.sessions[session_id] = session
+        return session
+
+    def get(self, session_id:str)->Session:
+        if session_id not in self.sessions:
+            raise ValueError(f'Session {session_id} not found.')
+        return self.sessions[session_id]
+
+    def close_session(self, session_id:str)->None:
+        self.sessions.pop(session_id).close()
+
+    def _run_todo(self, session:Session, max_parallel:Optional[int]=None)->str:
+        # 工具在线程中执行，把调度提交回事件循环并等待它完成
+        loop = self.__loop
+        if loop is None:
+            raise RuntimeError('run_todo can only be called during run_turn.')
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError('run_todo cannot be called from the event loop thread.')
+        # 子代理直接读写磁盘，先提交本会话暂存的修改
+        session.flush()
+        try:
+            return asyncio.run_coroutine_threadsafe(self.scheduler.run(session, max_parallel), loop).result()
+        finally:
+            # 子代理通过各自的FileManager修改了工作目录
+            session.files.refresh()
+
+    async def _complete(self, session:Session, on_text:Optional[Callable]=None, on_tool:Optional[Callable]=None):
+        loop = asyncio.get_running_loop()
+        acc = StreamAccumulator()
+        early:Dict[int, asyncio.Future] = {}
+        # 被中断的流中已经开始执行的只读工具，(名称, 参数) -> Future
+        started:Dict[tuple, asyncio.Future] = {}
+        barrier = False
+        def dispatch(completed):
+            # 参数完整的只读工具立即开始执行；一旦出现会修改状态的工具，后续调用都等到流结束后按顺序执行
+            nonlocal barrier
+            for buf in completed:
+                if on_tool is not None:
+                    on_tool(buf.name)
+                if buf.error is not None:
+                    continue
+                if barrier or session.tools.is_mutating(buf.name):
+                    barrier = True
+                    continue
+                future = started.pop((buf.name, buf.arguments), None)
+                if future is None:
+                    future = loop.run_in_executor(None, functools.partial(session.tools, buf.name, **buf.kwargs))
+                early[buf.index] = future
+        if session.history.compact(session.messages):
+            # 旧的文件内容可能已被替换为占位信息，不能再用“未变化”提示引用它们
+            session.files.read_cache.clear()
+            if session.selector is not None:
+                # 前缀缓存已经失效，顺便移除长时间未使用的工具组
+                session.selector.evict()
+            session.checkpoint(force_snapshot=True)
+        metrics = self.metrics
+        llm = self.llm
+        request = self.requests.build(session.messages, session.exposed_tools)
+        tokens = session.history.total(session.messages)
+        attempt = 0
+        while True:
+            # 等待限流时不占用并发名额
+            await llm.throttle(tokens)
+            try:
+                async with self.slots:
+                    if metrics is not None:
+                        start = time.perf_counter()
+                        ttft = None
+                    response = await llm.client().chat.completions.create(**request)
+                    async for chunk in response:
+                        if metrics is not None and ttft is None:
+                            ttft = time.perf_counter() - start
+                        before = len(acc.content_parts)
+                        completed = acc.feed(chunk)
+                        if on_text is not None and len(acc.content_parts) > before:
+                            on_text(acc.content_parts[-1])
+                        if completed:
+                            dispatch(completed)
+                break
+            except Exception as e:
+                error = e
+                delay = llm.retry_delay(error, attempt)
+                if delay is None:
+                    raise
+            # 用同样的请求重试本次回复，之前轮次的工具结果已经在messages中，不会重新执行；
+            # 中断前已经开始执行的只读工具在重试的回复给出相同调用时直接复用
+            for index, future in early.items():
+                buf = acc.calls[index]
+                started[(buf.name, buf.arguments)] = future
+            acc, early, barrier = StreamAccumulator(), {}, False
+            attempt += 1
+            if metrics is not None:
+                metrics.retry(session.session_id, attempt, delay, error)
+            await asyncio.sleep(delay)
+        dispatch(acc.finish())
+        if started:
+            # 重试的回复没有再给出的调用仍在线程中执行，等它们结束，避免与之后的写操作交错
+            await asyncio.wait(list(started.values()))
+        usage = session.usage.record(acc.usage)
+        if usage is not None:
+            llm.settle(tokens, usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+        if metrics is not None:
+            metrics.request(session.session_id, ttft, time.perf_counter() - start, usage, len(acc.calls))
+        return acc, early
+
+    async def _run_tools(self, session:Session, acc:StreamAccumulator, early:Dict[int, asyncio.Future])->List[str]:
+        calls = acc.tool_calls
+        rest = [buf for buf in calls if buf.index not in early and buf.error is None]
+        if early and any(session.tools.is_mutating(buf.name) for buf in rest):
+            # 提前开始的只读调用可能仍在执行，先等它们完成，再执行会修改状态的调用
+            await asyncio.wait(list(early.values()))
+        # 工具调用涉及磁盘I/O，放到线程中执行，不阻塞事件循环上的其他会话
+        rest_results = await asyncio.get_running_loop().run_in_executor(
+            None, session.tools.call_many, [(buf.name, buf.kwargs) for buf in rest]
+        )
+        by_index = dict(zip((buf.index for buf in rest), rest_results))
+        results = []
+        for buf in calls:
+            if buf.error is not None:
+                results.append(buf.error)
+            elif buf.index in early:
+                results.append(await early[buf.index])
+            else:
+                results.append(by_index[buf.index])
+        return results
+
+    async def run_turn(
+        self,
+        session:Session,
+        prompt:str,
+        on_text:Optional[Callable[[str], None]]=None,
+        on_tool:Optional[Callable[[str], None]]=None
+    )->str:
+        self.__loop = asyncio.get_running_loop()
+        async with session.lock:
+            session.add_message({'role':'user', 'content':prompt})
+            session.usage.begin_turn()
+            session.files.read_cache.next_turn()
+            if session.selector is not None:
+                session.selector.next_turn()
+            session.begin()
+            start = time.perf_counter()
+            reply = []
+            try:
+                await self._turn(session, reply, on_text, on_tool)
+            except BaseException:
+                # 本轮没有正常结束，丢弃尚未提交的修改，工作区停留在上一个检查点
+                if session.files.overlay is not None:
+                    session.files.rollback()
+                raise
+            await asyncio.get_running_loop().run_in_executor(None, session.flush)
+            session.checkpoint()
+            if self.metrics is not None:
+                self.metrics.turn(session.session_id, time.perf_counter() - start, session.usage.turns[-1])
+            return ''.join(reply)
+
+    async def _turn(
+        self,
+        session:Session,
+        reply:List[str],
+        on_text:Optional[Callable[[str], None]],
+        on_tool:Optional[Callable[[str], None]]
+    )->None:
+        while True:
+            acc, early = await self._complete(session, on_text, on_tool)
+            reply.append(acc.content)
+            session.add_message({'role':'assistant', 'content':acc.content})
+            if not acc.calls:
+                break
+            results = await self._run_tools(session, acc, early)
+            for buf, res in zip(acc.tool_calls, results):
+                session.add_message({
+                    'role':'assistant',
+                    'tool_calls':[{
+                        'id':buf.id,
+                        'type':'function',
+                        'function':{
+                            'name':buf.name,
+                            'arguments':buf.arguments
+                        }
+                    }]
+                })
+                session.add_message({
+                    'role':'tool',
+                    'tool_call_id':buf.id,
+                    'content':res
+                })
+            if session.files.overlay is not None and any(buf.name in STEP_TOOLS for buf in acc.tool_calls):
+                # 完成一个TODO步骤也是一个检查点
+                await asyncio.get_running_loop().run_in_executor(None, session.flush)
+            session.checkpoint()
+            if acc.finish_reason == 'stop':
+                break
+
+    async def aclose(self)->None:
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        # 不等待超时后仍未退出的工具线程
+        self.executor.shutdown(wait=False)
+        if self.__owns_llm:
+            await self.llm.aclose()
+        if self.metrics is not None:
+            self.metrics.close()
+
+Session.__doc__ = '''Session类保存一个用户会话的全部状态。它包含以下属性：
+- session_id: 会话的唯一标识。
+- messages: 发送给模型的对话历史，第一条为系统提示词。
+- history: 控制对话历史token预算的HistoryManager，每次请求模型前都会用它压缩messages。
+- usage: 记录每轮和整个会话用量及前缀缓存命中情况的UsageStats。
+- todo: 该会话专属的TODOListManager。
+- files: 该会话专属的FileManager，管理work_dir目录。watch为True时会启动后台监视器，使目录树与磁盘保持同步。
+- tools: 合并了todo和files工具的AIFunction，max_workers控制同一轮工具调用的并发数。executor不为None时，工具在该ToolExecutor中带超时执行。
+- results: spill_results为True（默认）时为该会话的ResultStore：超过长度上限的工具结果保存在其中，对话历史中只保留开头、结尾和句柄，模型可以调用fetch_result分页查看完整结果；为False时为None，结果总是完整返回。
+- selector: select_tools为True（默认）时为该会话的ToolSelector，每次请求只发送核心工具和已加载的工具组；为False时为None。exposed_tools返回实际发送给模型的工具集合。
+- transactional: 为True时以事务模式运行：每轮对话开始时调用files.begin()，文件修改先暂存在内存中，在本轮结束、完成TODO步骤（STEP_TOOLS）、分派子代理和关闭会话时提交（flush）；本轮因异常中断时回滚尚未提交的修改。
+- lock: 保证同一会话同一时间只处理一轮对话的asyncio.Lock。
+- journal: journal_dir不为None时为该会话的SessionJournal。创建会话时如果journal_dir中已有该会话的记录，会从最新快照和其后的日志恢复messages和TODO状态，并将resumed设为True。
+对话历史应通过add_message追加，以便同时写入日志；checkpoint用于记录TODO状态的变化，并在需要时写入快照。'''
+Session.close.__doc__ = '''close方法用于释放会话占用的线程池等资源。'''
+SessionEngine.__doc__ = '''SessionEngine类基于AsyncOpenAI，在一个事件循环中同时服务多个会话。它包含以下方法：
+- __init__(self, client=None, api_key=None, base_url='https://api.deepseek.com/', model='deepseek-chat', max_concurrency=16, metrics=None): 初始化引擎。client可以是一个LLMClient，由多个引擎（包括其他线程中的引擎）共用同一套限流配额，引擎关闭时不会关闭它；也可以是已有的异步client，或者为None，此时引擎用api_key和base_url创建自己的LLMClient，并在第一次请求模型时才导入openai、建立连接池。max_concurrency限制同时进行中的模型请求数量。metrics为带有sink的Metrics时，会记录每次工具调用、每次模型请求和每轮对话的耗时与用量。所有会话的工具都在一个tool_workers个线程的ToolExecutor中执行，只读工具超过tool_timeout秒未完成时返回超时错误。max_subagents为run_todo同时运行的子代理会话数量上限。
+- new_session(self, session_id=None, work_dir='.', parallel_todo=True, **kwargs) -> Session: 创建并登记一个新会话，kwargs会传递给Session。parallel_todo为True时会为会话注册run_todo工具，由TodoScheduler把TODO中相互独立的步骤交给最多max_subagents个子代理会话并行完成；子代理会话本身不注册该工具。
+- get(self, session_id) -> Session: 根据标识获取会话。
+- close_session(self, session_id): 关闭并移除会话。
+- run_turn(self, session, prompt, on_text=None, on_tool=None) -> str: 处理一轮用户输入，直到模型不再调用工具为止。
+- aclose(self): 关闭所有会话、metrics以及引擎自己创建的LLMClient。
+请求参数由RequestBuilder构造，工具列表的顺序和序列化方式固定，以保持前缀缓存稳定。模型请求先经过LLMClient的令牌桶限流，再通过一个先来先服务的信号量排队；连接错误、流中断以及408/409/429/5xx响应会在退避后用同样的请求重试本次回复，本轮已经执行的工具不会重新执行，中断前已开始执行的只读工具在重试的回复给出相同调用时直接复用其结果。每个会话每次只占用一个名额，并在每次请求结束后重新排到队尾，因此请求频繁的会话不会饿死其他会话。'''
+SessionEngine.run_turn.__doc__ = '''run_turn方法用于处理会话中的一轮用户输入。它接受以下参数：
+- session: 要处理的会话。
+- prompt: 用户输入的内容。
+- on_text: 可选的回调函数，每收到一段模型输出的文本时调用一次，参数为该段文本。
+- on_tool: 可选的回调函数，每次调用工具前调用一次，参数为工具名称。
+该方法会把用户输入加入对话历史，以流式方式请求模型，并在线程中执行模型返回的工具调用，把结果写回对话历史后再次请求模型，直到模型结束回答。返回本轮模型输出的全部文本。
+流式输出由StreamAccumulator累积：某个只读工具的参数一旦完整，就会在模型继续输出后续调用的同时开始执行；第一个会修改状态的工具及其之后的调用则在流结束后按原顺序执行。工具结果始终按tool_call_id的原顺序写回对话历史。'''
@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional
+import json
+
+class ToolCallBuffer:
+    __slots__ = ('index', 'id', 'name', 'parts', 'depth', 'in_string', 'escape', 'started', 'complete', 'kwargs', 'error')
+
+    def __init__(self, index:int)->None:
+        self.index = index
+        self.id = None
+        self.name = ''
+        self.parts:List[str] = []
+        # 增量扫描JSON的状态：括号深度、是否在字符串内、上一个字符是否为转义符
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.complete = False
+        self.kwargs:Optional[dict] = None
+        self.error:Optional[str] = None
+        return
+
+    @property
+    def arguments(self)->str:
+        return ''.join(self.parts)
+
+    def feed(self, text:str)->bool:
+        self.parts.append(text)
+        if self.complete:
+            return False
+        depth, in_string, escape, started = self.depth, self.in_string, self.escape, self.started
+        for ch in text:
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{' or ch == '[':
+                depth += 1
+                started = True
+            elif ch == '}' or ch == ']':
+                depth -= 1
+        self.depth, self.in_string, self.escape, self.started = depth, in_string, escape, started
+        if started and depth <= 0:
+            self.close()
+            return True
+        return False
+
+    def close(self)->None:
+        if self.complete:
+            return
+        self.complete = True
+        arguments = self.arguments
+        try:
+            kwargs = json.loads(arguments) if arguments.strip() else {}
+            if not isinstance(kwargs, dict):
+                raise ValueError('arguments must be a JSON object')
+            self.kwargs = kwargs
+        except ValueError as e:
+            self.error = f'Error calling function {self.name}: invalid JSON arguments ({str(e)}).'
+
+class StreamAccumulator:
+    def __init__(self)->None:
+        self.content_parts:List[str] = []
+        self.calls:Dict[int, ToolCallBuffer] = {}
+        self.finish_reason:Optional[str] = None
+        self.usage = None
+        return
+
+    @property
+    def content(self)->str:
+        return ''.join(self.content_parts)
+
+    def feed(self, chunk)->List[ToolCallBuffer]:
+        completed = []
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return completed
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        if delta.content:
+            self.content_parts.append(delta.content)
+        if delta.tool_calls:
+            for tcd in delta.tool_calls:
+                buf = self.calls.get(tcd.index)
+                if buf is None:
+                    # 新的工具调用开始时，之前的调用参数必然已经完整
+                    for prev in self.calls.values():
+                        if not prev.complete:
+                            prev.close()
+                            completed.append(prev)
+                    buf = self.calls[tcd.index] = ToolCallBuffer(tcd.index)
+                if tcd.id:
+                    buf.id = tcd.id
+                if tcd.function is not None:
+                    if tcd.function.name:
+                        buf.name = tcd.function.name
+                    if tcd.function.arguments and buf.feed(tcd.function.arguments):
+                        completed.append(buf)
+        return completed
+
+    def finish(self)->List[ToolCallBuffer]:
+        completed = []
+        for buf in self.calls.values():
+            if not buf.complete:
+                buf.close()
+                completed.append(buf)
+        return completed
+
+    @property
+    def tool_calls(self)->List[ToolCallBuffer]:
+        return [self.calls[idx] for idx in sorted(self.calls)]
+
+ToolCallBuffer.__doc__ = '''ToolCallBuffer类用于在流式输出中累积单个工具调用。它包含以下属性和方法：
+- index, id, name: 工具调用在本轮中的序号、tool_call_id和函数名称。
+- parts: 参数JSON的各个片段，只在需要时才拼接，避免反复重新分配字符串。
+- feed(self, text) -> bool: 追加一段参数文本，并增量扫描JSON的括号和字符串状态；当参数第一次变得完整时返回True。
+- close(self): 结束累积并解析参数，解析结果保存在kwargs中；参数不是合法的JSON对象时，错误信息保存在error中。
+- arguments: 拼接后的完整参数字符串。'''
+StreamAccumulator.__doc__ = '''StreamAccumulator类用于累积一次流式回复。它包含以下属性和方法：
+- feed(self, chunk) -> List[ToolCallBuffer]: 处理一个流式数据块，返回因此而变得完整的工具调用（可能为空）。
+- finish(self) -> List[ToolCallBuffer]: 流结束时调用，结束所有尚未完整的工具调用并返回它们。
+- content: 本次回复的全部文本，由content_parts拼接而成。
+- tool_calls: 按序号排列的全部工具调用。
+- finish_reason, usage: 流中最后一次出现的结束原因和用量统计。
+每个工具调用的参数在数据到达时即被增量扫描，因此无需等待整个流结束就能知道某个调用的参数已经完整，可以提前执行。'''
@@ -0,0 +1,183 @@
+from typing import Dict, List
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools import AIFunction, FileManager, TODOListManager
+from bench.mock_server import MockLLMServer
+
+def _percentile(values:List[float], q:float)->float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+def make_workspace()->str:
+    path = tempfile.mkdtemp(prefix='simpleagent-bench-')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in ('README.md', 'requirements.txt'):
+        with open(os.path.join(root, name), 'r', encoding='utf-8') as src, open(os.path.join(path, name), 'w', encoding='utf-8') as dst:
+            dst.write(src.read())
+    for i in range(20):
+        os.makedirs(os.path.join(path, f'pkg{i}'), exist_ok=True)
+        with open(os.path.join(path, f'pkg{i}', 'mod.py'), 'w', encoding='utf-8') as f:
+            f.write(''.join(f'def func_{j}(x):\n    return x + {j}\n' for j in range(50)))
+    return path
+
+def bench_dispatch(calls:int=100000)->Dict[str, float]:
+    def noop(x:int=0):
+        return 'ok'
+    tools = AIFunction([], [])
+    tools.add_function('noop', 'noop', {'x': {'type': 'integer', 'description': 'x'}}, [], noop)
+    tools.include(TODOListManager([]).function)
+    tools.include(FileManager(os.curdir).function)
+    start = time.perf_counter()
+    for _ in range(calls):
+        noop(x=1)
+    direct = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        tools('noop', x=1)
+    dispatched = time.perf_counter() - start
+    # 安装一个空钩子，衡量开启统计后每次调用增加的开销
+    tools.add_hook(lambda *record: None)
+    start = time.perf_counter()
+    for _ in range(calls):
+        tools('noop', x=1)
+    hooked = time.perf_counter() - start
+    return {
+        'dispatch_overhead_us': (dispatched - direct) / calls * 1e6,
+        'dispatch_hook_overhead_us': (hooked - dispatched) / calls * 1e6,
+        'dispatch_calls': calls
+    }
+
+async def bench_loop(server:MockLLMServer, sessions:int, turns:int, work_dir:str)->Dict[str, float]:
+    from agent import LLMClient, SessionEngine
+    engine = SessionEngine(client=LLMClient(api_key='bench', base_url=server.base_url), max_concurrency=sessions)
+    # 与test.py相同，在计时之前创建连接池并建立连接
+    await engine.llm.warm()
+    ttft:List[float] = []
+    turn_times:List[float] = []
+    memory:List[int] = []
+    async def run(idx:int):
+        session = engine.new_session(f'bench-{idx}', work_dir)
+        for t in range(turns):
+            first = []
+            start = time.perf_counter()
+            def on_text(text, first=first, start=start):
+                if not first:
+                    first.append(time.perf_counter() - start)
+            await engine.run_turn(session, f'第{t}个问题：请介绍一下这个项目。', on_text=on_text)
+            turn_times.append(time.perf_counter() - start)
+            ttft.extend(first)
+            memory.append(tracemalloc.get_traced_memory()[0])
+        return session
+    tracemalloc.start()
+    base_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        done = await asyncio.gather(*[run(i) for i in range(sessions)])
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    hit_rate = statistics.mean(s.usage.hit_rate for s in done)
+    await engine.aclose()
+    head = memory[:max(len(memory) // 10, 1)]
+    tail = memory[-max(len(memory) // 10, 1):]
+    return {
+        'turns_per_sec': sessions * turns / elapsed,
+        'ttft_ms_p50': _percentile(ttft, 0.5) * 1000,
+        'ttft_ms_p95': _percentile(ttft, 0.95) * 1000,
+        'turn_ms_p50': _percentile(turn_times, 0.5) * 1000,
+        'turn_ms_p95': _percentile(turn_times, 0.95) * 1000,
+        'memory_growth_kb_per_turn': (statistics.mean(tail) - statistics.mean(head)) / max(len(memory) - len(head), 1) / 1024,
+        'memory_peak_mb': (max(memory) - base_memory) / 1024 / 1024 if memory else 0.0,
+        'cache_hit_rate': hit_rate,
+    }
+
+def git_revision()->str:
+    # 记录结果对应的提交，工作区有未提交的修改时带有-dirty后缀
+    try:
+        proc = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+    except OSError:
+        return 'unknown'
+    return proc.stdout.strip() if proc.returncode == 0 else 'unknown'
+
+def load_baseline(path:str, settings:Dict[str, object])->Dict[str, float]:
+    # 设置不同的结果之间没有可比性，发现不一致时直接报错，而不是给出误导性的对比
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    meta = baseline.get('meta', {})
+    diff = [f'{key}={meta.get(key)!r}（当前为{value!r}）' for key, value in settings.items() if meta.get(key) != value]
+    if diff:
+        raise ValueError(f'基线{path}的测试设置与本次不同：{", ".join(diff)}。请使用相同的参数运行，或重新记录基线。')
+    return baseline['metrics']
+
+def compare(current:Dict[str, float], baseline:Dict[str, float])->str:
+    lines = [f'{"metric":<28}{"baseline":>14}{"current":>14}{"change":>10}']
+    for key, value in current.items():
+        if key not in baseline or not isinstance(value, (int, float)):
+            continue
+        old = baseline[key]
+        change = f'{(value - old) / old * 100:+.1f}%' if old else 'n/a'
+        lines.append(f'{key:<28}{old:>14.3f}{value:>14.3f}{change:>10}')
+    return '\n'.join(lines)
+
+def main()->None:
+    parser = argparse.ArgumentParser(description='基于本地模拟服务器的智能体循环基准测试。')
+    parser.add_argument('--sessions', type=int, default=4, help='并发会话数')
+    parser.add_argument('--turns', type=int, default=25, help='每个会话的轮数')
+    parser.add_argument('--ttft', type=float, default=0.02, help='模拟服务器的首包延迟（秒）')
+    parser.add_argument('--chunks-per-sec', type=float, default=500.0, help='模拟服务器每秒发送的数据块数')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json'), help='结果保存路径')
+    parser.add_argument('--compare', help='与之比较的基线结果文件')
+    parser.add_argument('--no-save', action='store_true', help='不保存结果')
+    args = parser.parse_args()
+    settings = {'sessions': args.sessions, 'turns': args.turns, 'ttft': args.ttft, 'chunks_per_sec': args.chunks_per_sec}
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare, settings)
+        except ValueError as e:
+            parser.error(str(e))
+    revision = git_revision()
+
+    metrics = bench_dispatch()
+    work_dir = make_workspace()
+    server = MockLLMServer(ttft=args.ttft, chunks_per_sec=args.chunks_per_sec).start()
+    try:
+        metrics.update(asyncio.run(bench_loop(server, args.sessions, args.turns, work_dir)))
+    except ImportError as e:
+        print(f'跳过端到端测试（{e}）。请先执行 pip install -r requirements.txt', file=sys.stderr)
+    finally:
+        server.stop()
+    result = {
+        'meta': {
+            'commit': revision, 'python': platform.python_version(), 'platform': platform.platform(),
+            **settings, 'time': time.strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'metrics': metrics
+    }
+    if baseline is not None:
+        print(compare(metrics, baseline))
+    else:
+        print(json.dumps(metrics, indent=2))
+    if not args.no_save:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+import argparse
+import json
+import threading
+import time
+import uuid
+
+DEFAULT_SCRIPT = [
+    {
+        'content': '好的，我先查看一下目录结构和相关文件。',
+        'tool_calls': [
+            {'name': 'list_files', 'arguments': {}},
+            {'name': 'read_file', 'arguments': {'file_name': 'README.md'}},
+            {'name': 'read_file', 'arguments': {'file_name': 'requirements.txt'}}
+        ]
+    },
+    {'content': '已经完成。这个项目是一个可以读写文件、管理TODO清单的命令行AI助手。'}
+]
+
+def _pieces(text:str, size:int)->List[str]:
+    return [text[i:i+size] for i in range(0, len(text), size)] or ['']
+
+def _common_prefix(a:str, b:str)->int:
+    # 二分查找公共前缀长度，切片比较在C中完成
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+class MockLLMServer:
+    def __init__(
+        self,
+        host:str='127.0.0.1',
+        port:int=0,
+        script:Optional[list]=None,
+        replay:Optional[List[List[dict]]]=None,
+        ttft:float=0.05,
+        chunks_per_sec:float=200.0,
+        chunk_chars:int=4,
+        fail_first:int=0,
+        drop_first:int=0
+    )->None:
+        self.script = script or DEFAULT_SCRIPT
+        self.replay = replay
+        self.ttft = ttft
+        self.chunks_per_sec = chunks_per_sec
+        self.chunk_chars = chunk_chars
+        # 前fail_first个请求返回429，用于测试客户端的重试
+        self.fail_first = fail_first
+        # 前drop_first个流式回复在中途断开连接，用于测试流中断后的重试
+        self.drop_first = drop_first
+        self.requests = 0
+        self.streams = 0
+        self.lock = threading.Lock()
+        self.prompts:List[str] = []
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = json.dumps({'object':'list', 'data':[{'id':'deepseek-chat', 'object':'model'}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length)
+                server.handle(self, raw)
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+        return
+
+    @property
+    def base_url(self)->str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self)->'MockLLMServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-llm', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self)->None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def pick(self, messages:List[dict])->int:
+        # 本轮用户提问之后已经有几条模型回复，就返回脚本中的第几项
+        step = 0
+        for m in reversed(messages):
+            if m.get('role') == 'user':
+                break
+            if m.get('role') == 'assistant' and 'tool_calls' not in m:
+                step += 1
+        return step
+
+    def usage(self, prompt:str, completion_chars:int)->dict:
+        with self.lock:
+            # 用与最近请求的最长公共前缀模拟前缀缓存命中
+            hit = 0
+            for prev in self.prompts[-16:]:
+                hit = max(hit, _common_prefix(prev, prompt))
+            self.prompts.append(prompt)
+            del self.prompts[:-16]
+        prompt_tokens = len(prompt) // 4 + 1
+        hit_tokens = min(hit // 4 // 64 * 64, prompt_tokens)
+        completion_tokens = completion_chars // 4 + 1
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_cache_hit_tokens': hit_tokens,
+            'prompt_cache_miss_tokens': prompt_tokens - hit_tokens
+        }
+
+    def chunks(self, step:int, model:str)->List[dict]:
+        if self.replay is not None:
+            return self.replay[step % len(self.replay)]
+        entry = self.script[min(step, len(self.script) - 1)]
+        base = {'id': 'chatcmpl-' + uuid.uuid4().hex[:12], 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model}
+        def chunk(delta, finish=None):
+            return dict(base, choices=[{'index':0, 'delta':delta, 'finish_reason':finish}])
+        res = [chunk({'role':'assistant', 'content':''})]
+        for piece in _pieces(entry.get('content', ''), self.chunk_chars):
+            if piece:
+                res.append(chunk({'content':piece}))
+        for idx, tc in enumerate(entry.get('tool_calls', ())):
+            arguments = json.dumps(tc['arguments'], ensure_ascii=False)
+            res.append(chunk({'tool_calls':[{'index':idx, 'id':f'call_{uuid.uuid4().hex[:8]}', 'type':'function', 'function':{'name':tc['name'], 'arguments':''}}]}))
+            for piece in _pieces(arguments, self.chunk_chars * 2):
+                res.append(chunk({'tool_calls':[{'index':idx, 'function':{'arguments':piece}}]}))
+        res.append(chunk({}, 'tool_calls' if entry.get('tool_calls') else 'stop'))
+        return res
+
+    def handle(self, handler:BaseHTTPRequestHandler, raw:bytes)->None:
+        with self.lock:
+            self.requests += 1
+            failing = self.requests <= self.fail_first
+        if failing:
+            body = b'{"error":{"message":"Rate limit reached","type":"rate_limit_error"}}'
+            handler.send_response(429)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Retry-After', '0')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+        request = json.loads(raw or b'{}')
+        messages = request.get('messages', [])
+        model = request.get('model', 'deepseek-chat')
+        chunks = self.chunks(self.pick(messages), model)
+        completion_chars = sum(len(json.dumps(c.get('choices', [{}])[0].get('delta', {}) if c.get('choices') else {})) for c in chunks)
+        usage = self.usage(json.dumps(messages, ensure_ascii=False, sort_keys=True), completion_chars)
+        if not request.get('stream'):
+            body = json.dumps(self.collapse(chunks, usage, model), ensure_ascii=False).encode('utf-8')
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        def send(data:str):
+            payload = f'data: {data}\n\n'.encode('utf-8')
+            handler.wfile.write(f'{len(payload):x}\r\n'.encode('ascii') + payload + b'\r\n')
+            handler.wfile.flush()
+        interval = 1.0 / self.chunks_per_sec if self.chunks_per_sec > 0 else 0.0
+        with self.lock:
+            self.streams += 1
+            drop = len(chunks) // 2 if self.streams <= self.drop_first else None
+        time.sleep(self.ttft)
+        try:
+            for i, c in enumerate(chunks):
+                if i == drop:
+                    # 不发送结束块就关闭连接，客户端会看到不完整的响应体
+                    handler.close_connection = True
+                    return
+                if i and interval:
+                    time.sleep(interval)
+                send(json.dumps(c, ensure_ascii=False))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                send(json.dumps({'id':chunks[0].get('id'), 'object':'chat.completion.chunk', 'created':int(time.time()), 'model':model, 'choices':[], 'usage':usage}))
+            send('[DONE]')
+            handler.wfile.write(b'0\r\n\r\n')
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def collapse(chunks:List[dict], usage:dict, model:str)->dict:
+        content, calls, finish = [], {}, 'stop'
+        for c in chunks:
+            for choice in c.get('choices', ()):
+                delta = choice.get('delta', {})
+                content.append(delta.get('content') or '')
+                for tc in delta.get('tool_calls') or ():
+                    call = calls.setdefault(tc['index'], {'id':None, 'type':'function', 'function':{'name':'', 'arguments':''}})
+                    call['id'] = tc.get('id') or call['id']
+                    call['function']['name'] += tc.get('function', {}).get('name') or ''
+                    call['function']['arguments'] += tc.get('function', {}).get('arguments') or ''
+                finish = choice.get('finish_reason') or finish
+        message = {'role':'assistant', 'content':''.join(content)}
+        if calls:
+            message['tool_calls'] = [calls[i] for i in sorted(calls)]
+        return {'id':'chatcmpl-' + uuid.uuid4().hex[:12], 'object':'chat.completion', 'created':int(time.time()), 'model':model,
+                'choices':[{'index':0, 'message':message, 'finish_reason':finish}], 'usage':usage}
+
+def load_replay(path:str)->List[List[dict]]:
+    # 每行是一次回复的全部数据块（JSON数组）
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main()->None:
+    parser = argparse.ArgumentParser(description='OpenAI兼容的本地模拟服务器，按脚本或录制的数据块回放流式回复。')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--script', help='JSON脚本文件：由{"content":..., "tool_calls":[{"name":..., "arguments":{...}}]}组成的列表')
+    parser.add_argument('--replay', help='录制的数据块文件（JSONL，每行一次回复）')
+    parser.add_argument('--ttft', type=float, default=0.05, help='首个数据块前的延迟（秒）')
+    parser.add_argument('--chunks-per-sec', type=float, default=200.0, help='每秒发送的数据块数，0表示不限速')
+    parser.add_argument('--fail-first', type=int, default=0, help='前N个请求返回429')
+    parser.add_argument('--drop-first', type=int, default=0, help='前N个流式回复在中途断开连接')
+    args = parser.parse_args()
+    script = None
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+    server = MockLLMServer(args.host, args.port, script, load_replay(args.replay) if args.replay else None, args.ttft, args.chunks_per_sec, fail_first=args.fail_first, drop_first=args.drop_first)
+    print(f'Mock LLM server listening on {server.base_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+MockLLMServer.__doc__ = '''MockLLMServer类是一个本地的OpenAI兼容服务器，用于在没有DeepSeek API KEY的情况下测试和评测智能体循环。它包含以下参数和方法：
+- script: 回复脚本，第i项用于本轮用户提问之后的第i次请求；每项可以包含content和tool_calls，多个工具调用会以多个index的tool_calls增量发送。
+- replay: 录制的数据块列表，给出时按请求顺序循环回放，忽略script。
+- ttft: 首个数据块前的延迟（秒）；chunks_per_sec: 每秒发送的数据块数；chunk_chars: 每个内容数据块的字符数。
+- fail_first: 前N个请求返回429，用于测试重试逻辑；drop_first: 前N个流式回复只发送一半数据块就断开连接，用于测试流中断后的重试。
+- start(self) / stop(self): 在后台线程中启动或停止服务器；base_url为客户端应使用的地址。
+请求中带有stream_options.include_usage时，会在流的最后发送用量统计，其中的prompt_cache_hit_tokens按与最近请求的最长公共前缀模拟。'''
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+from typing import Dict, List, Tuple
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench.agent_bench import compare, git_revision, load_baseline
+
+# 与test.py相同的启动过程：导入、创建引擎和会话，但不发送请求
+STARTUP = '''
+import os, sys
+from agent import JsonlSink, Metrics, PrometheusSink, SessionEngine
+engine = SessionEngine(api_key='bench', metrics=Metrics([]))
+session = engine.new_session('bench', {work_dir!r})
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+'''
+
+# 启动时不应导入的模块：它们只在第一次请求模型或第一次使用对应工具时才需要
+HEAVY_MODULES = ('openai', 'httpx', 'pydantic', 'http.server', 'tools.search_index', 'tools.watcher')
+
+def _command(work_dir:str)->List[str]:
+    code = 'import json\n' + STARTUP.format(work_dir=work_dir, heavy=HEAVY_MODULES)
+    return [sys.executable, '-X', 'importtime', '-c', code]
+
+def parse_importtime(stderr:str)->Tuple[float, List[Tuple[str, float]]]:
+    # 只统计site之后的顶层导入，即由启动代码本身引起的导入
+    top:List[Tuple[str, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue
+        if name.startswith('  '):
+            continue
+        name = name.strip()
+        if name == 'site':
+            top.clear()
+            continue
+        top.append((name, int(cumulative) / 1000))
+    return sum(ms for _, ms in top), sorted(top, key=lambda item: -item[1])
+
+def bench_startup(runs:int=7, work_dir:str=ROOT)->Dict[str, object]:
+    cmd = _command(work_dir)
+    walls, imports = [], []
+    heavy:List[str] = []
+    slowest:List[Tuple[str, float]] = []
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=ROOT)
+        walls.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        total, slowest = parse_importtime(proc.stderr)
+        imports.append(total)
+        heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'import_ms': statistics.median(imports),
+        'startup_wall_ms': statistics.median(walls),
+        'heavy_modules': heavy,
+        'slowest_imports': [f'{name} {ms:.1f}ms' for name, ms in slowest[:8]]
+    }
+
+def main()->None:
+    parser = argparse.ArgumentParser(description='测量启动时的导入耗时（-X importtime）并检查启动预算。')
+    parser.add_argument('--runs', type=int, default=7, help='运行次数，取中位数')
+    parser.add_argument('--budget-ms', type=float, default=120.0, help='启动代码导入耗时的预算（毫秒）')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json'), help='结果保存路径')
+    parser.add_argument('--compare', help='与之比较的基线结果文件')
+    parser.add_argument('--no-save', action='store_true', help='不保存结果')
+    args = parser.parse_args()
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare, {'runs': args.runs})
+        except ValueError as e:
+            parser.error(str(e))
+    revision = git_revision()
+
+    metrics = bench_startup(args.runs)
+    if baseline is not None:
+        print(compare(metrics, baseline))
+    else:
+        print(json.dumps(metrics, indent=2, ensure_ascii=False))
+    if not args.no_save:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {'commit': revision, 'python': platform.python_version(), 'platform': platform.platform(), 'runs': args.runs, 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+                'metrics': metrics
+            }, f, indent=2, ensure_ascii=False)
+    failed = False
+    if metrics['import_ms'] > args.budget_ms:
+        print(f'启动导入耗时{metrics["import_ms"]:.1f}ms，超出预算{args.budget_ms:.0f}ms。', file=sys.stderr)
+        failed = True
+    if metrics['heavy_modules']:
+        print(f'启动时导入了不应导入的模块：{", ".join(metrics["heavy_modules"])}', file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
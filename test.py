@@ -1,100 +1,50 @@
-from openai import OpenAI
-import json
+import asyncio
 import os
 import getpass
-from tools import AIFunction, FileManager, TODOListManager
+from agent import JsonlSink, Metrics, PrometheusSink, SessionEngine
 
 # 初始化client
 api_key=os.environ.get('DEEPSEEK_API_KEY')
 if not api_key:
     api_key = getpass.getpass('请输入您的DeepSeek API KEY（不会显示在屏幕上）\n> ')
 
-client = OpenAI(
-    api_key=api_key,
-    base_url='https://api.deepseek.com/'
-)
+async def main():
+    # 设置SIMPLEAGENT_METRICS（JSONL文件路径）或SIMPLEAGENT_METRICS_PORT后，记录工具调用和模型请求的耗时与用量
+    sinks = []
+    if os.environ.get('SIMPLEAGENT_METRICS'):
+        sinks.append(JsonlSink(os.environ['SIMPLEAGENT_METRICS']))
+    if os.environ.get('SIMPLEAGENT_METRICS_PORT'):
+        prometheus = PrometheusSink()
+        prometheus.serve(port=int(os.environ['SIMPLEAGENT_METRICS_PORT']))
+        sinks.append(prometheus)
+    engine = SessionEngine(api_key=api_key, base_url='https://api.deepseek.com/', metrics=Metrics(sinks))
+    # 创建会话（工具、TODO和对话历史都属于该会话）
+    # 设置SIMPLEAGENT_JOURNAL_DIR后，会话会被持久化，重新启动时自动恢复
+    session = engine.new_session('terminal', os.path.curdir, journal_dir=os.environ.get('SIMPLEAGENT_JOURNAL_DIR'))
+    if session.resumed:
+        print(f'已恢复上次的会话（{len(session.messages)}条消息）。')
+    # 等待用户输入时提前建立到服务端的连接
+    warm = asyncio.create_task(engine.llm.warm())
+    try:
+        while True:
+            prompt = await asyncio.to_thread(input, '\n\n\n请输入问题（输入/quit退出）：\n> ')
+            if prompt.strip() == '/quit':
+                total = session.usage.total
+                print(f'本次会话共请求{total["requests"]}次，前缀缓存命中率{session.usage.hit_rate:.1%}。')
+                break
+            print('\n\nAI: ', end='', flush=True)
+            try:
+                await engine.run_turn(
+                    session,
+                    prompt,
+                    on_text=lambda text: print(text, end='', flush=True),
+                    on_tool=lambda fname: print(f'\n\033[36m调用工具 {fname}\033[0m')
+                )
+            except Exception as e:
+                # 重试之后仍然失败的请求只结束本轮，会话可以继续
+                print(f'\n\033[31m请求失败：{type(e).__name__}: {e}\033[0m')
+    finally:
+        warm.cancel()
+        await engine.aclose()
 
-# 定义工具
-AI_TOOLS = AIFunction([], [])
-tm = TODOListManager([])
-fm = FileManager(os.path.curdir)
-AI_TOOLS.include(tm.function)
-AI_TOOLS.include(fm.function)
-tools = AI_TOOLS.functions
-
-# 创建会话
-messages = [{
-    'role':'system',
-    'content':('你是AI助手DeepSeek。在回答用户的问题时，你可以调用多个工具。'
-               '复杂任务请调用工具编写TODO待办清单并严格按照清单推进任务。'
-               '但要注意：TODO只是用于帮助你分步骤处理复杂任务的工具，'
-               '不应过长、过于详细，也不应重复步骤。如果是简单问题或单一步骤即可完成的问题，不要使用TODO列表。'
-               '这是一个简短的示例：\n'
-               '1. 修复程序中的语法错误\n'
-               '2. 检查程序存在的其他问题\n'
-               '3. 向用户汇报并确认结果'
-    )
-}]
-
-while True:
-    prompt = input('\n\n\n请输入问题（输入/quit退出）：\n> ')
-    if prompt.strip() == '/quit':
-        break
-    messages.append({'role':'user', 'content':prompt})
-    print('\n\nAI: ', end='', flush=True)
-    stop = False
-    while not stop:
-        response = client.chat.completions.create(
-            model='deepseek-chat',
-            messages=messages,
-            tools=tools,
-            tool_choice='auto',
-            stream=True
-        )
-
-        tool_calls = {}
-        msg = ''
-        for chunk in response:
-            if chunk.choices[0].finish_reason == 'stop':
-                stop = True
-            delta = chunk.choices[0].delta
-
-            if delta.content:
-                print(delta.content, end='', flush=True)
-                msg += delta.content
-            
-            if delta.tool_calls:
-                for tcd in delta.tool_calls:
-                    idx = tcd.index
-                    if idx not in tool_calls:
-                        tool_calls[idx] = tcd
-                    else:
-                        if tcd.id:
-                            tool_calls[idx].id = tcd.id
-                        if tcd.function.name:
-                            tool_calls[idx].function.name = tcd.function.name
-                        if tcd.function.arguments:
-                            tool_calls[idx].function.arguments += tcd.function.arguments
-        messages.append({'role':'assistant', 'content':msg})
-        if tool_calls:
-            for tc in tool_calls.values():
-                kwargs = json.loads(tc.function.arguments)
-                fname = tc.function.name
-                print(f'\n\033[36m调用工具 {fname}\033[0m')
-                res = AI_TOOLS(fname, **kwargs)
-                messages.append({
-                    'role':'assistant',
-                    'tool_calls':[{
-                        'id':tc.id,
-                        'type':'function',
-                        'function':{
-                            'name':fname,
-                            'arguments':tc.function.arguments
-                        }
-                    }]
-                })
-                messages.append({
-                    'role':'tool',
-                    'tool_call_id':tc.id,
-                    'content':res
-                })
+asyncio.run(main())
\ No newline at end of file
@@ -1,7 +1,37 @@
 __all__ = [
-    'tool_manager', 'file_manager', 'todo_manager',  # modules
-    'AIFunction', 'FileManager', 'TextFileContent', 'TODOListManager' # classes & functions
+    'tool_manager', 'executor', 'file_manager', 'line_index', 'overlay', 'patch', 'read_cache', 'result_cache', 'result_store', 'search_index', 'todo_manager', 'tool_selector', 'tree_render', 'validator', 'watcher',  # modules
+    'AIFunction', 'DirNode', 'FileManager', 'Overlay', 'PatchError', 'ReadCache', 'ResultCache', 'ResultStore', 'TextFileContent', 'TODOListManager', 'ToolCancelled', 'ToolExecutor', 'ToolSelector', 'ToolTimeout', 'TrigramIndex', 'ValidationError', 'WorkspaceWatcher', 'check_cancelled' # classes & functions
 ]
-from .tool_manager import AIFunction
-from .file_manager import FileManager, TextFileContent
-from .todo_manager import TODOListManager
\ No newline at end of file
+import sys
+
+# 名称 -> 所在的子模块；子模块在第一次访问时才导入，以缩短启动时间
+_EXPORTS = {
+    'AIFunction': 'tool_manager',
+    'ToolCancelled': 'executor', 'ToolExecutor': 'executor', 'ToolTimeout': 'executor', 'check_cancelled': 'executor',
+    'DirNode': 'file_manager', 'FileManager': 'file_manager', 'TextFileContent': 'file_manager',
+    'Overlay': 'overlay',
+    'PatchError': 'patch',
+    'ReadCache': 'read_cache',
+    'ResultCache': 'result_cache',
+    'ResultStore': 'result_store',
+    'TrigramIndex': 'search_index',
+    'TODOListManager': 'todo_manager',
+    'ToolSelector': 'tool_selector',
+    'ValidationError': 'validator',
+    'WorkspaceWatcher': 'watcher',
+}
+
+def __getattr__(name:str):
+    module = _EXPORTS.get(name, name if name in __all__ else None)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # 使用__import__而不是importlib.import_module，这样-X importtime也能统计到这些模块
+    __import__(f'{__name__}.{module}')
+    value = sys.modules[f'{__name__}.{module}']
+    if module != name:
+        value = getattr(value, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
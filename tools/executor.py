@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Optional, Set
+import threading
+
+_local = threading.local()
+
+class ToolCancelled(Exception):
+    pass
+
+class ToolTimeout(TimeoutError):
+    pass
+
+def current_token()->Optional[threading.Event]:
+    return getattr(_local, 'token', None)
+
+def check_cancelled()->None:
+    token = getattr(_local, 'token', None)
+    if token is not None and token.is_set():
+        raise ToolCancelled('调用已被取消。')
+
+class ToolExecutor:
+    def __init__(self, max_workers:int=8, default_timeout:Optional[float]=60.0, max_abandoned:Optional[int]=None)->None:
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        # 超时后仍未退出的线程数达到该值时换用新的线程池，避免线程池被卡住的调用占满
+        self.max_abandoned = max_abandoned or max(max_workers // 2, 1)
+        self.abandoned = 0
+        self.__pool:Optional[ThreadPoolExecutor] = None
+        self.__lock = threading.Lock()
+        self.__inflight:Set[threading.Event] = set()
+        return
+
+    def _executor(self)->ThreadPoolExecutor:
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tool')
+            return self.__pool
+
+    def __abandon(self, pool:ThreadPoolExecutor)->None:
+        with self.__lock:
+            if pool is not self.__pool:
+                return
+            self.abandoned += 1
+            if self.abandoned >= self.max_abandoned:
+                # 旧线程池中的线程会在调用返回或响应取消后退出
+                pool.shutdown(wait=False)
+                self.__pool = None
+                self.abandoned = 0
+
+    @staticmethod
+    def _run(token:threading.Event, function:Callable, args:tuple, kwargs:dict):
+        _local.token = token
+        try:
+            check_cancelled()
+            return function(*args, **kwargs)
+        finally:
+            _local.token = None
+
+    def run(self, function:Callable, args:tuple=(), kwargs:Optional[dict]=None, timeout:Optional[float]=None, name:str=''):
+        token = threading.Event()
+        pool = self._executor()
+        with self.__lock:
+            self.__inflight.add(token)
+        try:
+            future = pool.submit(self._run, token, function, args, kwargs or {})
+            try:
+                return future.result(timeout)
+            except FutureTimeout:
+                token.set()
+                if not future.cancel():
+                    self.__abandon(pool)
+                raise ToolTimeout(f'{name or "工具"}在{timeout:g}秒内没有完成，已取消。')
+        finally:
+            with self.__lock:
+                self.__inflight.discard(token)
+
+    def cancel_all(self)->int:
+        with self.__lock:
+            tokens = list(self.__inflight)
+        for token in tokens:
+            token.set()
+        return len(tokens)
+
+    def shutdown(self, wait:bool=True)->None:
+        self.cancel_all()
+        with self.__lock:
+            pool, self.__pool = self.__pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+ToolCancelled.__doc__ = '''ToolCancelled表示工具调用在执行过程中响应了取消请求。'''
+ToolTimeout.__doc__ = '''ToolTimeout表示工具调用没有在限定时间内完成，它是TimeoutError的子类。'''
+current_token.__doc__ = '''current_token函数返回当前线程中正在执行的工具调用的取消标记（threading.Event），不在ToolExecutor中执行时返回None。需要把工作分派到其他线程的工具可以把它传递下去。'''
+check_cancelled.__doc__ = '''check_cancelled函数检查当前工具调用是否已被取消（超时或cancel_all），是则抛出ToolCancelled。耗时较长的工具应在循环中定期调用它，以便超时后尽快停止；不在ToolExecutor中执行时不做任何事。'''
+ToolExecutor.__doc__ = '''ToolExecutor类在一个常驻的线程池中执行工具调用，并为每次调用设置超时和取消标记。它包含以下方法：
+- __init__(self, max_workers=8, default_timeout=60.0, max_abandoned=None): 线程池在第一次使用时创建并一直复用。default_timeout是只读工具的默认超时时间（秒），None表示不限时。
+- run(self, function, args=(), kwargs=None, timeout=None, name='') -> object: 在线程池中执行function并等待结果。超过timeout秒时设置该调用的取消标记并抛出ToolTimeout，timeout为None时一直等待。
+- cancel_all(self) -> int: 设置所有正在执行的调用的取消标记，返回调用数量。
+- shutdown(self, wait=True): 取消所有调用并关闭线程池。
+Python无法强制终止线程，取消是协作式的：工具在循环中调用check_cancelled时才会停止。超时后仍在运行的线程被视为已放弃，放弃的线程达到max_abandoned个时会换用新的线程池，因此个别卡住的调用不会让后续调用排队等待。'''
@@ -1,37 +1,455 @@
 from .tool_manager import AIFunction
+from .executor import ToolCancelled, current_token
+from .line_index import read_range, read_range_bytes
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from .patch import apply_edits, apply_unified_diff, atomic_write
+from .overlay import Overlay
+from .read_cache import ReadCache
+from .tree_render import render_tree
 import os
 
 class TextFileContent:
-    def __init__(self, file_name: str, file_content: str) -> None:
-        self.fname, self.fcont = file_name, file_content
-        self.template = f'[file name]: {file_name}\n[file content begin]{file_content}[file content end]\n'
+    def __init__(self, file_name: str, file_content: str, file_info: str = '') -> None:
+        self.fname, self.fcont, self.finfo = file_name, file_content, file_info
+        info = f'[file info]: {file_info}\n' if file_info else ''
+        self.template = f'[file name]: {file_name}\n{info}[file content begin]{file_content}[file content end]\n'
 
     def __str__(self) -> str:
         return self.template
 
+class DirNode:
+    __slots__ = ('dir_path', 'level', '_files', 'overlay')
+
+    def __init__(self, dir_path:str, level:int=3, overlay:Overlay=None) -> None:
+        self.dir_path = dir_path
+        self.level = level
+        self._files = None
+        # 不为None时按“磁盘+覆盖层”的视图列出目录，用于查看事务中尚未提交的目录
+        self.overlay = overlay
+        return
+
+    @property
+    def files(self) -> list:
+        # 第一次访问时才读取磁盘，子目录同样是未展开的DirNode
+        if self._files is None:
+            files = []
+            if self.overlay is not None:
+                path = os.path.abspath(self.dir_path)
+                for name in self.overlay.listdir(path):
+                    child = os.path.join(path, name)
+                    if self.level >= 1 and self.overlay.isdir(child):
+                        files.append(DirNode(child, self.level-1, self.overlay))
+                    else:
+                        files.append(name)
+                self._files = files
+                return files
+            with os.scandir(self.dir_path) as it:
+                for entry in it:
+                    if self.level >= 1 and entry.is_dir():
+                        files.append(DirNode(entry.path, self.level-1))
+                    else:
+                        files.append(entry.name)
+            self._files = files
+        return self._files
+
+    @files.setter
+    def files(self, value:list) -> None:
+        self._files = value
+
+    @property
+    def loaded(self) -> bool:
+        return self._files is not None
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(os.path.normpath(self.dir_path))
+
+    @staticmethod
+    def entry_name(item) -> str:
+        return item.name if isinstance(item, DirNode) else item
+
+    def add_entry(self, name:str, is_dir:bool) -> bool:
+        # 未展开的节点无需维护，展开时会直接读取磁盘
+        if self._files is None or any(self.entry_name(f) == name for f in self._files):
+            return False
+        if is_dir and self.level >= 1:
+            self._files.append(DirNode(os.path.join(self.dir_path, name), self.level-1, self.overlay))
+        else:
+            self._files.append(name)
+        return True
+
+    def remove_entry(self, name:str) -> bool:
+        if self._files is None:
+            return False
+        files = [f for f in self._files if self.entry_name(f) != name]
+        changed = len(files) != len(self._files)
+        self._files = files
+        return changed
+
+    def sync(self) -> bool:
+        # 重新读取本层目录并与内存中的子项比较，已展开的子目录节点保持不变
+        if self._files is None:
+            return False
+        try:
+            if self.overlay is not None:
+                path = os.path.abspath(self.dir_path)
+                entries = {name: self.overlay.isdir(os.path.join(path, name)) for name in self.overlay.listdir(path)}
+            else:
+                with os.scandir(self.dir_path) as it:
+                    entries = {entry.name: entry.is_dir() for entry in it}
+        except OSError:
+            entries = {}
+        changed = False
+        for f in list(self._files):
+            name = self.entry_name(f)
+            if name not in entries or isinstance(f, DirNode) != (entries[name] and self.level >= 1):
+                changed |= self.remove_entry(name)
+        for name, is_dir in entries.items():
+            changed |= self.add_entry(name, is_dir)
+        return changed
+
+    def loaded_nodes(self):
+        # 遍历所有已展开的节点（只在内存中遍历，不读取磁盘）
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._files is None:
+                continue
+            yield node
+            stack.extend(f for f in node._files if isinstance(f, DirNode))
+
+    def list_files(self, max_depth:int=None, **kwargs) -> str:
+        return render_tree(self, self.level if max_depth is None else max_depth, **kwargs)
+
+    def __str__(self) -> str:
+        return self.list_files()
+
+TREE_PARAMETERS = {
+    'max_depth': {'type': 'integer', 'description': '（可选）最多展开的子目录层数，默认3。'},
+    'include': {'type': 'array', 'items': {'type': 'string'}, 'description': '（可选）只显示匹配这些通配符的文件，例如["*.py"]。'},
+    'exclude': {'type': 'array', 'items': {'type': 'string'}, 'description': '（可选）排除匹配这些通配符的文件或目录，给出时替换默认的排除列表。'},
+    'gitignore': {'type': 'boolean', 'description': '（可选）是否按.gitignore排除文件，默认true。'},
+    'max_entries': {'type': 'integer', 'description': '（可选）最多显示的项数，默认200。'},
+    'cursor': {'type': 'string', 'description': '（可选）上一次输出末尾给出的cursor，用于继续查看。'},
+    'show_size': {'type': 'boolean', 'description': '（可选）是否显示文件大小，默认false。'}
+}
+
 class FileManager:
+    max_read_bytes = 200000
+    max_workers = 8
+
     def __init__(self, dir_path:str, level:int=3, built:bool=False) -> None:
         self.level = level
         self.dir_path = dir_path
-        self.files = os.listdir(dir_path)
-        if level >= 1:
-            for idx, file in enumerate(self.files):
-                if os.path.isdir(os.path.join(dir_path, file)):
-                    self.files[idx] = FileManager(os.path.join(dir_path, file), level-1)
+        self.root = DirNode(dir_path, level)
+        # 工作区版本号：本对象或后台监视器每次观察到磁盘变化都会加1
+        self.generation = getattr(self, 'generation', 0) + 1
+        self.watcher = getattr(self, 'watcher', None)
+        # 绝对路径 -> 自身最近一次写入后的(mtime_ns, 大小)，None表示已被自身删除，浮点数表示开始写入的时间；监视器据此忽略自身修改引起的事件
+        self._own_writes = getattr(self, '_own_writes', None) or {}
+        self.read_cache = getattr(self, 'read_cache', None) or ReadCache()
+        self.search_index = None
+        # 事务模式下的写时复制覆盖层，为None时所有修改直接写入磁盘
+        self.overlay = getattr(self, 'overlay', None)
+        self.root.overlay = self.overlay
+        self._pool = getattr(self, '_pool', None)
+        self._pool_lock = getattr(self, '_pool_lock', None) or threading.Lock()
         if not built:
             self.build_function()
         return
+
+    def bump(self, path:str=None, removed:bool=False) -> int:
+        if path is not None:
+            self._record_write(path, removed)
+        self.generation += 1
+        index = self.search_index
+        if path is not None and index is not None:
+            # 自身的修改直接增量更新索引；如果之前没有未处理的外部变化，搜索时就无需再同步
+            in_sync = index.seen_generation == self.generation - 1
+            if removed:
+                index.remove_path(path)
+            else:
+                index.update_file(path)
+            if in_sync:
+                index.seen_generation = self.generation
+        return self.generation
+
+    def _expect(self, path:str) -> None:
+        # 在写入磁盘之前登记：写入与bump之间监视器就可能读到事件，这期间的事件都视为自身的修改；
+        # 写入失败时没有bump，登记在几秒后自动失效
+        self._own_writes[os.path.abspath(path)] = time.monotonic()
+
+    def _record_write(self, path:str, removed:bool) -> None:
+        own = self._own_writes
+        if len(own) > 4096:
+            own.clear()
+        key = os.path.abspath(path)
+        if removed:
+            own[key] = None
+            return
+        try:
+            st = os.stat(key)
+        except OSError:
+            own.pop(key, None)
+            return
+        own[key] = (st.st_mtime_ns, st.st_size)
+
+    def own_change(self, path:str) -> bool:
+        key = os.path.abspath(path)
+        name = os.path.basename(key)
+        if name.startswith('.') and name.endswith('.tmp'):
+            # atomic_write和Overlay.commit的临时文件（.文件名.随机串.tmp），最终的重命名事件仍会按目标文件检查
+            return os.path.join(os.path.dirname(key), name[1:-4].rsplit('.', 1)[0]) in self._own_writes
+        if key not in self._own_writes:
+            return False
+        recorded = self._own_writes.get(key)
+        if isinstance(recorded, float):
+            return time.monotonic() - recorded < 5.0
+        try:
+            st = os.stat(key)
+        except OSError:
+            return recorded is None
+        return recorded == (st.st_mtime_ns, st.st_size)
+
+    def begin(self) -> None:
+        if self.overlay is None:
+            self.overlay = Overlay()
+            self._attach(self.overlay)
+
+    def _attach(self, overlay:Overlay) -> None:
+        # 让目录树中的节点（包括尚未展开的子目录）按覆盖层的视图展开和同步
+        self.root.overlay = overlay
+        for node in self.root.loaded_nodes():
+            node.overlay = overlay
+            for f in node.files:
+                if isinstance(f, DirNode):
+                    f.overlay = overlay
+
+    def commit(self, fsync:bool=True) -> int:
+        overlay = self.overlay
+        if overlay is None or not len(overlay):
+            return 0
+        for path, is_dir in overlay.paths():
+            if not is_dir:
+                self._expect(path)
+        changed = overlay.commit(fsync, self.max_workers)
+        # 目录树在暂存时已经更新，这里只需更新版本号和搜索索引
+        for path, removed, is_dir in changed:
+            self.bump(None if is_dir and not removed else path, removed)
+        return len(changed)
+
+    def rollback(self) -> int:
+        overlay = self.overlay
+        if overlay is None:
+            return 0
+        paths = overlay.rollback()
+        if paths:
+            self._touch()
+        for path, is_dir in paths:
+            # 按磁盘上的实际情况改回目录树中受影响的条目，无需重新读取整个目录树
+            exists = os.path.isdir(path) if is_dir else os.path.isfile(path)
+            self._tree_update(path, removed=not exists, is_dir=is_dir)
+        return len(paths)
+
+    def end(self, commit:bool=True) -> int:
+        count = self.commit() if commit else self.rollback()
+        self.overlay = None
+        self._attach(None)
+        return count
+
+    def commit_changes(self) -> str:
+        if self.overlay is None:
+            return '当前没有开启事务模式，所有修改都已直接写入磁盘。'
+        count = self.commit()
+        return f'已将{count}项修改写入磁盘。' if count else '没有需要提交的修改。'
+
+    def rollback_changes(self) -> str:
+        if self.overlay is None:
+            return '当前没有开启事务模式，修改已直接写入磁盘，无法撤销。'
+        count = self.rollback()
+        return f'已撤销{count}项尚未提交的修改。' if count else '没有尚未提交的修改。'
+
+    def _touch(self) -> None:
+        # 覆盖层中的内容发生了变化：读取和搜索的结果随之变化，但磁盘和索引都没有变化，不需要重新同步索引
+        index = self.search_index
+        in_sync = index is not None and index.seen_generation == self.generation
+        self.generation += 1
+        if in_sync:
+            index.seen_generation = self.generation
+
+    def _isfile(self, path:str) -> bool:
+        return os.path.isfile(path) if self.overlay is None else self.overlay.isfile(os.path.abspath(path))
+
+    def _exists(self, path:str) -> bool:
+        return os.path.exists(path) if self.overlay is None else self.overlay.exists(os.path.abspath(path))
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='file-manager')
+            return self._pool
+
+    def _batch(self, func, items:list) -> list:
+        # 并发执行func，按输入顺序返回(结果, 异常)，单项失败不影响其他项
+        token = current_token()
+        def run(item):
+            if token is not None and token.is_set():
+                return None, ToolCancelled('调用已被取消。')
+            try:
+                return func(item), None
+            except Exception as e:
+                return None, e
+        if len(items) <= 1:
+            return [run(item) for item in items]
+        return list(self._executor().map(run, items))
+
+    def _tree_update(self, path:str, removed:bool=False, is_dir:bool=False) -> None:
+        # 把一次磁盘修改同步到已展开的目录树中；未展开的部分会在展开时直接读取磁盘
+        rel = os.path.relpath(os.path.normpath(path), self.dir_path)
+        parts = rel.split(os.sep)
+        if parts[0] in (os.curdir, os.pardir):
+            return
+        node = self.root
+        for i, part in enumerate(parts[:-1]):
+            if not node.loaded:
+                return
+            child = next((f for f in node.files if isinstance(f, DirNode) and f.name == part), None)
+            if child is None:
+                # 中间目录是新建的，在已知的最深一层登记它即可
+                if not removed:
+                    node.add_entry(part, True)
+                return
+            node = child
+        if removed:
+            node.remove_entry(parts[-1])
+        else:
+            node.add_entry(parts[-1], is_dir)
+
+    @staticmethod
+    def _report(title:str, names:list, results:list) -> str:
+        errors = [(n, e) for n, (_, e) in zip(names, results) if e is not None]
+        lines = [f'{title}：成功{len(names) - len(errors)}项，失败{len(errors)}项。']
+        lines += [f'[error] {n}: {e}' for n, e in errors]
+        return '\n'.join(lines)
+
+    def read_files(self, file_names:list) -> str:
+        results = self._batch(self.read_file, file_names)
+        res = []
+        for name, (content, error) in zip(file_names, results):
+            if error is not None:
+                res.append(f'[file name]: {name}\n[error]: {error}\n')
+            else:
+                res.append(content)
+        return ''.join(res)
+
+    def write_files(self, files:list) -> str:
+        names = [f['file_name'] for f in files]
+        duplicated = {n for n in names if names.count(n) > 1}
+        def write(item):
+            if item['file_name'] in duplicated:
+                raise ValueError('the same file appears more than once in this batch')
+            print(f'[{item["file_name"]}]')
+            path = os.path.join(self.dir_path, item['file_name'])
+            if self.overlay is not None:
+                self.overlay.write(os.path.abspath(path), item['content'])
+                return path
+            self._expect(path)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(item['content'])
+            return path
+        results = self._batch(write, files)
+        # 内存中的目录树、版本号和索引在当前线程中统一更新；暂存的修改在提交时才更新索引
+        for path, error in results:
+            if error is None:
+                self._tree_update(path)
+                if self.overlay is None:
+                    self.bump(path)
+                else:
+                    self._touch()
+        return self._report('批量写入文件', names, results)
+
+    def delete_files(self, file_names:list) -> str:
+        def delete(name):
+            print(f'[{name}]')
+            path = os.path.join(self.dir_path, name)
+            if not self._isfile(path):
+                raise ValueError(f'File {name} not found in directory {self.dir_path}.')
+            if self.overlay is not None:
+                self.overlay.remove(os.path.abspath(path))
+            else:
+                self._expect(path)
+                os.remove(path)
+            return path
+        results = self._batch(delete, file_names)
+        for path, error in results:
+            if error is None:
+                self._tree_update(path, removed=True)
+                if self.overlay is None:
+                    self.bump(path, removed=True)
+                else:
+                    self._touch()
+        return self._report('批量删除文件', file_names, results)
+
+    def add_dirs(self, dir_names:list) -> str:
+        def add(name):
+            print(f'[{name}]')
+            path = os.path.join(self.dir_path, name)
+            if self._exists(path):
+                raise ValueError(f'Directory {name} already exists in {self.dir_path}.')
+            if self.overlay is not None:
+                self.overlay.makedirs(os.path.abspath(path))
+            else:
+                os.makedirs(path)
+            return path
+        results = self._batch(add, dir_names)
+        for path, error in results:
+            if error is None:
+                self._tree_update(path, is_dir=True)
+                if self.overlay is None:
+                    self.bump()
+                else:
+                    self._touch()
+        return self._report('批量创建目录', dir_names, results)
+
+    def watch(self, poll_interval:float=1.0, use_inotify:bool=True) -> 'WorkspaceWatcher':
+        from .watcher import WorkspaceWatcher
+        if self.watcher is None:
+            self.watcher = WorkspaceWatcher(self, poll_interval, use_inotify)
+            self.watcher.start()
+        return self.watcher
+
+    def unwatch(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    @property
+    def files(self) -> list:
+        return self.root.files
+
+    @files.setter
+    def files(self, value:list) -> None:
+        self.root.files = value
     
     def build_function(self):
         self.function = AIFunction([], [])
         self.function.add_function(
             name='read_file',
-            description='读取指定文件的内容，并以特定格式返回文件名和内容。',
+            description='读取指定文件的内容，并以特定格式返回文件名、文件信息（总行数、字节数、返回的范围）和内容。大文件请使用行范围或字节范围分段读取。',
             parameters={
-                'file_name': {'type': 'string', 'description': '要读取的文件名，必须存在于当前目录中。'}
+                'file_name': {'type': 'string', 'description': '要读取的文件名，必须存在于当前目录中。'},
+                'start_line': {'type': 'integer', 'description': '（可选）起始行号，从1开始。'},
+                'end_line': {'type': 'integer', 'description': '（可选）结束行号（包含）。'},
+                'offset': {'type': 'integer', 'description': '（可选）起始字节偏移。给出offset或length时按字节范围读取。'},
+                'length': {'type': 'integer', 'description': '（可选）要读取的字节数。'}
             },
             required=['file_name'],
-            function=self.read_file
+            function=self.read_file,
+            mutating=False,
+            # 单次读取已经以max_read_bytes为上限并提示按行分段读取，不再转存，模型总能看到完整的读取结果
+            max_result=0
         )
         self.function.add_function(
             name='write_file',
@@ -43,6 +461,94 @@ class FileManager:
             required=['file_name', 'content'],
             function=self.write_file
         )
+        self.function.add_function(
+            name='edit_file',
+            description='修改已有文件的一部分，而不必重写整个文件。可以给出若干查找/替换块（每个search必须在文件中唯一出现），或给出unified diff。修改全部校验通过后才会原子地写入文件。',
+            parameters={
+                'file_name': {'type': 'string', 'description': '要修改的文件名，必须已经存在。'},
+                'edits': {
+                    'type': 'array',
+                    'description': '（与diff二选一）查找/替换块列表，按顺序应用。',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'search': {'type': 'string', 'description': '要查找的原文，需包含足够的上下文以保证唯一。'},
+                            'replace': {'type': 'string', 'description': '替换后的内容。'}
+                        },
+                        'required': ['search', 'replace']
+                    }
+                },
+                'diff': {'type': 'string', 'description': '（与edits二选一）unified diff格式的修改，上下文必须与文件内容一致。'}
+            },
+            required=['file_name'],
+            function=self.edit_file
+        )
+        self.function.add_function(
+            name='search',
+            description='在当前目录（递归）的所有文本文件中搜索，返回匹配的行及其上下文，格式为“路径:行号:内容”。用于查找符号、定义或引用，比逐个读取文件快得多。',
+            parameters={
+                'query': {'type': 'string', 'description': '要搜索的文本，regex为true时为Python正则表达式。'},
+                'regex': {'type': 'boolean', 'description': '（可选）是否按正则表达式搜索，默认false。'},
+                'case_sensitive': {'type': 'boolean', 'description': '（可选）是否区分大小写，默认false。'},
+                'path_glob': {'type': 'string', 'description': '（可选）只搜索相对路径匹配该通配符的文件，例如"*.py"。'},
+                'context': {'type': 'integer', 'description': '（可选）每处匹配前后显示的行数，默认2。'},
+                'max_results': {'type': 'integer', 'description': '（可选）最多显示的匹配数，默认50。'}
+            },
+            required=['query'],
+            function=self.search,
+            mutating=False,
+            pure=lambda: self.generation
+        )
+        self.function.add_function(
+            name='read_files',
+            description='一次读取多个文件（并发读取），按顺序返回每个文件的内容；某个文件读取失败时只在该项中给出错误信息。',
+            parameters={
+                'file_names': {'type': 'array', 'items': {'type': 'string'}, 'description': '要读取的文件名列表。'}
+            },
+            required=['file_names'],
+            function=self.read_files,
+            mutating=False,
+            # 至少能完整返回一个文件的单次读取（max_read_bytes）及其文件头，多个文件的总和超出时才转存
+            max_result=self.max_read_bytes + 4096
+        )
+        self.function.add_function(
+            name='write_files',
+            description='一次写入多个文件（覆盖，并发写入），返回成功和失败的数量以及每个失败项的错误信息。',
+            parameters={
+                'files': {
+                    'type': 'array',
+                    'description': '要写入的文件列表。',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'file_name': {'type': 'string', 'description': '要写入的文件名。'},
+                            'content': {'type': 'string', 'description': '要写入文件的内容。'}
+                        },
+                        'required': ['file_name', 'content']
+                    }
+                }
+            },
+            required=['files'],
+            function=self.write_files
+        )
+        self.function.add_function(
+            name='delete_files',
+            description='一次删除多个文件，返回成功和失败的数量以及每个失败项的错误信息。',
+            parameters={
+                'file_names': {'type': 'array', 'items': {'type': 'string'}, 'description': '要删除的文件名列表。'}
+            },
+            required=['file_names'],
+            function=self.delete_files
+        )
+        self.function.add_function(
+            name='add_dirs',
+            description='一次创建多个子目录（会自动创建中间目录），返回成功和失败的数量以及每个失败项的错误信息。',
+            parameters={
+                'dir_names': {'type': 'array', 'items': {'type': 'string'}, 'description': '要创建的子目录名称列表。'}
+            },
+            required=['dir_names'],
+            function=self.add_dirs
+        )
         self.function.add_function(
             name='add_dir',
             description='在当前目录下创建一个新的子目录。',
@@ -72,10 +578,12 @@ class FileManager:
         )
         self.function.add_function(
             name='list_files',
-            description='以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。',
-            parameters={},
+            description='以树状图的形式列出当前目录下的所有文件和子目录（默认3层），目录以“/”结尾。默认排除.git、__pycache__、node_modules以及.gitignore中的文件；输出项数超过上限时末尾会给出cursor，用于继续查看。',
+            parameters=TREE_PARAMETERS,
             required=[],
-            function=self.list_files
+            function=self.list_files,
+            mutating=False,
+            pure=lambda: self.generation
         )
         self.function.add_function(
             name='refresh',
@@ -88,10 +596,13 @@ class FileManager:
             name='view_dir',
             description='查看当前目录下指定子目录的树状结构，返回字符串。',
             parameters={
-                'dir_name': {'type': 'string', 'description': '要查看的子目录名称，必须在当前目录中存在。'}
+                'dir_name': {'type': 'string', 'description': '要查看的子目录名称，必须在当前目录中存在。'},
+                **TREE_PARAMETERS
             },
             required=['dir_name'],
-            function=self.view_dir
+            function=self.view_dir,
+            mutating=False,
+            pure=lambda: self.generation
         )
         self.function.add_function(
             name='chdir',
@@ -102,6 +613,20 @@ class FileManager:
             required=['new_dir'],
             function=self.chdir
         )
+        self.function.add_function(
+            name='commit_changes',
+            description='事务模式下，把本轮暂存在内存中的所有文件修改一次性写入磁盘。',
+            parameters={},
+            required=[],
+            function=self.commit_changes
+        )
+        self.function.add_function(
+            name='rollback_changes',
+            description='事务模式下，撤销所有尚未写入磁盘的文件修改，工作区恢复到上一次提交时的状态。',
+            parameters={},
+            required=[],
+            function=self.rollback_changes
+        )
         return
     
     def chdir(self, new_dir:str)->None:
@@ -109,81 +634,222 @@ class FileManager:
         self.__init__(new_dir, built=True)
     
     def refresh(self)->None:
-        self.files = os.listdir(self.dir_path)
-        if self.level >= 1:
-            for idx, file in enumerate(self.files):
-                if os.path.isdir(os.path.join(self.dir_path, file)):
-                    self.files[idx] = FileManager(os.path.join(self.dir_path, file), self.level-1)
+        self.root = DirNode(self.dir_path, self.level, self.overlay)
+        self.bump()
 
-    def read_file(self, file_name:str) -> TextFileContent:
+    def read_file(self, file_name:str, start_line:int=None, end_line:int=None, offset:int=None, length:int=None) -> TextFileContent:
         print(f'[{file_name}]')
         # 支持直接传入相对路径，例如 'subdir/file.txt' 或多级路径
         norm_name = os.path.normpath(file_name)
         target_path = os.path.join(self.dir_path, norm_name)
+        if self.overlay is not None:
+            try:
+                staged = self.overlay.staged(os.path.abspath(target_path))
+            except FileNotFoundError:
+                raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
+            if staged is not None:
+                # 尚未提交的内容只在内存中，不经过读取缓存
+                data, info = read_range_bytes(staged[0].encode('utf-8'), start_line, end_line, offset, length, self.max_read_bytes)
+                return str(self._read_result(file_name, data, info))
         # 如果目标路径存在且是文件，直接读取（支持子目录）
         if os.path.exists(target_path) and os.path.isfile(target_path):
             try:
-                with open(target_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return str(TextFileContent(file_name, content))
+                st = os.stat(target_path)
+                cache_key = self.read_cache.key(target_path, start_line, end_line, offset, length)
+                cached = self.read_cache.get(cache_key, st, file_name)
+                if cached is not None:
+                    return cached
+                data, info = read_range(target_path, start_line, end_line, offset, length, self.max_read_bytes)
+                result = self._read_result(file_name, data, info)
+                return self.read_cache.put(cache_key, st, file_name, result.fcont, str(result))
             except:
                 return '无法打开文件。请检查文件是否存在，并且文件名是否正确。不支持查看非文本文件。'
         # 否则按照原有行为报错（文件不存在于当前管理器目录下）
         raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
     
+    @staticmethod
+    def _read_result(file_name:str, data:bytes, info:dict) -> TextFileContent:
+        if 'offset' in info:
+            # 字节范围的两端可能截断多字节字符
+            content = data.decode('utf-8', errors='replace')
+            file_info = f'字节{info["offset"]}-{info["end"]}，共{info["lines"]}行，{info["size"]}字节'
+        else:
+            content = data.decode('utf-8')
+            file_info = f'第{info["start_line"]}-{info["end_line"]}行，共{info["lines"]}行，{info["size"]}字节'
+            if info.get('partial'):
+                file_info += f'（第{info["start_line"]}行过长，只返回了该行的前{len(data)}字节，请使用offset={info["next_offset"]}按字节范围继续读取）'
+            elif info['truncated']:
+                file_info += '（内容过长已截断，请使用start_line/end_line分段读取）'
+        # 与文本模式读取保持一致，统一换行符
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return TextFileContent(file_name, content, file_info)
+
     def write_file(self, file_name:str, content:str) -> None:
         print(f'[{file_name}]')
-        with open(os.path.join(self.dir_path, file_name), 'w', encoding='utf-8') as f:
+        path = os.path.join(self.dir_path, file_name)
+        if self.overlay is not None:
+            self.overlay.write(os.path.abspath(path), content)
+            self._tree_update(path)
+            self._touch()
+            return
+        self._expect(path)
+        with open(path, 'w', encoding='utf-8') as f:
             f.write(content)
-        if file_name not in self.files:
-            self.files.append(file_name)
+        # 按路径更新目录树，嵌套的文件名登记在所在的子目录下
+        self._tree_update(path)
+        self.bump(path)
     
-    def view_dir(self, dir_name:str) -> str:
+    def edit_file(self, file_name:str, edits:list=None, diff:str=None) -> str:
+        print(f'[{file_name}]')
+        target_path = os.path.join(self.dir_path, os.path.normpath(file_name))
+        if not self._isfile(target_path):
+            raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
+        if bool(edits) == bool(diff):
+            raise ValueError('Exactly one of edits and diff must be given.')
+        staged = None if self.overlay is None else self.overlay.staged(os.path.abspath(target_path))
+        if staged is not None:
+            text, newline = staged
+        else:
+            with open(target_path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+            newline = '\n'
+        newline = '\r\n' if '\r\n' in text else newline
+        text = text.replace('\r\n', '\n')
+        if edits:
+            new_text, count = apply_edits(text, edits)
+        else:
+            new_text, count = apply_unified_diff(text, diff)
+        if new_text == text:
+            return f'文件{file_name}没有发生变化。'
+        if self.overlay is not None:
+            self.overlay.write(os.path.abspath(target_path), new_text, newline)
+            self._touch()
+        else:
+            self._expect(target_path)
+            atomic_write(target_path, new_text, newline)
+            self.bump(target_path)
+        old_lines, new_lines = text.count('\n'), new_text.count('\n')
+        return f'已修改文件{file_name}：应用了{count}处修改，行数{old_lines}→{new_lines}。'
+
+    def view_dir(
+        self,
+        dir_name:str,
+        max_depth:int=3,
+        include:list=None,
+        exclude:list=None,
+        gitignore:bool=True,
+        max_entries:int=200,
+        cursor:str=None,
+        show_size:bool=False
+    ) -> str:
         print(f'[{dir_name}]')
         dir_path = os.path.join(self.dir_path, dir_name)
-        if not os.path.exists(dir_path):
+        overlay = self.overlay
+        if not self._exists(dir_path):
             raise ValueError(f'Directory {dir_name} not found in {self.dir_path}.')
-        if not os.path.isdir(dir_path):
+        if not (os.path.isdir(dir_path) if overlay is None else overlay.isdir(os.path.abspath(dir_path))):
             raise ValueError(f'{dir_name} is not a directory in {self.dir_path}.')
-        sub_manager = FileManager(dir_path, 3)
-        dir_content = sub_manager.list_files()
+        dir_content = render_tree(DirNode(dir_path, max_depth, overlay), max_depth, include, exclude, gitignore, max_entries, cursor, show_size)
         # print(dir_content)
         return dir_content
 
     def add_dir(self, dir_name:str) -> None:
         print(f'[{dir_name}]')
         new_dir_path = os.path.join(self.dir_path, dir_name)
-        if not os.path.exists(new_dir_path):
-            os.makedirs(new_dir_path)
-            self.files.append(FileManager(new_dir_path, self.level-1))
-        else:
+        if self._exists(new_dir_path):
             raise ValueError(f'Directory {dir_name} already exists in {self.dir_path}.')
+        if self.overlay is not None:
+            self.overlay.makedirs(os.path.abspath(new_dir_path))
+            self._tree_update(new_dir_path, is_dir=True)
+            self._touch()
+            return
+        os.makedirs(new_dir_path)
+        self._tree_update(new_dir_path, is_dir=True)
+        self.bump()
     
     def delete_file(self, file_name:str) -> None:
         print(f'[{file_name}]')
-        if file_name not in self.files:
+        path = os.path.join(self.dir_path, file_name)
+        if not self._isfile(path):
             raise ValueError(f'File {file_name} not found in directory {self.dir_path}.')
-        os.remove(os.path.join(self.dir_path, file_name))
-        self.files.remove(file_name)
+        if self.overlay is not None:
+            self.overlay.remove(os.path.abspath(path))
+            self._tree_update(path, removed=True)
+            self._touch()
+            return
+        self._expect(path)
+        os.remove(path)
+        self._tree_update(path, removed=True)
+        self.bump(path, removed=True)
     
     def delete_dir(self, dir_name:str) -> None:
         print(f'[{dir_name}]')
         dir_path = os.path.join(self.dir_path, dir_name)
-        if not os.path.exists(dir_path):
+        if not self._exists(dir_path):
             raise ValueError(f'Directory {dir_name} not found in {self.dir_path}.')
+        if self.overlay is not None:
+            if not self.overlay.isdir(os.path.abspath(dir_path)):
+                raise ValueError(f'{dir_name} is not a directory in {self.dir_path}.')
+            self.overlay.rmdir(os.path.abspath(dir_path))
+            self._tree_update(dir_path, removed=True, is_dir=True)
+            self._touch()
+            return
         if not os.path.isdir(dir_path):
             raise ValueError(f'{dir_name} is not a directory in {self.dir_path}.')
         os.rmdir(dir_path)
-        self.files = [f for f in self.files if not (isinstance(f, FileManager) and f.dir_path == dir_path)]
+        self._tree_update(dir_path, removed=True, is_dir=True)
+        self.bump(dir_path, removed=True)
     
-    def list_files(self) -> str:
-        # 输出当前目录下的所有文件和文件夹的树状图（3层）
-        res = f'{self.dir_path}/\n'
-        for file in self.files:
-            if isinstance(file, FileManager):
-                res += '  ' + file.list_files().replace('\n', '\n  ') + '\n'
-            else:
-                res += f'  {file}\n'
+    def search(
+        self,
+        query:str,
+        regex:bool=False,
+        case_sensitive:bool=False,
+        path_glob:str=None,
+        context:int=2,
+        max_results:int=50
+    ) -> str:
+        print(f'[{query}]')
+        index = self.search_index
+        if index is None or index.root != os.path.realpath(self.dir_path):
+            from .search_index import TrigramIndex
+            index = self.search_index = TrigramIndex(self.dir_path)
+        if index.loaded and index.seen_generation != self.generation:
+            index.sync()
+        index.seen_generation = self.generation
+        overrides = None
+        if self.overlay is not None and self.overlay.files:
+            # 让搜索看到尚未提交的修改
+            overrides = {}
+            for path, entry in list(self.overlay.files.items()):
+                rel = os.path.relpath(path, index.root)
+                if not rel.startswith(os.pardir):
+                    overrides[rel] = None if entry is None else entry[0].encode('utf-8')
+        results, total = index.search(query, regex, case_sensitive, path_glob, max(context, 0), max(max_results, 1), overrides)
+        if not results:
+            return f'没有找到与{query!r}匹配的内容。'
+        res = []
+        for rel, lineno, lines in results:
+            for no, text in lines:
+                res.append(f'{rel}:{no}:{text}' if no == lineno else f'{rel}-{no}-{text}')
+            if context:
+                res.append('--')
+        head = f'共{total}处匹配' + (f'，仅显示前{len(results)}处' if total > len(results) else '') + '：\n'
+        return head + '\n'.join(res)
+
+    def list_files(
+        self,
+        max_depth:int=3,
+        include:list=None,
+        exclude:list=None,
+        gitignore:bool=True,
+        max_entries:int=200,
+        cursor:str=None,
+        show_size:bool=False
+    ) -> str:
+        # 输出当前目录下的所有文件和文件夹的树状图（默认3层）；已缓存的目录树不够深时临时读取
+        root = self.root if max_depth <= self.level else DirNode(self.dir_path, max_depth, self.overlay)
+        res = render_tree(root, max_depth, include, exclude, gitignore, max_entries, cursor, show_size)
         print(res)
         return res
     
@@ -193,43 +859,77 @@ class FileManager:
     def __call__(self, __func_name:str, *args, **kwargs):
         return self.function(__func_name, *args, **kwargs)
 
+DirNode.__doc__ = '''DirNode类是目录树中的一个轻量节点，只保存路径、层级和（展开后的）子项列表。它包含以下属性和方法：
+- __init__(self, dir_path:str, level:int=3, overlay=None): 创建节点，此时不会读取磁盘。overlay不为None时按“磁盘+覆盖层”的视图列出子项，子目录节点继承同一个overlay。
+- files: 子项列表，普通文件为文件名字符串，子目录为DirNode（层级为0时子目录也只保存名称）。第一次访问时才使用os.scandir读取目录，并直接利用DirEntry中的类型信息判断是否为目录。
+- loaded: 子项列表是否已经读取。
+- list_files(self, max_depth=None, **kwargs) -> str: 以树状图的形式返回该目录的结构，只会展开需要显示的子目录。参数与render_tree相同。
+- add_entry(self, name, is_dir) / remove_entry(self, name): 在已展开的子项列表中增加或删除一项，返回是否发生了变化；未展开的节点不做处理。
+- sync(self) -> bool: 重新读取本层目录，把增删的子项同步到已展开的子项列表中，返回是否发生了变化。
+- loaded_nodes(self): 依次返回本节点及其所有已展开的子孙节点。'''
 FileManager.__doc__ = '''FileManager类用于管理文件系统中的文件和目录。它包含以下方法：
-- __init__(self, dir_path:str, level:int=3): 初始化文件管理器，接受一个目录路径和一个层级参数，层级参数用于控制递归读取子目录的深度。
+- __init__(self, dir_path:str, level:int=3): 初始化文件管理器，接受一个目录路径和一个层级参数，层级参数用于控制递归读取子目录的深度。目录树由按需展开的DirNode构成，初始化时不会扫描磁盘。
+- read_cache: 本文件管理器的ReadCache，避免在对话中重复发送未变化的文件内容。
+- generation: 工作区版本号，文件管理器自身的修改操作、回滚或后台监视器观察到的磁盘变化都会使其加1，其他组件可以据此判断工作区是否发生了变化。list_files、view_dir和search以它作为结果缓存的状态版本号。
+- watch(self, poll_interval:float=1.0, use_inotify:bool=True) -> WorkspaceWatcher: 启动后台监视器，把磁盘上的变化增量地同步到内存中的目录树，此后无需再调用refresh。
+- unwatch(self): 停止后台监视器。
+- own_change(self, path) -> bool: path的当前状态是否正是本文件管理器最近一次写入或删除的结果（包括写入过程中的临时文件）。监视器用它忽略自身修改引起的事件，每次写入只使版本号加1。
+- begin(self) / commit(self, fsync=True) -> int / rollback(self) -> int / end(self, commit=True) -> int: 事务模式。begin之后的写入、修改和删除只暂存在内存中的Overlay里，读取和搜索都能看到暂存的内容；commit把它们批量写入磁盘，rollback丢弃它们并把目录树恢复到磁盘上的状态，end在提交或回滚后退出事务模式。返回值为涉及的路径数。
+- overlay: 事务模式下的Overlay，非事务模式下为None。事务模式下目录树、list_files和view_dir都按“磁盘+覆盖层”的视图列出目录，事务中新建的目录及其中的文件同样可见。
 - build_function(self): 构建文件管理器的函数接口，定义了读取文件内容、写入文件、创建目录、删除文件、删除目录和列出文件等功能。
 - read_file(self, file_name:str) -> TextFileContent: 读取指定文件的内容，并以特定格式返回文件名和内容。
 - write_file(self, file_name:str, content:str) -> None: 将指定内容写入指定文件，如果文件不存在则创建新文件。
+- edit_file(self, file_name:str, edits:list=None, diff:str=None) -> str: 以查找/替换块或unified diff的形式修改已有文件，并原子地写入。
+- search(self, query:str, ...) -> str: 基于trigram索引在当前目录中搜索文本或正则表达式，返回匹配的行及其上下文。
+- read_files / write_files / delete_files / add_dirs: 对多个路径批量执行读取、写入、删除文件和创建目录，磁盘I/O在线程池中并发执行，每项单独报告错误。
 - add_dir(self, dir_name:str) -> None: 在当前目录下创建一个新的子目录。
 - delete_file(self, file_name:str) -> None: 删除当前目录下的指定文件。
 - delete_dir(self, dir_name:str) -> None: 删除当前目录下的指定子目录。
-- list_files(self) -> str: 以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。
+- list_files(self, max_depth:int=3, ...) -> str: 以树状图的形式列出当前目录下的所有文件和子目录，支持层数、通配符过滤、.gitignore、项数上限和分页。
 - __str__(self) -> str: 返回当前目录下的所有文件和子目录的树状图表示。
 - __call__(self, __func_name:str, *args, **kwargs): 根据函数名称调用对应的函数实现，并传递参数。'''
 FileManager.build_function.__doc__ = '''build_function方法用于构建文件管理器的函数接口，定义了以下功能：
 - read_file: 读取指定文件的内容，并以特定格式返回文件名和内容。参数包括file_name，表示要读取的文件名，必须存在于当前目录中。
 - write_file: 将指定内容写入指定文件，如果文件不存在则创建新文件。参数包括file_name，表示要写入的文件名，可以是新文件或现有文件；content，表示要写入文件的内容。
+- edit_file: 以查找/替换块或unified diff的形式修改已有文件。参数包括file_name，表示要修改的文件名；edits或diff，表示要应用的修改。
+- read_files、write_files、delete_files、add_dirs: 对应单个文件操作的批量版本，参数为文件（或目录）列表。
+- search: 在当前目录的所有文本文件中搜索。参数包括query，表示要搜索的内容；以及可选的regex、case_sensitive、path_glob、context和max_results。
 - add_dir: 在当前目录下创建一个新的子目录。参数包括dir_name，表示要创建的子目录名称，必须在当前目录中唯一。
 - delete_file: 删除当前目录下的指定文件。参数包括file_name，表示要删除的文件名，必须存在于当前目录中。
 - delete_dir: 删除当前目录下的指定子目录。参数包括dir_name，表示要删除的子目录名称，必须存在于当前目录中，并且是一个目录。
-- list_files: 以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。该功能不需要参数。
+- list_files: 以树状图的形式列出当前目录下的所有文件和子目录。参数均为可选：max_depth、include、exclude、gitignore、max_entries、cursor和show_size。
+- view_dir: 查看当前目录下指定子目录的树状结构。参数包括dir_name，以及与list_files相同的可选参数。
+- commit_changes / rollback_changes: 事务模式下提交或撤销暂存的修改，没有参数。
 注意：此函数会在__init__方法中被自动调用，请不要手动调用该函数。'''
 FileManager.read_file.__doc__ = '''read_file方法用于读取指定文件的内容，并以特定格式返回文件名和内容。它接受以下参数：
 - file_name: 要读取的文件名，必须存在于当前目录中。
-该方法会检查指定的文件是否存在于当前目录中，如果存在，则打开文件并读取其内容，然后返回一个TextFileContent对象的字符串表示形式，其中包含文件名和文件内容。'''
+- start_line, end_line: 可选的行范围，从1开始，包含两端。
+- offset, length: 可选的字节范围，给出其中任意一个时按字节范围读取。
+该方法会检查指定的文件是否存在于当前目录中，如果存在，则读取所需的范围，然后返回一个TextFileContent对象的字符串表示形式，其中包含文件名、文件信息（总行数、字节数和返回的范围）和文件内容。
+读取基于mmap和按(路径, 大小, 修改时间)缓存的行偏移索引，只解码所需的部分；单次最多返回max_read_bytes字节，超出时截断到完整的行并在文件信息中注明。
+同一范围重复读取时经过read_cache：文件未变化时只返回“自第N轮以来未变化”的提示，文件变化时返回相对于上次返回内容的diff。'''
 FileManager.write_file.__doc__ = '''write_file方法用于将指定内容写入指定文件，如果文件不存在则创建新文件。它接受以下参数：
 - file_name: 要写入的文件名，可以是新文件或现有文件。
 - content: 要写入文件的内容。
 该方法会打开指定的文件进行写入，如果文件不存在则创建新文件，然后将内容写入文件中。如果写入成功且文件之前不存在，则会将新文件名添加到当前目录的文件列表中。'''
 FileManager.add_dir.__doc__ = '''add_dir方法用于在当前目录下创建一个新的子目录。它接受以下参数：
 - dir_name: 要创建的子目录名称，必须在当前目录中唯一。
-该方法会检查指定的子目录名称是否在当前目录中已经存在，如果不存在，则创建新的子目录，并将一个新的FileManager对象添加到当前目录的文件列表中，以便管理新创建的子目录。如果指定的子目录名称已经存在，则会抛出一个ValueError异常。'''
+该方法会检查指定的子目录名称是否在当前目录中已经存在，如果不存在，则创建新的子目录，并将一个新的DirNode对象添加到当前目录的文件列表中。如果指定的子目录名称已经存在，则会抛出一个ValueError异常。'''
 FileManager.delete_file.__doc__ = '''delete_file方法用于删除当前目录下的指定文件。它接受以下参数：
 - file_name: 要删除的文件名，必须存在于当前目录中。
 该方法会检查指定的文件是否存在于当前目录中，如果存在，则删除该文件，并将文件名从当前目录的文件列表中移除。如果指定的文件不存在，则会抛出一个ValueError异常。'''
 FileManager.delete_dir.__doc__ = '''delete_dir方法用于删除当前目录下的指定子目录。它接受以下参数：
 - dir_name: 要删除的子目录名称，必须存在于当前目录中，并且是一个目录。
-该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则删除该子目录，并将对应的FileManager对象从当前目录的文件列表中移除。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
-FileManager.list_files.__doc__ = '''list_files方法用于以树状图的形式列出当前目录下的所有文件和子目录，支持显示3层结构。该方法不需要参数。
-该方法会遍历当前目录的文件列表，对于每个文件，如果是一个FileManager对象，则递归调用其list_files方法来获取子目录的树状图表示；如果是一个普通文件，则直接添加到树状图中。最终返回一个字符串，表示当前目录下的所有文件和子目录的树状图结构。'''
+该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则删除该子目录，并将对应的DirNode对象从当前目录的文件列表中移除。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
+FileManager.list_files.__doc__ = '''list_files方法用于以树状图的形式列出当前目录下的所有文件和子目录。它接受以下参数（均为可选）：
+- max_depth: 最多展开的子目录层数，默认为3。
+- include: 只显示匹配这些通配符的文件。
+- exclude: 排除匹配这些通配符的文件或目录，默认为.git、__pycache__和node_modules。
+- gitignore: 是否按.gitignore排除文件，默认为True。
+- max_entries: 最多显示的项数，默认为200；超出时输出末尾会给出cursor。
+- cursor: 从上一次输出给出的位置继续显示。
+- show_size: 是否显示文件大小。
+该方法使用render_tree对目录树做一次深度优先遍历，输出只打印和拼接一次；max_depth不超过文件管理器的层级时使用已缓存的目录树，否则临时读取更深的目录。最终返回一个字符串，表示当前目录下的文件和子目录的树状图结构。'''
 FileManager.__str__.__doc__ = '''__str__方法用于返回当前目录下的所有文件和子目录的树状图表示。该方法不需要参数。
 该方法会调用list_files方法来获取当前目录下的所有文件和子目录的树状图表示，并返回该字符串。'''
 FileManager.__call__.__doc__ = '''__call__方法用于根据函数名称调用对应的函数实现，并传递参数。它接受以下参数：
@@ -238,7 +938,34 @@ FileManager.__call__.__doc__ = '''__call__方法用于根据函数名称调用
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
 该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
 FileManager.refresh.__doc__ = '''refresh方法用于刷新当前目录的文件列表（重新读取磁盘）。该方法不需要参数。
-该方法会重新读取当前目录的文件列表，并根据层级参数重新构建子目录的FileManager对象，以确保文件管理器的状态与磁盘上的实际文件系统保持一致。'''
+该方法会丢弃已经读取的目录树，换成一个新的未展开的根节点；之后访问文件列表时会重新读取磁盘，以确保文件管理器的状态与磁盘上的实际文件系统保持一致。'''
+FileManager.read_files.__doc__ = '''read_files方法用于一次读取多个文件。它接受以下参数：
+- file_names: 要读取的文件名列表，每项与read_file的file_name相同。
+各文件在线程池中并发读取，结果按输入顺序拼接；读取失败的文件以“[file name]: 名称\n[error]: 错误信息”的形式给出，不影响其他文件。'''
+FileManager.write_files.__doc__ = '''write_files方法用于一次写入多个文件。它接受以下参数：
+- files: 由{'file_name':..., 'content':...}组成的列表。
+各文件在线程池中并发写入，同一批次中重复出现的文件名会被拒绝；写入完成后在当前线程中统一更新目录树、工作区版本号和搜索索引。返回成功和失败的数量，以及每个失败项的错误信息。'''
+FileManager.delete_files.__doc__ = '''delete_files方法用于一次删除多个文件。它接受以下参数：
+- file_names: 要删除的文件名列表，可以包含子目录中的相对路径。
+返回成功和失败的数量，以及每个失败项的错误信息。'''
+FileManager.add_dirs.__doc__ = '''add_dirs方法用于一次创建多个子目录。它接受以下参数：
+- dir_names: 要创建的子目录名称列表，可以是多级相对路径。
+已经存在的目录会作为失败项报告。返回成功和失败的数量，以及每个失败项的错误信息。'''
+FileManager.search.__doc__ = '''search方法用于在当前目录（递归）的文本文件中搜索。它接受以下参数：
+- query: 要搜索的文本；regex为True时为Python正则表达式。
+- regex: 是否按正则表达式搜索，默认为False。
+- case_sensitive: 是否区分大小写，默认为False。
+- path_glob: 只搜索相对路径匹配该通配符的文件。
+- context: 每处匹配前后显示的行数，默认为2。
+- max_results: 最多显示的匹配数，默认为50。
+搜索基于保存在磁盘上的TrigramIndex，第一次搜索时加载或构建索引。通过本文件管理器写入、修改或删除的文件会立即增量更新索引；如果工作区版本号显示有其他来源的变化（例如后台监视器观察到的变化），搜索前会按文件大小和修改时间增量同步索引。
+返回的每一行格式为“路径:行号:内容”，上下文行格式为“路径-行号-内容”。'''
+FileManager.edit_file.__doc__ = '''edit_file方法用于修改已有文件的一部分。它接受以下参数：
+- file_name: 要修改的文件名，必须已经存在。
+- edits: 查找/替换块列表，每项为{'search':..., 'replace':...}，按顺序应用，每个search必须唯一匹配。
+- diff: unified diff格式的修改。edits和diff必须且只能给出一个。
+该方法会在内存中应用全部修改并校验上下文，任何一处无法应用时抛出异常且文件保持不变；全部成功后通过临时文件和重命名原子地写入，并保留文件原有的换行符风格。返回修改的简要说明。
+与write_file相比，模型只需输出要修改的部分，大文件的修改无需重新生成整个文件。'''
 FileManager.view_dir.__doc__ = '''view_dir方法用于查看当前目录下指定子目录的树状结构，返回字符串。它接受以下参数：
 - dir_name: 要查看的子目录名称，必须在当前目录中存在。
-该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则创建一个新的FileManager对象来管理该子目录，并调用其list_files方法来获取子目录的树状图表示，最终返回该字符串。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
\ No newline at end of file
+该方法会检查指定的子目录名称是否存在于当前目录中，并且确认它是一个目录。如果满足条件，则为该子目录创建一个DirNode对象，并使用render_tree获取子目录的树状图表示，最终返回该字符串。其余可选参数与list_files相同。如果指定的子目录不存在，或者不是一个目录，则会抛出一个ValueError异常。'''
\ No newline at end of file
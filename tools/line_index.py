@@ -0,0 +1,146 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import mmap
+import os
+import threading
+
+class LineIndex:
+    def __init__(self, path:str, size:int, mtime_ns:int)->None:
+        self.path, self.size, self.mtime_ns = path, size, mtime_ns
+        # starts[i]为第i+1行在文件中的起始字节偏移
+        self.starts = array('Q', [0]) if size else array('Q')
+        if size:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                find, append = mm.find, self.starts.append
+                pos = find(b'\n')
+                while pos != -1 and pos + 1 < size:
+                    append(pos + 1)
+                    pos = find(b'\n', pos + 1)
+        return
+
+    @classmethod
+    def from_bytes(cls, data:bytes)->'LineIndex':
+        index = cls.__new__(cls)
+        index.path, index.size, index.mtime_ns = None, len(data), 0
+        index.starts = array('Q', [0]) if data else array('Q')
+        find, append, size = data.find, index.starts.append, len(data)
+        pos = find(b'\n')
+        while pos != -1 and pos + 1 < size:
+            append(pos + 1)
+            pos = find(b'\n', pos + 1)
+        return index
+
+    @property
+    def line_count(self)->int:
+        return len(self.starts)
+
+    def span(self, start_line:int, end_line:int)->Tuple[int, int]:
+        # 行号从1开始，包含end_line
+        start = self.starts[start_line-1]
+        end = self.starts[end_line] if end_line < len(self.starts) else self.size
+        return start, end
+
+    def line_of(self, offset:int)->int:
+        return bisect_right(self.starts, offset)
+
+_CACHE:'OrderedDict[tuple, LineIndex]' = OrderedDict()
+_CACHE_SIZE = 32
+_LOCK = threading.Lock()
+
+def get_line_index(path:str, st:Optional[os.stat_result]=None)->LineIndex:
+    st = st or os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _LOCK:
+        index = _CACHE.get(key)
+        if index is not None:
+            _CACHE.move_to_end(key)
+            return index
+    index = LineIndex(path, st.st_size, st.st_mtime_ns)
+    with _LOCK:
+        _CACHE[key] = index
+        while len(_CACHE) > _CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return index
+
+def read_bytes(path:str, start:int, end:int)->bytes:
+    if end <= start:
+        return b''
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end]
+
+def _read_range(
+    index:LineIndex,
+    read:Callable[[int, int], bytes],
+    start_line:Optional[int],
+    end_line:Optional[int],
+    offset:Optional[int],
+    length:Optional[int],
+    max_bytes:int
+)->Tuple[bytes, dict]:
+    size = index.size
+    info = {'size': size, 'lines': index.line_count}
+    if offset is not None or length is not None:
+        start = min(max(offset or 0, 0), size)
+        end = min(start + (length if length is not None else max_bytes), size, start + max_bytes)
+        info.update(offset=start, end=end)
+        return read(start, end), info
+    if not index.line_count:
+        info.update(start_line=0, end_line=0, truncated=False)
+        return b'', info
+    first = min(max(start_line or 1, 1), index.line_count)
+    last = min(max(end_line or index.line_count, first), index.line_count)
+    start, end = index.span(first, last)
+    truncated = end - start > max_bytes
+    if truncated:
+        # 超出单次返回上限时截断到完整的行
+        last = max(index.line_of(start + max_bytes) - 1, first)
+        start, end = index.span(first, last)
+        if end - start > max_bytes:
+            # 单独一行就超过上限：只返回这一行的前max_bytes字节，并在UTF-8字符边界处截断
+            data = read(start, start + max_bytes + 1)
+            cut = max_bytes
+            while cut > 0 and data[cut] & 0xC0 == 0x80:
+                cut -= 1
+            info.update(start_line=first, end_line=last, truncated=True, partial=True, next_offset=start + cut)
+            return data[:cut], info
+    info.update(start_line=first, end_line=last, truncated=truncated)
+    return read(start, end), info
+
+def read_range(
+    path:str,
+    start_line:Optional[int]=None,
+    end_line:Optional[int]=None,
+    offset:Optional[int]=None,
+    length:Optional[int]=None,
+    max_bytes:int=200000
+)->Tuple[bytes, dict]:
+    st = os.stat(path)
+    index = get_line_index(path, st)
+    return _read_range(index, lambda start, end: read_bytes(path, start, end), start_line, end_line, offset, length, max_bytes)
+
+def read_range_bytes(
+    data:bytes,
+    start_line:Optional[int]=None,
+    end_line:Optional[int]=None,
+    offset:Optional[int]=None,
+    length:Optional[int]=None,
+    max_bytes:int=200000
+)->Tuple[bytes, dict]:
+    return _read_range(LineIndex.from_bytes(data), lambda start, end: data[start:end], start_line, end_line, offset, length, max_bytes)
+
+LineIndex.__doc__ = '''LineIndex类是一个文件的行偏移索引，用mmap扫描一次文件得到每一行的起始字节偏移。它包含以下属性和方法：
+- from_bytes(cls, data) -> LineIndex: 为内存中的内容建立索引。
+- line_count: 文件的总行数。
+- span(self, start_line, end_line) -> (int, int): 返回第start_line到第end_line行（从1开始，包含两端）对应的字节范围。
+- line_of(self, offset) -> int: 返回字节偏移offset所在的行号。'''
+get_line_index.__doc__ = '''get_line_index函数返回指定文件的LineIndex。索引以(真实路径, 文件大小, 修改时间)为键缓存，文件未变化时不会重复扫描。'''
+read_range.__doc__ = '''read_range函数用于按行范围或字节范围读取文件的一部分。它接受以下参数：
+- path: 文件路径。
+- start_line, end_line: 行范围，从1开始，包含两端；省略时分别表示第一行和最后一行。
+- offset, length: 字节范围；给出其中任意一个时按字节范围读取，忽略行范围。
+- max_bytes: 单次最多返回的字节数，按行读取时会截断到完整的行。
+返回(内容的bytes, 信息字典)，信息字典包含文件大小size、总行数lines以及实际返回的范围。单独一行就超过max_bytes时只返回该行的前max_bytes字节（在UTF-8字符边界处截断），信息字典中partial为True，next_offset为可以继续按字节范围读取的偏移。
+读取通过mmap只复制所需的字节，内存占用与文件大小无关。'''
+read_range_bytes.__doc__ = '''read_range_bytes函数与read_range相同，但读取的是内存中的内容data（例如工作区覆盖层中暂存的文件），返回值的格式也相同。'''
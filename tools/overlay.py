@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import os
+import tempfile
+import threading
+
+class Overlay:
+    def __init__(self)->None:
+        # 绝对路径 -> (文本, 换行符)，None表示该文件已被删除；换行符为None时使用平台默认换行
+        self.files:Dict[str, Optional[Tuple[str, Optional[str]]]] = {}
+        # 绝对路径 -> True表示新建的目录，False表示已删除的目录
+        self.dirs:Dict[str, bool] = {}
+        self.lock = threading.RLock()
+        return
+
+    def __len__(self)->int:
+        return len(self.files) + len(self.dirs)
+
+    def staged(self, path:str)->Optional[Tuple[str, Optional[str]]]:
+        # 返回暂存的(文本, 换行符)；未暂存时返回None，已删除时抛出FileNotFoundError
+        with self.lock:
+            if path not in self.files:
+                return None
+            entry = self.files[path]
+        if entry is None:
+            raise FileNotFoundError(path)
+        return entry
+
+    def isfile(self, path:str)->bool:
+        with self.lock:
+            if path in self.files:
+                return self.files[path] is not None
+            if self.dirs.get(path) is not None:
+                return False
+        return os.path.isfile(path)
+
+    def isdir(self, path:str)->bool:
+        with self.lock:
+            if path in self.dirs:
+                return self.dirs[path]
+            if self.files.get(path) is not None:
+                return False
+        return os.path.isdir(path)
+
+    def exists(self, path:str)->bool:
+        return self.isfile(path) or self.isdir(path)
+
+    def listdir(self, path:str)->Set[str]:
+        names = set()
+        with self.lock:
+            if self.dirs.get(path, True) and os.path.isdir(path):
+                names.update(os.listdir(path))
+            for p, entry in self.files.items():
+                if os.path.dirname(p) == path:
+                    (names.add if entry is not None else names.discard)(os.path.basename(p))
+            for p, created in self.dirs.items():
+                if os.path.dirname(p) == path:
+                    (names.add if created else names.discard)(os.path.basename(p))
+        return names
+
+    def write(self, path:str, text:str, newline:Optional[str]=None)->None:
+        parent = os.path.dirname(path)
+        if not self.isdir(parent):
+            raise FileNotFoundError(f'Directory {parent} does not exist.')
+        with self.lock:
+            self.files[path] = (text, newline)
+
+    def remove(self, path:str)->None:
+        if not self.isfile(path):
+            raise FileNotFoundError(path)
+        with self.lock:
+            self.files[path] = None
+
+    def makedirs(self, path:str)->List[str]:
+        # 返回新建的目录（包括中间目录），由浅到深
+        created = []
+        with self.lock:
+            while not self.isdir(path):
+                if self.isfile(path):
+                    raise FileExistsError(path)
+                created.append(path)
+                path = os.path.dirname(path)
+            for p in created:
+                self.dirs[p] = True
+        return created[::-1]
+
+    def rmdir(self, path:str)->None:
+        if not self.isdir(path):
+            raise FileNotFoundError(path)
+        if self.listdir(path):
+            raise OSError(f'Directory {path} is not empty.')
+        with self.lock:
+            self.dirs[path] = False
+
+    def paths(self)->List[Tuple[str, bool]]:
+        # 所有暂存的路径及其是否为目录，用于回滚或提交后同步目录树
+        with self.lock:
+            return [(p, False) for p in self.files] + [(p, True) for p in self.dirs]
+
+    def rollback(self)->List[Tuple[str, bool]]:
+        with self.lock:
+            paths = self.paths()
+            self.files.clear()
+            self.dirs.clear()
+        return paths
+
+    @staticmethod
+    def _fsync_path(path:str, flags:int=os.O_RDONLY)->None:
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def commit(self, fsync:bool=True, max_workers:int=8)->List[Tuple[str, bool, bool]]:
+        with self.lock:
+            files, dirs = dict(self.files), dict(self.dirs)
+            self.files.clear()
+            self.dirs.clear()
+        changed:List[Tuple[str, bool, bool]] = []
+        touched_dirs = set()
+        for path in sorted((p for p, created in dirs.items() if created), key=len):
+            os.makedirs(path, exist_ok=True)
+            touched_dirs.add(os.path.dirname(path))
+            changed.append((path, False, True))
+        # 先把所有文件写入同目录下的临时文件，全部成功后才替换原文件
+        temps:List[Tuple[str, str]] = []
+        try:
+            for path, entry in files.items():
+                if entry is None:
+                    continue
+                text, newline = entry
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+                temps.append((tmp, path))
+                with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+                    f.write(text)
+                try:
+                    os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+                except FileNotFoundError:
+                    pass
+            if fsync and temps:
+                # 并发地fsync所有临时文件，文件系统可以把它们合并到同一次日志提交中
+                with ThreadPoolExecutor(max_workers=max(min(max_workers, len(temps)), 1)) as pool:
+                    list(pool.map(self._fsync_path, [tmp for tmp, _ in temps]))
+        except BaseException:
+            for tmp, _ in temps:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            with self.lock:
+                # 磁盘上的文件没有被修改，暂存的内容保留下来，可以再次提交或回滚
+                for path, entry in files.items():
+                    self.files.setdefault(path, entry)
+                for path, created in dirs.items():
+                    self.dirs.setdefault(path, created)
+            raise
+        for tmp, path in temps:
+            os.replace(tmp, path)
+            touched_dirs.add(os.path.dirname(path))
+            changed.append((path, False, False))
+        for path, entry in files.items():
+            if entry is None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                touched_dirs.add(os.path.dirname(path))
+                changed.append((path, True, False))
+        for path in sorted((p for p, created in dirs.items() if not created), key=len, reverse=True):
+            try:
+                os.rmdir(path)
+            except FileNotFoundError:
+                pass
+            touched_dirs.add(os.path.dirname(path))
+            changed.append((path, True, True))
+        if fsync:
+            # 重命名和删除记录在目录项中，每个目录只需fsync一次
+            for path in touched_dirs:
+                try:
+                    self._fsync_path(path)
+                except OSError:
+                    pass
+        return changed
+
+Overlay.__doc__ = '''Overlay类是工作区的写时复制覆盖层：修改先暂存在内存中，读取时优先看到暂存的内容，提交时再一次性写入磁盘。它包含以下方法：
+- staged(self, path) -> (text, newline) 或 None: 返回暂存的文件内容，未暂存时返回None，文件已在覆盖层中被删除时抛出FileNotFoundError。
+- isfile, isdir, exists, listdir: 按“磁盘+覆盖层”的视图检查路径。
+- write(self, path, text, newline=None) / remove(self, path) / makedirs(self, path) / rmdir(self, path): 在内存中暂存写入、删除文件、创建目录（包括中间目录）和删除空目录。
+- commit(self, fsync=True) -> List[(path, removed, is_dir)]: 把暂存的修改写入磁盘并清空覆盖层，返回实际修改的路径。
+- rollback(self) -> List[(path, is_dir)]: 丢弃所有暂存的修改，返回涉及的路径。
+提交时先创建目录，再把所有文件写入各自目录下的临时文件，并发地fsync后再用os.replace原子地替换；任何一个临时文件写入失败时删除所有临时文件，磁盘上的文件保持不变，暂存的文件和目录也会保留。替换完成后再删除文件和目录，最后对每个涉及的目录只fsync一次。所有路径都是绝对路径。'''
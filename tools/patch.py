@@ -0,0 +1,139 @@
+from typing import List, Tuple
+import os
+import re
+import tempfile
+
+_HUNK = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+class PatchError(ValueError):
+    pass
+
+def apply_edits(text:str, edits:List[dict])->Tuple[str, int]:
+    for i, edit in enumerate(edits, start=1):
+        search, replace = edit['search'], edit['replace']
+        if not search:
+            raise PatchError(f'Edit {i}: search text is empty.')
+        count = text.count(search)
+        if count == 0:
+            raise PatchError(f'Edit {i}: search text not found.')
+        if count > 1:
+            raise PatchError(f'Edit {i}: search text matches {count} places, add more context to make it unique.')
+        text = text.replace(search, replace, 1)
+    return text, len(edits)
+
+def parse_unified_diff(diff:str)->List[Tuple[int, List[str], List[str]]]:
+    hunks = []
+    old = new = None
+    # 当前hunk头部声明的剩余行数，用于区分删除/添加行与下一个文件的---/+++文件头
+    rest_old = rest_new = 0
+    lines = diff.split('\n')
+    for i, line in enumerate(lines):
+        m = _HUNK.match(line)
+        if m:
+            old, new = [], []
+            hunks.append((int(m.group(1)), old, new))
+            rest_old = int(m.group(2)) if m.group(2) is not None else 1
+            rest_new = int(m.group(4)) if m.group(4) is not None else 1
+            continue
+        if old is None or line.startswith('\\'):
+            continue
+        if rest_old <= 0 and rest_new <= 0 and line.startswith('--- ') and i + 1 < len(lines) and lines[i+1].startswith('+++ '):
+            # hunk声明的行数已经用完，这是下一个文件的文件头
+            continue
+        if rest_old <= 0 and rest_new <= 0 and line.startswith('+++ ') and i > 0 and lines[i-1].startswith('--- '):
+            continue
+        if line.startswith('-'):
+            old.append(line[1:])
+            rest_old -= 1
+        elif line.startswith('+'):
+            new.append(line[1:])
+            rest_new -= 1
+        elif line.startswith(' ') or line == '':
+            # 空行视为内容为空的上下文行
+            old.append(line[1:])
+            new.append(line[1:])
+            rest_old -= 1
+            rest_new -= 1
+    if not hunks:
+        raise PatchError('No hunks found in diff.')
+    # 末尾的空行通常来自diff文本本身的换行，不属于上下文
+    for _, old, new in hunks:
+        while old and new and old[-1] == '' and new[-1] == '':
+            old.pop()
+            new.pop()
+    return hunks
+
+def _find(lines:List[str], block:List[str], hint:int)->int:
+    n = len(block)
+    if lines[hint:hint+n] == block:
+        return hint
+    # 行号不准确时在整个文件中查找，要求唯一匹配
+    found = [i for i in range(len(lines) - n + 1) if lines[i:i+n] == block]
+    if len(found) == 1:
+        return found[0]
+    if not found:
+        return -1
+    best = min(abs(i - hint) for i in found)
+    closest = [i for i in found if abs(i - hint) == best]
+    if len(closest) > 1:
+        # 无法判断应修改哪一处，宁可失败也不能改错位置
+        raise PatchError(f'context matches {len(found)} places and {len(closest)} of them are equally close to line {hint + 1}, add more context to make it unique.')
+    return closest[0]
+
+def apply_unified_diff(text:str, diff:str)->Tuple[str, int]:
+    lines = text.split('\n')
+    shift = 0
+    hunks = parse_unified_diff(diff)
+    for i, (start, old, new) in enumerate(hunks, start=1):
+        hint = max(start - 1 + shift, 0) if old else min(start + shift, len(lines))
+        try:
+            pos = _find(lines, old, hint) if old else hint
+        except PatchError as e:
+            raise PatchError(f'Hunk {i} (line {start}): {e}')
+        if pos < 0:
+            raise PatchError(f'Hunk {i} (line {start}): context does not match the file.')
+        lines[pos:pos+len(old)] = new
+        shift = pos + len(new) - (start - 1) - len(old)
+    return '\n'.join(lines), len(hunks)
+
+def atomic_write(path:str, content:str, newline:str='\n', fsync:bool=True)->None:
+    dir_name = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dir_name, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+            f.write(content)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+PatchError.__doc__ = '''PatchError表示修改无法应用到文件上（找不到要替换的文本、匹配不唯一或上下文不符），它是ValueError的子类。'''
+apply_edits.__doc__ = '''apply_edits函数用于依次应用一组查找/替换修改。它接受以下参数：
+- text: 原始文本。
+- edits: 由{'search':..., 'replace':...}组成的列表，每个search必须在（前面的修改应用之后的）文本中恰好出现一次。
+返回(修改后的文本, 应用的修改数)。任何一处无法应用时抛出PatchError，原始文本不受影响。'''
+parse_unified_diff.__doc__ = '''parse_unified_diff函数用于解析unified diff文本，返回由(原文件起始行号, 原始行列表, 新行列表)组成的hunk列表。第一个hunk之前以及hunk声明的行数用完之后的文件头（---/+++）会被忽略；hunk内部以---或+++开头的行是删除或添加的内容（例如删除一行“-- comment”）。hunk头部的行数不准确时，其后的内容行仍会被接受。'''
+apply_unified_diff.__doc__ = '''apply_unified_diff函数用于把unified diff应用到文本上。它接受以下参数：
+- text: 原始文本。
+- diff: unified diff文本，可以包含一个或多个hunk。
+每个hunk的上下文行和删除行必须与文件内容一致：优先在hunk给出的行号处匹配，行号不准确时在全文中查找，有多处匹配时选择离给出的行号最近的一处；最近的匹配不止一处时抛出PatchError，要求提供更多上下文。返回(修改后的文本, 应用的hunk数)，无法匹配时抛出PatchError。'''
+atomic_write.__doc__ = '''atomic_write函数用于原子地写入文件：先写入同目录下的临时文件并fsync，保留原文件的权限，再用os.replace替换原文件。写入过程中出错时删除临时文件，原文件保持不变。'''
+
+if __name__ == '__main__':
+    # hunk内部以---开头的删除行和以+++开头的添加行不是文件头
+    text = 'SELECT 1;\n-- comment\nSELECT 2;'
+    diff = '--- a/q.sql\n+++ b/q.sql\n@@ -1,3 +1,3 @@\n SELECT 1;\n--- comment\n+++ x\n SELECT 2;\n'
+    print(apply_unified_diff(text, diff))  # Output: ('SELECT 1;\n++ x\nSELECT 2;', 1)
+    # 多个文件的diff中，上一个hunk结束后的---/+++仍按文件头忽略
+    diff = '--- a/q.sql\n+++ b/q.sql\n@@ -1 +1 @@\n-SELECT 1;\n+SELECT 0;\n--- a/q.sql\n+++ b/q.sql\n@@ -3 +3 @@\n-SELECT 2;\n+SELECT 3;\n'
+    print(apply_unified_diff(text, diff))  # Output: ('SELECT 0;\n-- comment\nSELECT 3;', 2)
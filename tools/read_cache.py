@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Optional
+import difflib
+import hashlib
+import os
+import threading
+
+class _Entry:
+    __slots__ = ('size', 'mtime_ns', 'digest', 'content', 'turn')
+
+    def __init__(self, size:int, mtime_ns:int, digest:str, content:str, turn:int)->None:
+        self.size, self.mtime_ns, self.digest, self.content, self.turn = size, mtime_ns, digest, content, turn
+
+class ReadCache:
+    def __init__(self, max_bytes:int=32*1024*1024)->None:
+        self.max_bytes = max_bytes
+        self.turn = 0
+        self.enabled = True
+        self.__entries:'OrderedDict[tuple, _Entry]' = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        return
+
+    def next_turn(self)->int:
+        self.turn += 1
+        return self.turn
+
+    def clear(self)->None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def forget(self, path:str)->None:
+        real = os.path.realpath(path)
+        with self.__lock:
+            for key in [k for k in self.__entries if k[0] == real]:
+                self.__bytes -= len(self.__entries.pop(key).content)
+
+    @staticmethod
+    def key(path:str, *range_args)->tuple:
+        return (os.path.realpath(path),) + range_args
+
+    @staticmethod
+    def _unchanged(file_name:str, entry:_Entry)->str:
+        return f'[file name]: {file_name}\n[file unchanged]: 内容自第{entry.turn}轮返回后没有变化（sha1 {entry.digest[:12]}），请直接参考之前的结果。\n'
+
+    def get(self, key:tuple, st:os.stat_result, file_name:str)->Optional[str]:
+        # 大小和修改时间都未变化时无需读取文件
+        if not self.enabled:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry.size != st.st_size or entry.mtime_ns != st.st_mtime_ns:
+                return None
+            self.__entries.move_to_end(key)
+        return self._unchanged(file_name, entry)
+
+    def put(self, key:tuple, st:os.stat_result, file_name:str, content:str, full:str)->str:
+        if not self.enabled:
+            return full
+        digest = hashlib.sha1(content.encode('utf-8', 'replace')).hexdigest()
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= len(old.content)
+            if old is not None and old.digest == digest:
+                # 只是修改时间变化，内容相同
+                entry = _Entry(st.st_size, st.st_mtime_ns, digest, content, old.turn)
+            else:
+                entry = _Entry(st.st_size, st.st_mtime_ns, digest, content, self.turn)
+            self.__entries[key] = entry
+            self.__bytes += len(content)
+            while self.__bytes > self.max_bytes and len(self.__entries) > 1:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__bytes -= len(evicted.content)
+        if old is None:
+            return full
+        if old.digest == digest:
+            return self._unchanged(file_name, entry)
+        diff = ''.join(difflib.unified_diff(
+            old.content.splitlines(keepends=True), content.splitlines(keepends=True),
+            fromfile=f'{file_name}（第{old.turn}轮）', tofile=f'{file_name}（当前）'
+        ))
+        if len(diff) >= len(full):
+            return full
+        return f'[file name]: {file_name}\n[file changed]: 内容自第{old.turn}轮返回后发生了变化，以下为相对于当时内容的unified diff。\n[file diff begin]{diff}[file diff end]\n'
+
+ReadCache.__doc__ = '''ReadCache类是每个会话独立的文件读取缓存，用于避免在对话历史中重复发送未变化的文件内容。它包含以下属性和方法：
+- turn: 当前的对话轮次，由会话在每轮开始时通过next_turn更新。
+- enabled: 是否启用缓存。
+- get(self, key, st, file_name) -> str | None: 如果该文件（及读取范围）上次返回后大小和修改时间都没有变化，返回一条简短的“未变化”提示，否则返回None。
+- put(self, key, st, file_name, content, full) -> str: 记录本次读取到的内容，并返回应当发送给模型的结果：第一次读取返回完整结果full；内容哈希未变化时返回“未变化”提示；内容变化时返回相对于上次返回内容的unified diff（diff比完整结果更长时仍返回完整结果）。
+- forget(self, path): 删除某个文件的所有缓存项。
+- clear(self): 清空缓存。对话历史被压缩、旧的文件内容不再位于上下文中时应调用此方法。
+缓存项以(真实路径, 读取范围)为键，记录文件大小、修改时间、内容哈希以及返回内容时的轮次，总大小超过max_bytes时按最近最少使用的顺序淘汰。'''
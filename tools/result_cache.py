@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+import threading
+
+class ResultCache:
+    def __init__(self, max_entries:int=256, max_bytes:int=8*1024*1024)->None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.__entries:'OrderedDict[Hashable, str]' = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        return
+
+    def __len__(self)->int:
+        return len(self.__entries)
+
+    @property
+    def bytes(self)->int:
+        return self.__bytes
+
+    def get(self, key:Hashable)->Optional[str]:
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key:Hashable, value:str)->None:
+        size = len(value)
+        # 单个结果超过上限的四分之一时不缓存，避免一次调用挤掉其他所有结果
+        if not self.enabled or size > self.max_bytes // 4:
+            return
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= len(old)
+            self.__entries[key] = value
+            self.__bytes += size
+            while self.__entries and (len(self.__entries) > self.max_entries or self.__bytes > self.max_bytes):
+                _, evicted = self.__entries.popitem(last=False)
+                self.__bytes -= len(evicted)
+
+    def clear(self)->None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+ResultCache.__doc__ = '''ResultCache类是工具调用结果的LRU缓存，由AIFunction用于缓存声明为pure的只读函数的结果。它包含以下属性和方法：
+- get(self, key) -> str | None: 返回缓存的结果，未命中时返回None。
+- put(self, key, value): 缓存一个结果；项数超过max_entries或总字符数超过max_bytes时按最近最少使用的顺序淘汰。超过max_bytes四分之一的结果不会被缓存。
+- clear(self): 清空缓存。
+- hits / misses: 命中和未命中的次数；bytes: 当前缓存的总字符数；enabled: 是否启用缓存。
+缓存本身不检查结果是否过期：键中包含状态的版本号，状态变化后旧的键不会再被查询，最终被LRU淘汰。'''
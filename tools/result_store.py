@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import threading
+
+class ResultStore:
+    head_chars = 2000
+    tail_chars = 1000
+
+    def __init__(self, max_bytes:int=64*1024*1024, max_fetch:int=16000)->None:
+        self.max_bytes = max_bytes
+        self.max_fetch = max_fetch
+        # 句柄 -> (工具名称, 完整结果)
+        self.__entries:'OrderedDict[str, Tuple[str, str]]' = OrderedDict()
+        self.__digests:Dict[str, str] = {}
+        self.__bytes = 0
+        self.__count = 0
+        self.__lock = threading.Lock()
+        return
+
+    def __len__(self)->int:
+        return len(self.__entries)
+
+    @property
+    def bytes(self)->int:
+        return self.__bytes
+
+    def put(self, name:str, text:str)->str:
+        # 内容相同的结果（例如缓存命中的重复调用）共用一个句柄
+        digest = hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()
+        with self.__lock:
+            handle = self.__digests.get(digest)
+            if handle is not None and handle in self.__entries:
+                self.__entries.move_to_end(handle)
+                return handle
+            self.__count += 1
+            handle = f'r{self.__count}-{digest[:6]}'
+            self.__entries[handle] = (name, text)
+            self.__digests[digest] = handle
+            self.__bytes += len(text)
+            while self.__bytes > self.max_bytes and len(self.__entries) > 1:
+                _, (_, evicted) = self.__entries.popitem(last=False)
+                self.__bytes -= len(evicted)
+            if len(self.__digests) > 4 * len(self.__entries) + 64:
+                self.__digests = {d: h for d, h in self.__digests.items() if h in self.__entries}
+        return handle
+
+    def get(self, handle:str)->Optional[str]:
+        with self.__lock:
+            entry = self.__entries.get(handle)
+            if entry is None:
+                return None
+            self.__entries.move_to_end(handle)
+        return entry[1]
+
+    def preview(self, name:str, text:str)->str:
+        handle = self.put(name, text)
+        head, tail = text[:self.head_chars], text[-self.tail_chars:]
+        # 尽量在换行处截断，不把一行拆成两半
+        cut = head.rfind('\n')
+        if cut >= len(head) // 2:
+            head = head[:cut+1]
+        cut = tail.find('\n')
+        if 0 <= cut < len(tail) // 2:
+            tail = tail[cut+1:]
+        omitted = len(text) - len(head) - len(tail)
+        return (
+            f'[result handle]: {handle}\n'
+            f'[result info]: 工具{name}的结果共{len(text)}个字符、{text.count(chr(10)) + 1}行，超过了直接返回的上限，完整结果已保存。'
+            f'以下为开头{len(head)}个字符和结尾{len(tail)}个字符，中间省略了{omitted}个字符（第{len(head)}-{len(text) - len(tail)}个字符）。'
+            f'如需查看其余部分，请调用fetch_result(handle="{handle}", offset=..., limit=...)。\n'
+            f'[result head begin]{head}[result head end]\n'
+            f'[result tail begin]{tail}[result tail end]\n'
+        )
+
+    def fetch(self, handle:str, offset:int=0, limit:Optional[int]=None)->str:
+        text = self.get(handle)
+        if text is None:
+            raise ValueError(f'Result {handle} not found; it may have expired. Call the original tool again.')
+        limit = self.max_fetch if limit is None else min(max(limit, 1), self.max_fetch)
+        start = min(max(offset, 0), len(text))
+        end = min(start + limit, len(text))
+        info = f'第{start}-{end}个字符，共{len(text)}个字符'
+        if end < len(text):
+            info += f'，下一页请使用offset={end}'
+        return f'[result handle]: {handle}\n[result info]: {info}\n[result content begin]{text[start:end]}[result content end]\n'
+
+ResultStore.__doc__ = '''ResultStore类是每个会话独立的工具结果存储，用于保存超过长度上限的工具结果，使它们不必完整地进入对话历史。它包含以下方法：
+- put(self, name, text) -> str: 保存一个完整结果并返回句柄；内容相同的结果返回同一个句柄。
+- get(self, handle) -> str | None: 返回句柄对应的完整结果，已被淘汰时返回None。
+- preview(self, name, text) -> str: 保存结果，并返回发送给模型的预览：句柄、结果的总长度，以及开头head_chars个字符和结尾tail_chars个字符。
+- fetch(self, handle, offset=0, limit=None) -> str: 返回完整结果中从第offset个字符开始的最多limit个字符（不超过max_fetch），即fetch_result工具的实现。
+所有偏移量都以字符计。总字符数超过max_bytes时按最近最少使用的顺序淘汰，被淘汰的句柄再次查询时会返回错误，提示模型重新调用原来的工具。'''
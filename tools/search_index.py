@@ -0,0 +1,287 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from .executor import check_cancelled
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+SKIP_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.tox', '.nox'}
+MAX_FILE_BYTES = 2 * 1024 * 1024
+INDEX_VERSION = 1
+
+def trigrams(data:bytes)->Set[bytes]:
+    return {data[i:i+3] for i in range(len(data) - 2)}
+
+def _literal_runs(pattern:str, flags:int=0)->List[str]:
+    # 取出正则表达式顶层必须出现的连续字面量，用于从索引中筛选候选文件
+    runs, cur = [], []
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            cur.append(chr(arg))
+            continue
+        if cur:
+            runs.append(''.join(cur))
+            cur = []
+    if cur:
+        runs.append(''.join(cur))
+    return [r for r in runs if len(r.encode('utf-8')) >= 3]
+
+class TrigramIndex:
+    def __init__(self, root:str, index_path:Optional[str]=None)->None:
+        self.root = os.path.realpath(root)
+        if index_path is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'simpleagent')
+            index_path = os.path.join(cache_dir, hashlib.sha1(self.root.encode('utf-8')).hexdigest()[:16] + '.idx')
+        self.index_path = index_path
+        # 相对路径 -> (文件id, 大小, 修改时间)；trigram -> 文件id集合
+        self.files:Dict[str, Tuple[int, int, int]] = {}
+        self.postings:Dict[bytes, Set[int]] = {}
+        self.paths:Dict[int, str] = {}
+        self.next_id = 0
+        self.stale = 0
+        self.dirty = False
+        self.saved_at = 0.0
+        self.seen_generation = None
+        self.lock = threading.RLock()
+        self.loaded = False
+        return
+
+    def walk(self)->Iterable[Tuple[str, os.stat_result]]:
+        stack = [self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            if st.st_size <= MAX_FILE_BYTES:
+                                yield os.path.relpath(entry.path, self.root), st
+                    except OSError:
+                        continue
+
+    def _read(self, rel:str)->Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, rel), 'rb') as f:
+                data = f.read(MAX_FILE_BYTES + 1)
+        except OSError:
+            return None
+        if len(data) > MAX_FILE_BYTES or b'\0' in data[:8192]:
+            return None
+        return data
+
+    def _add(self, rel:str, st:os.stat_result)->None:
+        data = self._read(rel)
+        if data is None:
+            return
+        fid = self.next_id
+        self.next_id += 1
+        self.files[rel] = (fid, st.st_size, st.st_mtime_ns)
+        self.paths[fid] = rel
+        postings = self.postings
+        for tri in trigrams(data.lower()):
+            ids = postings.get(tri)
+            if ids is None:
+                postings[tri] = {fid}
+            else:
+                ids.add(fid)
+        self.dirty = True
+
+    def _remove(self, rel:str)->None:
+        # 倒排表中的旧id不立即删除，而是在查询时过滤，失效项过多时整体重建
+        old = self.files.pop(rel, None)
+        if old is not None:
+            self.paths.pop(old[0], None)
+            self.stale += 1
+            self.dirty = True
+
+    def update_file(self, path:str)->None:
+        rel = os.path.relpath(os.path.realpath(path), self.root)
+        if rel.startswith('..'):
+            return
+        with self.lock:
+            if not self.loaded:
+                return
+            self._remove(rel)
+            try:
+                st = os.stat(os.path.join(self.root, rel))
+            except OSError:
+                return
+            if os.path.isfile(os.path.join(self.root, rel)) and st.st_size <= MAX_FILE_BYTES:
+                self._add(rel, st)
+
+    def remove_path(self, path:str)->None:
+        rel = os.path.relpath(os.path.realpath(path), self.root)
+        with self.lock:
+            if not self.loaded:
+                return
+            prefix = rel + os.sep
+            for r in [r for r in self.files if r == rel or r.startswith(prefix)]:
+                self._remove(r)
+
+    def build(self)->None:
+        with self.lock:
+            self.files, self.postings, self.paths = {}, {}, {}
+            self.next_id, self.stale = 0, 0
+            for rel, st in self.walk():
+                self._add(rel, st)
+            self.loaded = True
+            self.save()
+
+    def sync(self)->int:
+        # 按大小和修改时间增量同步，只重新索引变化的文件
+        with self.lock:
+            seen = set()
+            changed = 0
+            for rel, st in self.walk():
+                seen.add(rel)
+                old = self.files.get(rel)
+                if old is None or old[1] != st.st_size or old[2] != st.st_mtime_ns:
+                    self._remove(rel)
+                    self._add(rel, st)
+                    changed += 1
+            for rel in [r for r in self.files if r not in seen]:
+                self._remove(rel)
+                changed += 1
+            if self.stale > max(len(self.files), 1000):
+                self.build()
+            return changed
+
+    def load(self)->bool:
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError):
+            return False
+        if data.get('version') != INDEX_VERSION or data.get('root') != self.root:
+            return False
+        with self.lock:
+            self.files, self.postings, self.paths = data['files'], data['postings'], data['paths']
+            self.next_id, self.stale = data['next_id'], data['stale']
+            self.loaded = True
+            self.dirty = False
+        return True
+
+    def save(self)->None:
+        with self.lock:
+            data = {
+                'version': INDEX_VERSION, 'root': self.root, 'files': self.files, 'postings': self.postings,
+                'paths': self.paths, 'next_id': self.next_id, 'stale': self.stale
+            }
+            dir_name = os.path.dirname(self.index_path)
+            os.makedirs(dir_name, exist_ok=True)
+            # 同一进程中的多个线程或多个索引对象可能同时保存，临时文件名不能只靠pid区分
+            fd, tmp = tempfile.mkstemp(dir=dir_name, prefix=f'.{os.path.basename(self.index_path)}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.index_path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            self.dirty = False
+            self.saved_at = time.monotonic()
+
+    def ensure(self)->None:
+        with self.lock:
+            if self.loaded:
+                return
+            if self.load():
+                self.sync()
+            else:
+                self.build()
+
+    def candidates(self, literals:List[str])->List[str]:
+        with self.lock:
+            ids = None
+            for lit in literals:
+                for tri in trigrams(lit.encode('utf-8').lower()):
+                    posting = self.postings.get(tri, set())
+                    ids = set(posting) if ids is None else ids & posting
+                    if not ids:
+                        return []
+            if ids is None:
+                return sorted(self.files)
+            return sorted(self.paths[i] for i in ids if i in self.paths)
+
+    def search(
+        self,
+        query:str,
+        regex:bool=False,
+        case_sensitive:bool=False,
+        path_glob:Optional[str]=None,
+        context:int=0,
+        max_results:int=50,
+        overrides:Optional[Dict[str, Optional[bytes]]]=None
+    )->Tuple[List[Tuple[str, int, List[Tuple[int, str]]]], int]:
+        self.ensure()
+        flags = 0 if case_sensitive else re.IGNORECASE
+        if regex:
+            pattern = re.compile(query, flags)
+            literals = _literal_runs(query, flags)
+        else:
+            pattern = re.compile(re.escape(query), flags)
+            literals = [query] if len(query.encode('utf-8')) >= 3 else []
+        if not case_sensitive:
+            # 索引只对ASCII字符做了小写转换，非ASCII字面量在忽略大小写时不能用于筛选
+            literals = [lit for lit in literals if lit.isascii()]
+        results = []
+        total = 0
+        overrides = overrides or {}
+        def scan(rel:str, data:bytes)->None:
+            nonlocal total
+            lines = data.decode('utf-8', errors='replace').splitlines()
+            for i, line in enumerate(lines):
+                if not pattern.search(line):
+                    continue
+                total += 1
+                if len(results) < max_results:
+                    lo, hi = max(i - context, 0), min(i + context + 1, len(lines))
+                    results.append((rel, i + 1, [(j + 1, lines[j]) for j in range(lo, hi)]))
+        for rel in self.candidates(literals):
+            check_cancelled()
+            if rel in overrides or (path_glob and not fnmatch.fnmatch(rel, path_glob)):
+                continue
+            data = self._read(rel)
+            if data is None:
+                continue
+            scan(rel, data)
+        # 尚未写入磁盘的内容不在索引中，直接逐个扫描
+        for rel in sorted(overrides):
+            data = overrides[rel]
+            if data is not None and not (path_glob and not fnmatch.fnmatch(rel, path_glob)):
+                scan(rel, data)
+        if self.dirty and time.monotonic() - self.saved_at > 5:
+            self.save()
+        return results, total
+
+trigrams.__doc__ = '''trigrams函数返回一段字节串中所有长度为3的子串组成的集合。'''
+TrigramIndex.__doc__ = '''TrigramIndex类是一个目录的trigram倒排索引，保存在磁盘上（默认位于~/.cache/simpleagent），用于快速全文搜索。它包含以下方法：
+- ensure(self): 第一次使用时从磁盘加载索引并按文件大小和修改时间增量同步；索引不存在或已失效时重新构建。
+- build(self): 遍历目录（跳过.git、node_modules等目录、超过2MB的文件和二进制文件），重新构建索引并保存。
+- sync(self) -> int: 按大小和修改时间找出变化的文件并重新索引，返回变化的文件数。
+- update_file(self, path) / remove_path(self, path): 在文件被写入或删除后增量地更新索引。
+- search(self, query, regex=False, case_sensitive=False, path_glob=None, context=0, max_results=50, overrides=None): 搜索匹配的行，返回(结果列表, 匹配总数)，每个结果为(相对路径, 行号, [(行号, 行内容), ...])。overrides为{相对路径: 内容bytes或None}，用其中的内容代替磁盘上的文件（None表示文件已删除），例如工作区覆盖层中尚未提交的修改。
+索引中的trigram统一转为小写。查询时先用查询中必须出现的字面量（正则表达式取其顶层的连续字面量）的trigram求交集得到候选文件，再只在候选文件中逐行匹配。'''
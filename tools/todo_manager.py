@@ -1,3 +1,4 @@
+from typing import List, Optional
 from .tool_manager import AIFunction
 
 class TODOListManager:
@@ -5,50 +6,118 @@ class TODOListManager:
         self.todo = todo_list
         self.nsteps = len(self.todo)
         self.progress = [False for _ in range(self.nsteps)]
+        # 每个步骤依赖的步骤编号（从1开始），以及由子代理完成时汇报的结果
+        self.deps:List[List[int]] = [[] for _ in range(self.nsteps)]
+        self.results:List[Optional[str]] = [None for _ in range(self.nsteps)]
+        self.running = set()
         self.cur_step = 1
         self.pause = False
+        # 清单状态的版本号，每次修改都会加1，调用方可以用它判断清单是否变化
+        self.generation = 0
         self.build_function()
 
+    def _kind(self, idx:int)->str:
+        if self.progress[idx-1]:
+            return 'done'
+        if idx in self.running:
+            return 'running'
+        if idx == self.cur_step:
+            return 'current'
+        return 'pending'
+
+    def _deps_text(self, idx:int)->str:
+        deps = self.deps[idx-1]
+        return f'（依赖第{"、".join(map(str, deps))}步）' if deps else ''
+
+    def _ready_text(self)->str:
+        if not any(self.deps) and not self.running:
+            return ''
+        res = ''
+        if self.running:
+            res += f'正在由子代理处理的步骤：第{"、".join(map(str, sorted(self.running)))}步。\n'
+        ready = self.ready_steps()
+        if len(ready) > 1:
+            res += f'依赖已满足、可以并行处理的步骤：第{"、".join(map(str, ready))}步，可以调用run_todo交给子代理并行完成。\n'
+        return res
+
     def __str__(self)->str:
+        marks = {'done':'[+] ', 'current':'[*] ', 'running':'[~] ', 'pending':'[-] '}
         res = '\n```TODO\n'
         for idx, step in enumerate(self.todo, start=1):
-            if idx < self.cur_step:
-                res += '[+] '
-            elif idx == self.cur_step:
-                res += '[*] '
-            else:
-                res += '[-] '
-            res += f'{step}\n'
+            res += marks[self._kind(idx)]
+            res += f'{step}{self._deps_text(idx)}\n'
         res += f'```\n'
+        res += self._ready_text()
         if self.cur_step > self.nsteps:
             res += '当前所有任务均已完成！'
         else:
-            res += f'标注[+][*][-]分别表示已完成、当前步骤、未完成步骤。\n当前正在处理的步骤为第{self.cur_step}步：\n```text\n{self.todo[self.cur_step-1]}\n```'
+            res += f'标注[+][*][~][-]分别表示已完成、当前步骤、子代理处理中、未完成步骤。\n当前正在处理的步骤为第{self.cur_step}步：\n```text\n{self.todo[self.cur_step-1]}\n```'
         return res
 
     def pause_todo(self)->None:
         self.pause = True
 
     def clear(self)->None:
+        self.generation += 1
         self.cur_step = 1
         self.nsteps = 0
         self.progress = []
+        self.deps = []
+        self.results = []
+        self.running = set()
         self.todo = []
 
-    def complete_step(self)->None:
-        self.progress[self.cur_step-1] = True
-        self.cur_step += 1
+    def _advance(self)->None:
+        # 当前步骤是第一个未完成的步骤；步骤可能因为并行执行而不按顺序完成
+        self.cur_step = next((i for i, done in enumerate(self.progress, start=1) if not done), self.nsteps + 1)
+
+    def complete_step(self, step:Optional[int]=None)->None:
+        step = self.cur_step if step is None else step
+        if not 1 <= step <= self.nsteps:
+            raise ValueError(f'Step {step} does not exist.')
+        self.generation += 1
+        self.progress[step-1] = True
+        self.running.discard(step)
+        self._advance()
         return
 
     def complete_all(self)->None:
+        self.generation += 1
         self.progress = [True for i in range(self.nsteps)]
+        self.running = set()
         self.cur_step = self.nsteps + 1
         return
 
-    def append(self, step:str)->None:
+    def append(self, step:str, depends_on:Optional[List[int]]=None)->None:
+        deps = sorted(set(depends_on or []))
+        for dep in deps:
+            # 只能依赖已有的步骤，因此步骤之间不会形成环
+            if not 1 <= dep <= self.nsteps:
+                raise ValueError(f'Step {dep} does not exist; a step can only depend on earlier steps.')
+        self.generation += 1
         self.nsteps += 1
         self.progress += [False]
+        self.deps.append(deps)
+        self.results.append(None)
         self.todo.append(step)
+
+    def ready_steps(self)->List[int]:
+        return [
+            idx for idx in range(1, self.nsteps + 1)
+            if not self.progress[idx-1] and idx not in self.running and all(self.progress[d-1] for d in self.deps[idx-1])
+        ]
+
+    def start_step(self, step:int)->None:
+        self.generation += 1
+        self.running.add(step)
+
+    def finish_step(self, step:int, result:Optional[str]=None)->None:
+        self.results[step-1] = result
+        self.complete_step(step)
+
+    def fail_step(self, step:int)->None:
+        self.generation += 1
+        self.running.discard(step)
     
     def check_todo(self)->str:
         self.print()
@@ -58,20 +127,23 @@ class TODOListManager:
         if not color:
             print(self)
             return
+        marks = {
+            'done':'\033[32m√\033[0m ',   # Green check mark for completed steps
+            'current':'\033[36m→ ',   # Cyan arrow for the current step
+            'running':'\033[35m~\033[0m ',   # Magenta tilde for steps running in sub-agents
+            'pending':'\033[31m×\033[0m '   # Red cross for incomplete steps
+        }
         res = '\033[33m\nTODO\n\033[0m'
         for idx, step in enumerate(self.todo, start=1):
-            if idx < self.cur_step:
-                res += '\033[32m√\033[0m '   # Green check mark for completed steps
-            elif idx == self.cur_step:
-                res += '\033[36m→ '   # Cyan arrow for the current step
-            else:
-                res += '\033[31m×\033[0m '   # Red cross for incomplete steps
-            res += f'{step}\n'
+            kind = self._kind(idx)
+            res += marks[kind]
+            res += f'{step}{self._deps_text(idx)}' + ('\033[0m' if kind == 'current' else '') + '\n'
         res += '\n'
+        res += self._ready_text()
         if self.cur_step > self.nsteps:
             res += '\033[32m当前所有任务均已完成！\033[0m'
         else:
-            res += f'\033[33m标注[√][→][×]分别表示已完成、当前步骤、未完成步骤。\n当前正在处理的步骤为第{self.cur_step}步：\n\033[36m{self.todo[self.cur_step-1]}\n\033[0m'
+            res += f'\033[33m标注[√][→][~][×]分别表示已完成、当前步骤、子代理处理中、未完成步骤。\n当前正在处理的步骤为第{self.cur_step}步：\n\033[36m{self.todo[self.cur_step-1]}\n\033[0m'
         print(res)
         return
 
@@ -79,17 +151,20 @@ class TODOListManager:
         self.function = AIFunction([], [])
         self.function.add_function(
             name='add_todo',
-            description='向待办事项列表中添加一个新的步骤。',
+            description='向待办事项列表中添加一个新的步骤。可以声明该步骤依赖的前面步骤，依赖都已完成且互不依赖的步骤可以并行处理。',
             parameters={
-                'step': {'type': 'string', 'description': '要添加的步骤内容'}
+                'step': {'type': 'string', 'description': '要添加的步骤内容'},
+                'depends_on': {'type': 'array', 'items': {'type': 'integer'}, 'description': '（可选）该步骤依赖的步骤编号列表，只能是已添加的步骤。'}
             },
             required=['step'],
             function=self.append
         )
         self.function.add_function(
             name='complete_step',
-            description='标记当前步骤为已完成，并将当前步骤指针移动到下一个步骤。',
-            parameters={},
+            description='标记当前步骤（或指定的步骤）为已完成，并将当前步骤指针移动到第一个未完成的步骤。',
+            parameters={
+                'step': {'type': 'integer', 'description': '（可选）要标记为已完成的步骤编号，默认为当前步骤。'}
+            },
             required=[],
             function=self.complete_step
         )
@@ -112,7 +187,9 @@ class TODOListManager:
             description='以Markdown格式查看当前待办事项列表的状态。',
             parameters={},
             required=[],
-            function=self.check_todo
+            function=self.check_todo,
+            # 不声明为pure：每次调用都要在终端上打印清单，缓存命中时会跳过打印
+            mutating=False
         )
         self.function.add_function(
             name='pause_todo',
@@ -123,6 +200,24 @@ class TODOListManager:
         )
         return
     
+    def state(self)->dict:
+        return {
+            'todo':list(self.todo), 'progress':list(self.progress), 'cur_step':self.cur_step, 'pause':self.pause,
+            'deps':[list(d) for d in self.deps], 'results':list(self.results)
+        }
+
+    def restore(self, state:dict)->None:
+        self.generation += 1
+        self.todo = list(state['todo'])
+        self.nsteps = len(self.todo)
+        self.progress = list(state['progress'])
+        self.cur_step = state['cur_step']
+        self.pause = state.get('pause', False)
+        self.deps = [list(d) for d in state.get('deps') or [[] for _ in range(self.nsteps)]]
+        self.results = list(state.get('results') or [None for _ in range(self.nsteps)])
+        # 子代理不会跨进程恢复，中断时正在执行的步骤回到未完成状态
+        self.running = set()
+
     @property
     def all_completed(self)->bool:
         # Check if all steps are completed
@@ -137,19 +232,26 @@ TODOListManager.__doc__ = '''TODOListManager类用于管理待办事项列表。
 - __init__(self, todo_list:list=[]): 初始化待办事项管理器，接受一个待办事项列表作为参数。
 - __str__(self): 返回待办事项列表的字符串表示形式。
 - clear(self): 清空待办事项列表和相关状态。
-- complete_step(self): 标记当前步骤为已完成，并将当前步骤指针移动
+- complete_step(self, step=None): 标记当前步骤（或第step步）为已完成，并将当前步骤指针移动到第一个未完成的步骤。
 - complete_all(self): 标记所有步骤为已完成，并将当前步骤指针移动到最后。
-- append(self, step:str): 向待办事项列表中添加一个新的步骤。
-- print(self, color:bool=True): 打印待办事项列表，支持彩色输出以区分已完成、当前步骤和未完成的步骤。'''
+- append(self, step:str, depends_on=None): 向待办事项列表中添加一个新的步骤，depends_on为它依赖的已有步骤编号。
+- ready_steps(self) -> List[int]: 返回依赖均已完成、自身未完成且不在子代理中执行的步骤编号。
+- start_step(self, step) / finish_step(self, step, result=None) / fail_step(self, step): 由调度器调用，标记步骤开始在子代理中执行、执行完成（并记录结果）或执行失败。
+- print(self, color:bool=True): 打印待办事项列表，支持彩色输出以区分已完成、当前步骤和未完成的步骤。
+- state(self) -> dict: 返回可以序列化为JSON的当前状态。
+- restore(self, state:dict): 从state返回的字典恢复状态。
+- generation: 清单状态的版本号，上述任何修改都会使其加1。
+步骤之间的依赖构成一个有向无环图：每个步骤只能依赖在它之前添加的步骤。没有声明依赖时，行为与顺序执行的清单相同。'''
 TODOListManager.__str__.__doc__ = '''__str__方法返回待办事项列表的Markdown表示形式。它会根据当前步骤的状态为每个步骤添加不同的标记：
 - 已完成的步骤前会添加[+]标记。
 - 当前步骤前会添加[*]标记。
+- 正在由子代理处理的步骤前会添加[~]标记。
 - 未完成的步骤前会添加[-]标记。
-方法还会在列表末尾添加当前正在处理的步骤的详细信息。'''
+声明了依赖的步骤后面会注明依赖的步骤编号。方法还会在列表末尾列出正在执行和可以并行处理的步骤，以及当前正在处理的步骤的详细信息。'''
 TODOListManager.clear.__doc__ = '''clear方法用于清空待办事项列表和相关状态。它会重置当前步骤指针、步骤数量、进度列表和待办事项列表，使其回到初始状态。'''
-TODOListManager.complete_step.__doc__ = '''complete_step方法用于标记当前步骤为已完成，并将当前步骤指针移动到下一个步骤。它会将当前步骤的进度标记为True，并将当前步骤指针加1。'''
+TODOListManager.complete_step.__doc__ = '''complete_step方法用于标记当前步骤为已完成，并将当前步骤指针移动到下一个步骤。它接受一个可选参数step，指定要标记的步骤编号，默认为当前步骤。方法会将该步骤的进度标记为True，并把当前步骤指针移动到第一个未完成的步骤；按顺序完成时相当于将指针加1。'''
 TODOListManager.complete_all.__doc__ = '''complete_all方法用于标记所有步骤为已完成，并将当前步骤指针移动到最后。它会将所有步骤的进度标记为True，并将当前步骤指针设置为步骤数量加1。'''
-TODOListManager.append.__doc__ = '''append方法用于向待办事项列表中添加一个新的步骤。它接受一个字符串参数step，表示要添加的步骤内容。方法会将步骤添加到待办事项列表中，并更新步骤数量和进度列表。'''
+TODOListManager.append.__doc__ = '''append方法用于向待办事项列表中添加一个新的步骤。它接受一个字符串参数step，表示要添加的步骤内容，以及一个可选的列表depends_on，表示该步骤依赖的步骤编号。方法会将步骤添加到待办事项列表中，并更新步骤数量、进度列表和依赖关系。依赖不存在的步骤时抛出ValueError。'''
 TODOListManager.print.__doc__ = '''print方法用于打印待办事项列表。它接受一个布尔参数color，表示是否使用彩色输出。方法会根据当前步骤的状态为每个步骤添加不同的标记，并使用不同的颜色区分已完成、当前步骤和未完成的步骤。如果color参数为False，则使用普通文本输出。'''
 TODOListManager.build_function.__doc__ = '''build_function方法用于构建并注册待办事项管理器的AI调用接口（使用AIFunction）。
 它会将常用操作（添加步骤、标记完成、全部完成、清空、检查）以函数接口的形式注册，方便外部通过函数名调用对应的方法。'''
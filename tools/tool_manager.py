@@ -1,13 +1,70 @@
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import threading
+import time
 import warnings
+from .executor import ToolExecutor
+from .result_cache import ResultCache
+from .result_store import ResultStore
+from .validator import build_validator
+
+class _Tool:
+    __slots__ = ('function', 'validator', 'mutating', 'timeout', 'pure', 'max_result')
+
+    def __init__(self, function, validator, mutating:bool=True, timeout:Optional[float]=None, pure=False, max_result:Optional[int]=None)->None:
+        self.function = function
+        self.validator = validator
+        self.mutating = mutating
+        self.timeout = timeout
+        # False表示不缓存；True表示结果只取决于参数；可调用对象返回结果所依赖状态的版本号
+        self.pure = pure
+        # 结果超过该长度（字符数）时转存到result_store，None表示使用AIFunction的默认值，小于等于0表示从不转存
+        self.max_result = max_result
 
 class AIFunction:
-    def __init__(self, functions_dict:List[dict], functions:list)->None:
+    max_result_chars = 16000
+
+    def __init__(self, functions_dict:List[dict], functions:list, max_workers:int=1, executor:Optional[ToolExecutor]=None)->None:
         self.functions = functions_dict
         self.__f = functions
         if len(self.functions) != len(self.__f):
             raise ValueError
+        # 名称 -> _Tool(函数实现, 参数校验器, ...)，调用时按名称直接查找
+        self.__registry:Dict[str, _Tool] = {}
+        for func, impl in zip(self.functions, self.__f):
+            self.__register(func, impl)
+        self.max_workers = max_workers
+        self.executor = executor
+        self.__pool = None
+        self.__pool_lock = threading.Lock()
+        self.__hooks:List[Callable] = []
+        # 只接收函数名称的轻量回调，不需要计时和序列化参数
+        self.__listeners:List[Callable[[str], None]] = []
+        # 每次调用会修改状态的函数都会加1，pure函数的缓存键中包含它
+        self.generation = 0
+        self.result_cache = ResultCache()
+        # 为None时结果总是完整返回
+        self.result_store:Optional[ResultStore] = None
         return
+
+    @staticmethod
+    def _spec(func:dict)->dict:
+        return func.get('function', func)
+
+    def __register(self, func:dict, impl, mutating:bool=True, timeout:Optional[float]=None, pure=False, max_result:Optional[int]=None)->None:
+        spec = self._spec(func)
+        self.__registry[spec['name']] = _Tool(impl, build_validator(spec.get('parameters')), mutating, timeout, pure, max_result)
+
+    def __contains__(self, name:str)->bool:
+        return name in self.__registry
+
+    def __len__(self)->int:
+        return len(self.__registry)
+
+    @property
+    def names(self)->List[str]:
+        return list(self.__registry)
     
     def add_function(
         self,
@@ -15,8 +72,16 @@ class AIFunction:
         description:str,
         parameters:dict,
         required:List[str],
-        function
+        function,
+        mutating:bool=True,
+        timeout:Optional[float]=None,
+        pure:Union[bool, Callable[[], object]]=False,
+        max_result:Optional[int]=None
     )->None:
+        if name in self.__registry:
+            raise ValueError(f'Function {name} already exists.')
+        if pure and mutating:
+            raise ValueError(f'Function {name} cannot be both pure and mutating.')
         self.functions.append(
             {
                 'type':'function',
@@ -33,45 +98,185 @@ class AIFunction:
             }
         )
         self.__f.append(function)
+        self.__register(self.functions[-1], function, mutating, timeout, pure, max_result)
         return
     
     def include(self, tool_manager:'AIFunction')->None:
         for i, func in enumerate(tool_manager.functions):
-            if func['function']['name'] in [f['function']['name'] for f in self.functions]:
-                warnings.warn(f"Function {func['name']} already exists in the current manager. Skipping.")
+            name = self._spec(func)['name']
+            if name in self.__registry:
+                warnings.warn(f"Function {name} already exists in the current manager. Skipping.")
                 continue
             else:
                 self.functions.append(func)
                 self.__f.append(tool_manager.__f[i])
+                self.__registry[name] = tool_manager.__registry[name]
         return
     
+    def add_hook(self, hook:Callable)->None:
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook:Callable)->None:
+        self.__hooks.remove(hook)
+
+    def add_listener(self, listener:Callable[[str], None])->None:
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener:Callable[[str], None])->None:
+        self.__listeners.remove(listener)
+
     def __call__(self, __func_name:str, *args, **kwargs)->str:
+        if self.__listeners:
+            self.__notify(__func_name.strip())
+        if not self.__hooks:
+            res, ok = self.__invoke(__func_name, args, kwargs)
+            return self.__spill(__func_name, res) if ok and self.result_store is not None else res
+        start = time.perf_counter()
+        res, ok = self.__invoke(__func_name, args, kwargs)
+        if ok and self.result_store is not None:
+            res = self.__spill(__func_name, res)
+        elapsed = time.perf_counter() - start
+        try:
+            arg_bytes = len(json.dumps(kwargs, ensure_ascii=False, default=str).encode('utf-8'))
+        except (TypeError, ValueError):
+            arg_bytes = 0
+        result_bytes = len(res.encode('utf-8'))
+        for hook in list(self.__hooks):
+            try:
+                hook(__func_name.strip(), elapsed, arg_bytes, result_bytes, ok)
+            except Exception as e:
+                # 统计失败不应影响工具本身的结果
+                warnings.warn(f'Hook {hook!r} failed: {e}')
+        return res
+
+    def __notify(self, name:str)->None:
+        for listener in list(self.__listeners):
+            try:
+                listener(name)
+            except Exception as e:
+                warnings.warn(f'Listener {listener!r} failed: {e}')
+
+    def __invoke(self, __func_name:str, args:tuple, kwargs:dict)->Tuple[str, bool]:
         __func_name = __func_name.strip()
         try:
-            idx = -1
-            for i, func in enumerate(self.functions):
-                if func['function']['name'] == __func_name:
-                    idx = i
-                    break
-            if idx == -1:
+            entry = self.__registry.get(__func_name)
+            if entry is None:
                 raise ValueError(f'Function {__func_name} not found.')
-            res = self.__f[idx](*args, **kwargs)
+            if not args:
+                # 位置参数只会来自Python代码，模型的调用总是关键字参数
+                kwargs = entry.validator(kwargs)
+            key = None
+            if entry.pure and not args and self.result_cache.enabled:
+                key = self._cache_key(__func_name, entry, kwargs)
+                if key is not None:
+                    cached = self.result_cache.get(key)
+                    if cached is not None:
+                        return cached, True
+            if entry.mutating:
+                # 执行前后各加1：执行期间算出的结果可能反映了一半的修改，不能在执行后被命中
+                self.generation += 1
+                try:
+                    res = self.__run(__func_name, entry, args, kwargs)
+                finally:
+                    self.generation += 1
+            else:
+                res = self.__run(__func_name, entry, args, kwargs)
             if isinstance(res, str):
-                return res
+                if key is not None:
+                    self.result_cache.put(key, res)
+                return res, True
             elif res is None:
-                return f"工具{__func_name}调用成功。（此工具无返回结果）"
+                return f"工具{__func_name}调用成功。（此工具无返回结果）", True
             else:
                 try:
-                    return str(res)
+                    return str(res), True
                 except Exception as rt_e:
-                    return f'已调用工具{__func_name}，无法处理返回结果：{str(rt_e)}'
+                    return f'已调用工具{__func_name}，无法处理返回结果：{str(rt_e)}', False
         except Exception as e:
-            return f'Error calling function {__func_name}: {str(e)}'
+            return f'Error calling function {__func_name}: {str(e)}', False
+
+    def __spill(self, name:str, res:str)->str:
+        # 过长的结果保存在result_store中，只把开头、结尾和句柄返回给模型
+        name = name.strip()
+        entry = self.__registry[name]
+        limit = self.max_result_chars if entry.max_result is None else entry.max_result
+        if limit <= 0 or len(res) <= limit:
+            return res
+        return self.result_store.preview(name, res)
+
+    def __run(self, name:str, entry:_Tool, args:tuple, kwargs:dict):
+        if self.executor is None:
+            return entry.function(*args, **kwargs)
+        return self.executor.run(entry.function, args, kwargs, self._timeout(entry), name)
+
+    def _cache_key(self, name:str, entry:_Tool, kwargs:dict)->Optional[tuple]:
+        try:
+            args_key = json.dumps(kwargs, sort_keys=True, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return None
+        state = entry.pure() if callable(entry.pure) else None
+        return (name, args_key, self.generation, state)
+
+    def _timeout(self, entry:_Tool)->Optional[float]:
+        if entry.timeout is not None:
+            return entry.timeout if entry.timeout > 0 else None
+        # 会修改状态的工具默认不限时：超时后线程仍可能在写入，不能让后续调用与之并发
+        return None if entry.mutating else self.executor.default_timeout
+
+    def is_mutating(self, name:str)->bool:
+        entry = self.__registry.get(name.strip())
+        # 未知函数按会修改状态处理，保证不会与其他调用并发
+        return entry is None or entry.mutating
+
+    def _executor(self)->ThreadPoolExecutor:
+        with self.__pool_lock:
+            if self.__pool is None:
+                self.__pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='aifunction')
+            return self.__pool
+
+    def call_many(self, calls:Iterable[Tuple[str, dict]])->List[str]:
+        calls = list(calls)
+        results:List[str] = [''] * len(calls)
+        if self.max_workers <= 1 or len(calls) <= 1:
+            for i, (name, kwargs) in enumerate(calls):
+                results[i] = self(name, **kwargs)
+            return results
+        pool = self._executor()
+        batch = []
+        def flush():
+            futures = [(i, pool.submit(self, name, **kwargs)) for i, name, kwargs in batch]
+            for i, fut in futures:
+                results[i] = fut.result()
+            batch.clear()
+        for i, (name, kwargs) in enumerate(calls):
+            if self.is_mutating(name):
+                # 修改状态的调用是一道屏障：等之前的只读调用完成后单独执行
+                flush()
+                results[i] = self(name, **kwargs)
+            else:
+                batch.append((i, name, kwargs))
+        flush()
+        return results
+
+    def shutdown(self)->None:
+        with self.__pool_lock:
+            if self.__pool is not None:
+                self.__pool.shutdown(wait=True)
+                self.__pool = None
 
 AIFunction.__doc__ = '''AIFunction类用于管理AI函数的定义和调用。它包含以下方法：
 - __init__(self, functions_dict:List[dict], functions:list): 初始化函数管理器，接受一个函数定义列表和一个函数实现列表。
 - add_function(self, name:str, description:str, parameters:dict, required:List[str], function): 添加一个新的函数定义和实现。
-- __call__(self, name:str, *args, **kwargs): 根据函数名称调用对应的函数实现，并传递参数。'''
+- __call__(self, name:str, *args, **kwargs): 根据函数名称调用对应的函数实现，并传递参数。
+- call_many(self, calls): 执行同一轮回复中的多个工具调用，按原顺序返回结果。
+- names: 已注册的所有函数名称。
+- add_hook(self, hook) / remove_hook(self, hook): 添加或移除调用钩子，用于统计每次调用的耗时、参数和结果大小以及是否出错。
+- add_listener(self, listener) / remove_listener(self, listener): 添加或移除只接收函数名称的回调，每次调用前以listener(name)的形式被调用，不会启用钩子的计时和参数序列化。
+- result_store: 不为None时，超过长度上限（默认max_result_chars个字符，可以为每个函数单独设置）的成功结果会被保存到该ResultStore中，返回值只包含开头、结尾和用于fetch_result分页查看的句柄。
+- generation / result_cache: 声明为pure的函数的结果缓存在result_cache（ResultCache）中，键为(函数名称, 参数, generation, 函数所依赖状态的版本号)。每次调用会修改状态的函数都会使generation加1，因此写操作之后不会再命中之前的结果；重复的只读调用只需一次字典查找。
+max_workers大于1时，call_many会在线程池中并发执行相互独立的只读工具调用。
+executor为ToolExecutor时，函数实现在其常驻线程池中执行，超时的调用会被取消并返回错误信息，而不会一直阻塞调用方。
+函数按名称登记在内部的注册表中，调用和合并都只需按名称查找一次；每个函数的parameters在注册时被编译为参数校验器，不合法的参数会在函数实现执行前被拒绝。'''
 AIFunction.add_function.__doc__ = '''add_function方法用于向函数管理器中添加一个新的函数定义和实现。它接受以下参数：
 - name: 函数的名称，必须是唯一的字符串。
 - description: 函数的描述信息，用于说明函数的功能和用途。
@@ -81,16 +286,34 @@ AIFunction.add_function.__doc__ = '''add_function方法用于向函数管理器
     'param2': {'type': 'integer', 'description': '参数2的描述'}
 }
 - required: 一个列表，列出函数调用时必须提供的参数名称。
-- function: 函数的实现，即一个可调用对象（如函数或lambda表达式），它将被调用时执行。'''
+- function: 函数的实现，即一个可调用对象（如函数或lambda表达式），它将被调用时执行。
+- mutating: 函数是否会修改文件、待办事项等状态，默认为True。只读函数应设为False，以便call_many并发执行。
+- timeout: 设置了executor时该函数的超时时间（秒），小于等于0表示不限时。为None时，只读函数使用executor的default_timeout，会修改状态的函数不限时。
+- max_result: 设置了result_store时该函数结果的长度上限（字符数），超过时转存并只返回预览。为None时使用max_result_chars，小于等于0表示总是完整返回。
+- pure: 只读函数的结果是否可以缓存。True表示结果只取决于参数和本实例的generation；也可以给出一个无参数的函数，返回结果所依赖状态（例如工作区或TODO清单）的版本号，状态在本实例之外发生变化（例如后台监视器观察到磁盘变化）时缓存同样失效。只有返回字符串的成功调用会被缓存。pure不能与mutating同时为True。
+如果name已经存在，则会抛出一个ValueError异常。'''
 AIFunction.include.__doc__ = '''include方法用于将另一个AIFunction实例中的函数定义和实现合并到当前实例中。它接受一个参数：
 - tool_manager: 另一个AIFunction实例，包含要合并的函数定义和实现。
-该方法会遍历另一个实例中的函数定义，如果当前实例中已经存在同名的函数，则会发出警告并跳过该函数的合并；如果不存在同名函数，则会将该函数定义和实现添加到当前实例中。'''
+该方法会遍历另一个实例中的函数定义，如果当前实例中已经存在同名的函数，则会发出警告并跳过该函数的合并；如果不存在同名函数，则会将该函数定义和实现（以及已编译的参数校验器）添加到当前实例中。'''
 AIFunction.__call__.__doc__ = '''__call__方法用于根据函数名称调用对应的函数实现，并传递参数。它接受以下参数：
 - __func_name: 要调用的函数的名称，必须是之前通过add_function方法添加的函数名称。
 - *args: 可选的位置参数，将被传递给函数实现。
 - **kwargs: 可选的关键字参数，将被传递给函数实现。
-该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。'''
-
+该方法会在函数定义列表中查找与给定名称匹配的函数，如果找到，则调用对应的函数实现并传递参数。如果没有找到匹配的函数，则会抛出一个ValueError异常。
+以关键字参数调用时，参数会先经过该函数的校验器：缺少必需参数、出现未声明的参数或类型不符（且无法转换）都会直接返回错误信息，而不会执行函数实现。'''
+AIFunction.call_many.__doc__ = '''call_many方法用于执行同一轮回复中的多个工具调用。它接受一个参数：
+- calls: 由(函数名称, 关键字参数字典)组成的可迭代对象，顺序与模型返回的tool_calls一致。
+返回与calls一一对应的结果字符串列表，顺序与输入顺序相同。
+当max_workers大于1时，连续的只读调用会提交到线程池中并发执行；遇到会修改状态（mutating=True）或未知的函数时，会先等待之前的调用全部完成，再单独执行该调用，从而保证写操作之间、以及写操作与前后的读操作之间保持原有的先后顺序。'''
+AIFunction.add_hook.__doc__ = '''add_hook方法用于添加一个调用钩子。每次通过__call__（包括call_many）调用函数后，钩子会以hook(name, seconds, arg_bytes, result_bytes, ok)的形式被调用：
+- name: 函数名称。
+- seconds: 调用耗时（秒），包括参数校验。
+- arg_bytes: 关键字参数序列化为JSON后的UTF-8字节数。
+- result_bytes: 返回结果的UTF-8字节数；结果被转存到result_store时为预览的字节数。
+- ok: 调用是否成功；找不到函数、参数不合法或函数抛出异常时为False。
+钩子可能在线程池中被并发调用，需要自行保证线程安全；钩子抛出的异常只会产生警告。没有钩子时，调用不会产生额外的计时和序列化开销。'''
+AIFunction.is_mutating.__doc__ = '''is_mutating方法返回指定名称的函数是否被声明为会修改状态。未注册的函数名称视为会修改状态。'''
+AIFunction.shutdown.__doc__ = '''shutdown方法用于关闭call_many使用的线程池。之后再次调用call_many时会重新创建线程池。'''
 
 if __name__ == '__main__':
     def test_func_1(x, y):
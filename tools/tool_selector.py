@@ -0,0 +1,120 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+from .tool_manager import AIFunction
+
+CORE_TOOLS = ('read_file', 'write_file', 'edit_file', 'list_files', 'search', 'add_todo', 'load_tools')
+
+TOOL_GROUPS:Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'todo': ('管理TODO待办清单：完成步骤、查看、清空、暂停，以及用子代理并行完成相互独立的步骤', ('add_todo', 'complete_step', 'complete_all', 'clear_todo', 'check_todo', 'pause_todo', 'run_todo')),
+    'batch': ('批量读取、写入、删除文件和创建目录', ('read_files', 'write_files', 'delete_files', 'add_dirs')),
+    'fs': ('创建和删除目录、删除文件、查看目录结构、刷新目录树、切换工作目录、提交或撤销事务模式下暂存的修改', ('add_dir', 'delete_file', 'delete_dir', 'view_dir', 'refresh', 'chdir', 'commit_changes', 'rollback_changes')),
+}
+
+class ToolSelector:
+    ordered = True
+
+    def __init__(
+        self,
+        tool_manager:AIFunction,
+        core:Iterable[str]=CORE_TOOLS,
+        groups:Optional[Dict[str, Tuple[str, Tuple[str, ...]]]]=None,
+        idle_turns:int=8
+    )->None:
+        self.tool_manager = tool_manager
+        self.core = tuple(core)
+        self.groups = dict(TOOL_GROUPS if groups is None else groups)
+        self.idle_turns = idle_turns
+        self.turn = 0
+        # 组名 -> 最近一次使用的轮次，按激活的先后顺序排列
+        self.active:Dict[str, int] = {}
+        # 已经发送过的工具名称，按第一次出现的顺序排列；新出现的工具只追加到末尾
+        self.__order:List[str] = []
+        self.__group_of:Dict[str, List[str]] = {}
+        for group, (_, names) in self.groups.items():
+            for name in names:
+                self.__group_of.setdefault(name, []).append(group)
+        self.__lock = threading.Lock()
+        if self.groups and 'load_tools' not in tool_manager:
+            tool_manager.add_function(
+                name='load_tools',
+                description='加载一组额外的工具，加载后的工具从下一次回复开始可用。可用的工具组：' + '；'.join(
+                    f'{group}（{desc}）' for group, (desc, _) in self.groups.items()
+                ) + '。',
+                parameters={
+                    'group': {'type': 'string', 'enum': list(self.groups), 'description': '要加载的工具组名称。'}
+                },
+                required=['group'],
+                function=self.load,
+                mutating=False
+            )
+        # 只需要知道调用了哪个工具，用监听器而不是钩子，不影响没有钩子时的快速路径
+        tool_manager.add_listener(self.__on_call)
+        return
+
+    def __on_call(self, name:str)->None:
+        groups = self.__group_of.get(name)
+        if groups:
+            with self.__lock:
+                for group in groups:
+                    self.active[group] = self.turn
+
+    def load(self, group:str)->str:
+        if group not in self.groups:
+            raise ValueError(f'Tool group {group} not found. Available groups: {", ".join(self.groups)}.')
+        with self.__lock:
+            loaded = group in self.active
+            self.active[group] = self.turn
+        names = '、'.join(n for n in self.groups[group][1] if n in self.tool_manager)
+        if loaded:
+            return f'工具组{group}已经加载：{names}。'
+        return f'已加载工具组{group}，从下一次回复开始可以使用：{names}。'
+
+    def next_turn(self)->None:
+        self.turn += 1
+
+    def evict(self)->List[str]:
+        # 移除长时间未使用的工具组会改变工具列表，只在前缀缓存已经失效（如历史被压缩）时调用
+        with self.__lock:
+            idle = [g for g, last in self.active.items() if self.turn - last >= self.idle_turns]
+            for group in idle:
+                del self.active[group]
+            if idle:
+                # 前缀缓存已经失效，下一次按核心工具、未分组工具、各组的顺序重新排列
+                self.__order = []
+        return idle
+
+    @property
+    def names(self)->List[str]:
+        grouped = self.__group_of
+        registered = self.tool_manager.names
+        res = [n for n in self.core if n in self.tool_manager]
+        # 没有归入任何组的工具（例如之后注册的新工具）总是可用
+        res.extend(sorted(n for n in registered if n not in grouped and n not in self.core))
+        seen = set(res)
+        with self.__lock:
+            active = list(self.active)
+        for group in active:
+            for name in self.groups[group][1]:
+                if name not in seen and name in self.tool_manager:
+                    res.append(name)
+                    seen.add(name)
+        with self.__lock:
+            # 之前发送过的工具保持原来的位置，会话中途注册的未分组工具和新加载的组都追加在末尾
+            order = [n for n in self.__order if n in seen]
+            known = set(order)
+            order.extend(n for n in res if n not in known)
+            self.__order = order
+        return list(order)
+
+    @property
+    def functions(self)->List[dict]:
+        specs = {AIFunction._spec(f)['name']: f for f in self.tool_manager.functions}
+        return [specs[name] for name in self.names]
+
+ToolSelector.__doc__ = '''ToolSelector类在AIFunction之上选择每次请求中发送给模型的工具，以缩短请求中的工具定义。它包含以下属性和方法：
+- __init__(self, tool_manager, core=CORE_TOOLS, groups=None, idle_turns=8): tool_manager中的工具分为始终可用的核心工具（core）和按组加载的工具（groups，默认为TOOL_GROUPS，格式为{组名: (说明, 工具名称元组)}）。没有归入任何组的工具视为核心工具。groups不为空时会向tool_manager注册load_tools工具。
+- names, functions: 当前发送给模型的工具名称和定义，顺序为核心工具、其他未分组工具，再按激活先后排列各个已加载的组。可以直接传给RequestBuilder。
+- load(self, group) -> str: 加载一个工具组，即load_tools工具的实现。
+- next_turn(self): 开始新的一轮对话。
+- evict(self) -> List[str]: 移除idle_turns轮以内未使用过的工具组，返回被移除的组名。
+工具组在模型调用load_tools，或调用了组内任何工具（包括隐藏的工具，调用仍会正常执行）时被激活。已加载的组和会话中途注册的新工具只会追加到列表末尾，在调用evict之前不会被移除，因此同一会话的工具列表在轮次之间保持不变，只在末尾增长，不会打乱之前的前缀缓存；evict移除了工具组时才按上述顺序重新排列。'''
@@ -0,0 +1,151 @@
+from typing import List, Optional
+import fnmatch
+import os
+import re
+from .executor import check_cancelled
+
+DEFAULT_EXCLUDE = ('.git', '__pycache__', 'node_modules')
+
+def _glob_regex(pattern:str, anchored:bool)->'re.Pattern':
+    # 按gitignore的规则翻译通配符：*和?不匹配“/”，**可以跨越多层目录
+    out = [] if anchored else ['(?:.*/)?']
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i+1:j]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j + 1
+                continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile(''.join(out) + r'\Z')
+
+class GitIgnore:
+    def __init__(self, root:str)->None:
+        self.rules = []
+        try:
+            with open(os.path.join(root, '.gitignore'), 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            lines = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            # 开头或中间含有“/”的模式相对于根目录匹配，否则匹配任意层级的名称；要在去掉首尾的“/”之前判断
+            anchored = line.startswith('/') or '/' in line.rstrip('/')
+            self.rules.append((_glob_regex(line.strip('/'), anchored), negate, dir_only))
+        return
+
+    def ignored(self, rel:str, is_dir:bool)->bool:
+        res = False
+        for pattern, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if pattern.match(rel):
+                res = not negate
+        return res
+
+def _size(n:int)->str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+def render_tree(
+    node,
+    max_depth:int=3,
+    include:Optional[List[str]]=None,
+    exclude:Optional[List[str]]=None,
+    gitignore:bool=True,
+    max_entries:int=200,
+    cursor:Optional[str]=None,
+    show_size:bool=False
+)->str:
+    try:
+        skip = int(cursor) if cursor else 0
+    except ValueError:
+        raise ValueError(f'Invalid cursor {cursor!r}.')
+    exclude = DEFAULT_EXCLUDE if exclude is None else exclude
+    ignore = GitIgnore(node.dir_path) if gitignore else None
+    parts = [f'{node.dir_path}/\n'] if not skip else [f'{node.dir_path}/（从第{skip + 1}项继续）\n']
+    shown = seen = 0
+    # 单次深度优先遍历：栈中保存(节点, 深度, 相对路径前缀, 子项迭代器)
+    def children(n):
+        return iter(sorted(n.files, key=lambda f: (isinstance(f, str), f if isinstance(f, str) else f.name)))
+    stack = [(node, 0, '', children(node))]
+    while stack:
+        check_cancelled()
+        cur, depth, prefix, it = stack[-1]
+        item = next(it, None)
+        if item is None:
+            stack.pop()
+            continue
+        is_dir = not isinstance(item, str)
+        name = item.name if is_dir else item
+        rel = prefix + name
+        if any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel, p) for p in exclude):
+            continue
+        if ignore is not None and ignore.ignored(rel, is_dir):
+            continue
+        if not is_dir and include and not any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel, p) for p in include):
+            continue
+        seen += 1
+        if seen > skip:
+            if shown >= max_entries:
+                parts.append(f'...（已显示{shown}项，还有更多内容未显示，请使用cursor="{seen - 1}"继续查看）\n')
+                break
+            shown += 1
+            line = '  ' * (depth + 1) + (name + '/' if is_dir else name)
+            if show_size and not is_dir:
+                try:
+                    line += f' ({_size(os.path.getsize(os.path.join(cur.dir_path, name)))})'
+                except OSError:
+                    pass
+            parts.append(line + '\n')
+        if is_dir and depth < max_depth:
+            try:
+                stack.append((item, depth + 1, rel + '/', children(item)))
+            except OSError:
+                continue
+    return ''.join(parts)
+
+GitIgnore.__doc__ = '''GitIgnore类用于解析目录根部的.gitignore文件，支持注释、否定（!）、仅匹配目录（以/结尾）和相对于根目录的模式。通配符按gitignore的规则匹配：*和?不匹配“/”，**可以匹配任意多层目录。子目录中的.gitignore不会被读取。
+- ignored(self, rel, is_dir) -> bool: 判断相对路径rel是否被忽略，后出现的规则优先。'''
+render_tree.__doc__ = '''render_tree函数以树状图的形式渲染一个DirNode。它接受以下参数：
+- node: 要渲染的DirNode。
+- max_depth: 最多展开的子目录层数，默认为3；超出层数的子目录只显示名称。
+- include: 文件名或相对路径的通配符列表，给出时只显示匹配的文件（目录总是显示）。
+- exclude: 要排除的文件或目录的通配符列表，默认排除.git、__pycache__和node_modules。
+- gitignore: 是否按根目录的.gitignore排除文件，默认为True。
+- max_entries: 最多显示的项数，超出时在末尾给出继续查看所需的cursor。
+- cursor: 上一次输出末尾给出的cursor，从该位置继续显示。
+- show_size: 是否在文件名后显示文件大小。
+函数通过一次深度优先遍历生成输出，各行只拼接一次，耗时和输出大小只与显示的项数有关；子项按名称排序，以保证cursor在多次调用之间稳定。'''
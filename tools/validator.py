@@ -0,0 +1,149 @@
+from typing import Callable, Dict
+
+_TRUE = ('true', '1', 'yes', 'y', 'on')
+_FALSE = ('false', '0', 'no', 'n', 'off')
+
+class ValidationError(ValueError):
+    pass
+
+def _type_name(value)->str:
+    return type(value).__name__
+
+def _build_string(schema:dict, path:str)->Callable:
+    enum = schema.get('enum')
+    def check(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise ValidationError(f'{path}: expected string, got {_type_name(value)}.')
+        if enum is not None and value not in enum:
+            raise ValidationError(f'{path}: {value!r} is not one of {enum}.')
+        return value
+    return check
+
+def _build_integer(schema:dict, path:str)->Callable:
+    enum = schema.get('enum')
+    def check(value):
+        if isinstance(value, bool):
+            raise ValidationError(f'{path}: expected integer, got bool.')
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        elif isinstance(value, str):
+            try:
+                value = int(value.strip())
+            except ValueError:
+                raise ValidationError(f'{path}: expected integer, got {value!r}.')
+        if not isinstance(value, int):
+            raise ValidationError(f'{path}: expected integer, got {_type_name(value)}.')
+        if enum is not None and value not in enum:
+            raise ValidationError(f'{path}: {value!r} is not one of {enum}.')
+        return value
+    return check
+
+def _build_number(schema:dict, path:str)->Callable:
+    enum = schema.get('enum')
+    def check(value):
+        if isinstance(value, bool):
+            raise ValidationError(f'{path}: expected number, got bool.')
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                raise ValidationError(f'{path}: expected number, got {value!r}.')
+        if not isinstance(value, (int, float)):
+            raise ValidationError(f'{path}: expected number, got {_type_name(value)}.')
+        if enum is not None and value not in enum:
+            raise ValidationError(f'{path}: {value!r} is not one of {enum}.')
+        return value
+    return check
+
+def _build_boolean(schema:dict, path:str)->Callable:
+    def check(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            low = value.strip().lower()
+            if low in _TRUE:
+                return True
+            if low in _FALSE:
+                return False
+        if isinstance(value, int) and value in (0, 1):
+            return bool(value)
+        raise ValidationError(f'{path}: expected boolean, got {value!r}.')
+    return check
+
+def _build_array(schema:dict, path:str)->Callable:
+    items = schema.get('items')
+    item_check = build_schema(items, f'{path}[]') if items else None
+    def check(value):
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError(f'{path}: expected array, got {_type_name(value)}.')
+        if item_check is None:
+            return list(value)
+        return [item_check(v) for v in value]
+    return check
+
+def _build_object(schema:dict, path:str)->Callable:
+    properties = schema.get('properties') or {}
+    required = tuple(schema.get('required') or ())
+    extra = schema.get('additionalProperties', properties == {} and 'properties' not in schema)
+    checks = {k: build_schema(v, f'{path}.{k}' if path else k) for k, v in properties.items()}
+    required_set = frozenset(required)
+    def check(value):
+        if not isinstance(value, dict):
+            raise ValidationError(f'{path or "arguments"}: expected object, got {_type_name(value)}.')
+        for k in required:
+            if k not in value:
+                raise ValidationError(f'Missing required argument {(path + "." + k) if path else k!r}.')
+        res = {}
+        for k, v in value.items():
+            c = checks.get(k)
+            if c is not None:
+                if v is None and k not in required_set:
+                    # 模型常把未使用的可选参数写成null，按没有提供处理，使用函数的默认值
+                    continue
+                res[k] = c(v)
+            elif extra:
+                res[k] = v
+            else:
+                raise ValidationError(f'Unexpected argument {(path + "." + k) if path else k!r}.')
+        return res
+    return check
+
+def _passthrough(value):
+    return value
+
+_BUILDERS:Dict[str, Callable] = {
+    'string': _build_string,
+    'integer': _build_integer,
+    'number': _build_number,
+    'boolean': _build_boolean,
+    'array': _build_array,
+    'object': _build_object,
+}
+
+def build_schema(schema:dict, path:str='')->Callable:
+    if not isinstance(schema, dict):
+        return _passthrough
+    builder = _BUILDERS.get(schema.get('type'))
+    if builder is None:
+        return _passthrough
+    return builder(schema, path)
+
+def build_validator(parameters:dict)->Callable[[dict], dict]:
+    if not parameters:
+        return build_schema({'type': 'object', 'properties': {}})
+    if parameters.get('type') != 'object':
+        # 兼容只给出properties字典的旧格式
+        parameters = {'type': 'object', 'properties': parameters}
+    return build_schema(parameters)
+
+ValidationError.__doc__ = '''ValidationError表示工具调用参数不符合该工具声明的JSON Schema，它是ValueError的子类。'''
+build_schema.__doc__ = '''build_schema函数把一段JSON Schema编译为一个校验/转换函数。它接受以下参数：
+- schema: JSON Schema字典，支持string、integer、number、boolean、array、object类型以及enum约束。
+- path: 当前字段在参数中的路径，仅用于生成错误信息。
+返回的函数接受一个值，返回转换后的值（例如把字符串"3"转换为整数3），不合法时抛出ValidationError。未知类型的schema不做校验，原样返回。'''
+build_validator.__doc__ = '''build_validator函数把工具定义中的parameters字段编译为参数校验器。它接受以下参数：
+- parameters: 工具定义中的parameters字段，通常为{'type':'object','properties':...,'required':...}。
+返回的校验器接受关键字参数字典，检查必需参数和未声明的参数，并按声明类型转换各参数，返回新的参数字典。值为null（None）的可选参数视为没有提供，会从结果中去掉，以便使用函数的默认值；必需参数为null时仍然报错。
+校验器只在注册工具时构建一次，调用工具时直接复用。'''
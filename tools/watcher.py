@@ -0,0 +1,194 @@
+from typing import Dict, Optional
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT = struct.Struct('iIII')
+
+class Inotify:
+    def __init__(self)->None:
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('libc not found.')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not supported on this platform.')
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return
+
+    def add_watch(self, path:str, mask:int=_MASK)->int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd:int)->None:
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout:float):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            yield wd, mask, cookie, name
+
+    def close(self)->None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class WorkspaceWatcher(threading.Thread):
+    def __init__(self, file_manager, poll_interval:float=1.0, use_inotify:bool=True)->None:
+        super().__init__(name='workspace-watcher', daemon=True)
+        self.fm = file_manager
+        self.poll_interval = poll_interval
+        self.inotify:Optional[Inotify] = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+        self.mode = 'inotify' if self.inotify is not None else 'poll'
+        self.__stop = threading.Event()
+        self.__root = None
+        # inotify: wd -> 节点；轮询: 节点 -> 上次看到的目录mtime
+        self.__wd_nodes:Dict[int, object] = {}
+        self.__mtimes:Dict[int, tuple] = {}
+        return
+
+    def stop(self)->None:
+        self.__stop.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    def _changed(self)->None:
+        self.fm.bump()
+
+    def _reset(self)->None:
+        if self.inotify is not None:
+            for wd in self.__wd_nodes:
+                self.inotify.rm_watch(wd)
+        self.__wd_nodes.clear()
+        self.__mtimes.clear()
+        self.__root = self.fm.root
+
+    def _track(self)->None:
+        # 为新展开的节点登记监视，登记后同步一次，补上展开与登记之间可能错过的变化
+        if self.fm.root is not self.__root:
+            self._reset()
+        watched = {id(n) for n in self.__wd_nodes.values()} if self.inotify is not None else self.__mtimes
+        for node in list(self.__root.loaded_nodes()):
+            if id(node) in watched:
+                continue
+            if self.inotify is not None:
+                try:
+                    wd = self.inotify.add_watch(node.dir_path)
+                except OSError:
+                    continue
+                self.__wd_nodes[wd] = node
+            else:
+                self.__mtimes[id(node)] = (node, self._mtime(node.dir_path))
+            if node.sync():
+                self._changed()
+
+    @staticmethod
+    def _mtime(path:str):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_ino
+        except OSError:
+            return None
+
+    def _apply(self, wd:int, mask:int, name:str)->bool:
+        if mask & IN_Q_OVERFLOW:
+            changed = False
+            for node in list(self.__wd_nodes.values()):
+                changed |= node.sync()
+            return changed
+        node = self.__wd_nodes.get(wd)
+        if node is None:
+            return False
+        if mask & IN_IGNORED:
+            self.__wd_nodes.pop(wd, None)
+            return False
+        # FileManager自身的写入已经更新了目录树和版本号，对应的事件不再重复计数
+        own = self.fm.own_change(os.path.join(node.dir_path, name))
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            added = node.add_entry(name, bool(mask & IN_ISDIR))
+            # 重命名覆盖已有文件（例如编辑器的原子保存）不改变目录树，但文件内容变了
+            return not own and (added or bool(mask & IN_MOVED_TO))
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            return node.remove_entry(name) and not own
+        # 文件内容变化不影响目录树，但工作区版本号仍需更新
+        return bool(mask & IN_MODIFY) and not own
+
+    def _poll(self)->bool:
+        changed = False
+        for key, (node, mtime) in list(self.__mtimes.items()):
+            now = self._mtime(node.dir_path)
+            if now != mtime:
+                self.__mtimes[key] = (node, now)
+                changed |= node.sync()
+        return changed
+
+    def run(self)->None:
+        try:
+            while not self.__stop.is_set():
+                self._track()
+                changed = False
+                if self.inotify is not None:
+                    for wd, mask, cookie, name in self.inotify.read(self.poll_interval):
+                        changed |= self._apply(wd, mask, name)
+                else:
+                    self.__stop.wait(self.poll_interval)
+                    changed = self._poll()
+                if changed:
+                    self._changed()
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+Inotify.__doc__ = '''Inotify类通过ctypes调用libc中的inotify接口，仅在Linux上可用。它包含以下方法：
+- add_watch(self, path, mask) -> int: 监视一个目录，返回监视描述符。
+- rm_watch(self, wd): 取消监视。
+- read(self, timeout): 最多等待timeout秒，依次返回(wd, mask, cookie, name)形式的事件。
+- close(self): 关闭inotify文件描述符。'''
+WorkspaceWatcher.__doc__ = '''WorkspaceWatcher类是在后台线程中运行的工作区监视器，由FileManager.watch创建。它会：
+- 只监视目录树中已经展开的DirNode节点，新展开的节点会在下一次循环中被登记；
+- 在支持inotify的系统上把创建、删除、重命名事件直接应用到对应节点的子项列表，否则退回到按poll_interval轮询各目录mtime、发生变化时重新读取该目录的方式；
+- 每当观察到变化时调用FileManager.bump，使工作区版本号加1；FileManager自身的写入（FileManager.own_change为True）引起的事件不会再次计数。
+FileManager的根节点被替换（chdir或refresh）后，监视器会自动重新登记。mode属性为'inotify'或'poll'，表示实际使用的方式。'''
+WorkspaceWatcher.stop.__doc__ = '''stop方法用于停止监视器并等待后台线程退出。'''